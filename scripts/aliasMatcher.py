@@ -0,0 +1,227 @@
+'''
+Approximate matching of unresolved target names to known official gene symbols and aliases.
+
+Names that neither the local normalizer (nameNormalizer.py) nor the gene symbol lookup resolve exactly (e.g., "EPHA-2
+kinase", "p38-alpha MAPK") otherwise end up without an official gene symbol until a manual override is added to
+processing.py. FuzzyAliasMatcher indexes a vocabulary of (name, official gene symbol) pairs - official symbols,
+KINASE_ALIASES, manual overrides, names of processed datasets, and optionally all symbols and aliases of a
+geneIndex.LocalGeneIndex - and ranks candidate symbols for a name by trigram similarity:
+1. names are stripped of generic words ("protein kinase", "kinase"), normalized as in nameNormalizer.normalizeNames()
+   (both Greek letter variants), padded with two leading and one trailing space, and split into their sets of
+   3-character substrings (trigrams)
+2. an inverted index maps each trigram to the vocabulary entries containing it, so only entries sharing at least one
+   trigram with the name are scored, by the Dice coefficient 2 |A & B| / (|A| + |B|) of their trigram sets
+3. candidates are ranked by the best score of any name of each symbol; candidates scoring less than `minScore` are
+   dropped
+
+A match is applied automatically if the best candidate scores more than `threshold` and leads the next candidate symbol
+by at least `margin`; other names with candidates are queued for review (see writeReview()), e.g. to be added to the
+manual overrides in processing.py.
+
+Usage
+    matcher = FuzzyAliasMatcher.fromProcessed(dataAux_dir)
+    matcher.candidates("EPHA-2 kinase")          # [("EPHA2", "EPH-A2", 1.0), ...]
+    matches = matcher.match(["EPHA-2 kinase", "KIAA1234"])
+'''
+
+import os
+import numpy as np
+import pandas as pd
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+from nameNormalizer import GREEK_LETTERS, GREEK_NUMBERS, KINASE_ALIASES, normalizeNames
+
+# Version of the matching rules; included in build cache keys of datasets resolved with them
+FUZZY_MATCHER_VERSION = 2
+
+REVIEW_FILENAME = "aliasReview.tsv"
+
+_genericPattern = r"(?i)\b(protein\s+)?kinase\b"
+
+def trigrams(name):
+    '''
+    Args
+    - name: str
+        normalized name
+
+    Returns: set of str
+    '''
+    padded = "  " + name + " "
+    return({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+class FuzzyAliasMatcher:
+    '''
+    Args
+    - pairs: iterable of (str, str)
+        (name, official gene symbol); names are official symbols, previous symbols or aliases
+    - threshold: float
+        score that a match applied automatically must exceed. At the default 0.8, a 6-character symbol with one
+        character appended (e.g., "PIK3CG2" for PIK3CG, score 0.8) is queued for review
+    - margin: float
+        minimum difference between the scores of the best and the next candidate symbol for a match to be applied
+        automatically
+    - minScore: float
+        minimum score of a candidate
+    - nCandidates: int
+        number of candidate symbols reported per name
+    '''
+
+    def __init__(self, pairs, threshold = 0.8, margin = 0.1, minScore = 0.3, nCandidates = 5):
+        pairs = [(name, symbol) for name, symbol in pairs
+                 if isinstance(name, str) and isinstance(symbol, str) and name and symbol]
+        pairs = pd.DataFrame(list(dict.fromkeys(pairs)), columns=["name", "symbol"], dtype=object)
+        forms = pd.concat([pairs.assign(form=_normalize(pairs["name"], greek))
+                           for greek in (GREEK_LETTERS, GREEK_NUMBERS)], ignore_index=True)
+        forms = forms[forms["form"] != ""].drop_duplicates(subset=["form", "symbol"]).reset_index(drop=True)
+        self.forms = forms["form"].to_numpy(dtype=object)
+        self.names = forms["name"].to_numpy(dtype=object)
+        self.symbols = forms["symbol"].to_numpy(dtype=object)
+        grams = [list(trigrams(form)) for form in self.forms]
+        self.sizes = np.array([len(g) for g in grams], dtype=np.int32)
+        # inverted index: trigram -> sorted entry ids, from one sort of all (trigram, entry) pairs
+        codes, unique = pd.factorize(pd.Series([gram for g in grams for gram in g], dtype=object))
+        entries = np.repeat(np.arange(len(grams), dtype=np.int32), self.sizes)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.cumsum(np.bincount(codes, minlength=len(unique)))[:-1]
+        self.postings = dict(zip(unique, np.split(entries[order], bounds)))
+        self.threshold = threshold
+        self.margin = margin
+        self.minScore = minScore
+        self.nCandidates = nCandidates
+        self.version = FUZZY_MATCHER_VERSION
+
+    @classmethod
+    def fromProcessed(cls, dataAux_dir, names = None, aliases = None, overrides = None, geneIndex = None, **kwargs):
+        '''
+        Create a matcher whose vocabulary is the names and official gene symbols of processed datasets, an alias table,
+        manual overrides and optionally a local gene index.
+
+        Args
+        - dataAux_dir: str
+            directory of processed data files
+        - names: list of str
+            datasets whose names and symbols to use. None: all datasets in DATASETS
+        - aliases: dict: str -> str
+            aliases -> official gene symbols. None: KINASE_ALIASES
+        - overrides: dict: str -> dict: str -> str
+            dataset name -> manual official gene symbols for names. None: processing.GENE_SYMBOL_OVERRIDES
+        - geneIndex: geneIndex.LocalGeneIndex
+            also use all official symbols, previous symbols and aliases of the index. None: do not use
+        - kwargs
+            threshold, margin, minScore, nCandidates; see FuzzyAliasMatcher
+
+        Returns: FuzzyAliasMatcher
+        '''
+        if overrides is None:
+            from processing import GENE_SYMBOL_OVERRIDES
+            overrides = GENE_SYMBOL_OVERRIDES
+        pairs = list((KINASE_ALIASES if aliases is None else aliases).items())
+        for table in overrides.values():
+            pairs.extend((table or {}).items())
+        for name in (list(DATASETS) if names is None else names):
+            path = os.path.join(dataAux_dir, DATASETS[name]["filename"])
+            if os.path.exists(path):
+                df = pd.read_csv(path, usecols=["Name", GENE_SYMBOL_COLUMN]).dropna()
+                pairs.extend(zip(df[GENE_SYMBOL_COLUMN], df[GENE_SYMBOL_COLUMN]))
+                pairs.extend(zip(df["Name"], df[GENE_SYMBOL_COLUMN]))
+        if geneIndex is not None:
+            pairs.extend((term, geneIndex.symbols[i]) for term, matches in geneIndex.index.items() for i in matches)
+        return(cls(pairs, **kwargs))
+
+    def candidates(self, term, k = None):
+        '''
+        Candidate official gene symbols for a name.
+
+        Args
+        - term: str
+        - k: int
+            maximum number of candidates. None: nCandidates
+
+        Returns: list of (str, str, float)
+            (official gene symbol, matched name of the vocabulary, score in [0, 1]), sorted by decreasing score; one per
+            symbol
+        '''
+        k = self.nCandidates if k is None else k
+        return(self._candidates(_normalizedForms([term])[0], k))
+
+    def _candidates(self, forms, k):
+        ids, scores = [], []
+        for form in forms:
+            grams = [gram for gram in trigrams(form) if gram in self.postings]
+            if len(grams) == 0:
+                continue
+            entries, shared = np.unique(np.concatenate([self.postings[gram] for gram in grams]), return_counts=True)
+            score = 2 * shared / (len(trigrams(form)) + self.sizes[entries])
+            ids.append(entries[score >= self.minScore])
+            scores.append(score[score >= self.minScore])
+        if len(ids) == 0:
+            return([])
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        order = np.lexsort((ids, -scores))
+        result, seen = [], set()
+        for i in order:
+            symbol = self.symbols[ids[i]]
+            if symbol not in seen:
+                seen.add(symbol)
+                result.append((symbol, self.names[ids[i]], float(scores[i])))
+                if len(result) == k:
+                    break
+        return(result)
+
+    def match(self, terms):
+        '''
+        Match names, applying high-confidence matches.
+
+        Args
+        - terms: list of str
+
+        Returns: pandas.DataFrame
+            one row per distinct term, with columns
+            - name: term
+            - symbol: official gene symbol if the match was applied automatically; "" otherwise
+            - score: score of the best candidate; NaN if there are no candidates
+            - status: "auto" (applied), "review" (best candidate not above threshold or within margin of the next) or
+              "none" (no candidates of at least minScore)
+            - candidates: "<symbol> (<matched name>, <score>)" of each candidate, separated by "; "
+        '''
+        terms = list(dict.fromkeys(terms))
+        rows = []
+        for term, forms in zip(terms, _normalizedForms(terms)):
+            candidates = self._candidates(forms, self.nCandidates)
+            best = candidates[0][2] if candidates else np.nan
+            following = candidates[1][2] if len(candidates) > 1 else 0
+            if not candidates:
+                status = "none"
+            elif best > self.threshold and best - following >= self.margin:
+                status = "auto"
+            else:
+                status = "review"
+            rows.append({"name": term, "symbol": candidates[0][0] if status == "auto" else "", "score": best,
+                         "status": status,
+                         "candidates": "; ".join("{} ({}, {:.2f})".format(*c) for c in candidates)})
+        return(pd.DataFrame(rows, columns=["name", "symbol", "score", "status", "candidates"]))
+
+def _normalize(names, greek):
+    stripped = names.str.replace(_genericPattern, " ", regex=True)
+    # keep names that consist only of generic words
+    return(normalizeNames(stripped.where(stripped.str.strip() != "", names), greek))
+
+def _normalizedForms(terms):
+    # distinct normalized forms of each term (Greek letter words as letters and as numbers)
+    terms = pd.Series(terms, dtype=object)
+    letters, numbers = _normalize(terms, GREEK_LETTERS), _normalize(terms, GREEK_NUMBERS)
+    return([[form for form in dict.fromkeys(pair) if form] for pair in zip(letters, numbers)])
+
+def writeReview(review, path):
+    '''
+    Add names to a review queue (tab-separated file), in which a reviewer fills in the symbol column. Names already in
+    the queue are kept as they are.
+
+    Args
+    - review: pandas.DataFrame
+        e.g. rows of FuzzyAliasMatcher.match() with status "review"
+    - path: str
+    '''
+    if os.path.exists(path):
+        existing = pd.read_csv(path, sep="\t", dtype=object, keep_default_na=False)
+        review = pd.concat([existing, review[~review["name"].isin(existing["name"])]], ignore_index=True)
+    review.to_csv(path, sep="\t", index=False)
@@ -0,0 +1,180 @@
+'''
+Benchmark of every processing and selection stage on synthetic data (see syntheticData.py).
+
+For each panel size, generates nDatasets datasets cycling through the Kinobeads (Klaeger), activity (Huang) and binding
+(Annes) formats, and measures each stage separately:
+- ingest: read the raw CSV file (processing.readRaw())
+- clean: remove missing values; parse Kinobeads values (processing.cleanKinobeads(), processing.cleanPercent())
+- split: split semicolon-joined names (processing.splitMultiTargetRows(); Kinobeads)
+- condense: condense variants of the same kinase (processing.condenseDuplicatesByKey(); binding)
+- resolve: add gene symbols with a stubbed resolver (processing.resolveGeneSymbols())
+- filter: Boolean filtering (selection.booleanFilter())
+- rank: normalized difference ranks (selection.normalizedDiffRank())
+- intersect, aggregate: across all datasets (selection.intersectTargets(), selection.aggregateRanks())
+
+Wall and CPU times are the minimum over repeats; peak memory is the peak of memory allocated during a separate run
+traced by tracemalloc. Results are written as JSON, including package versions and the git commit, so that runs of
+different versions can be compared.
+
+Usage
+    python scripts/benchmark.py [--sizes N ...] [--compounds N] [--datasets N] [--repeats N] [--output PATH]
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datasets import GENE_SYMBOL_COLUMN
+from processing import (readRaw, cleanKinobeads, cleanPercent, splitMultiTargetRows, condenseDuplicatesByKey,
+                        resolveGeneSymbols)
+from selection import booleanFilter, intersectTargets, normalizedDiffRank, aggregateRanks
+import syntheticData
+
+# Dataset formats, cycled through by the number of datasets: (format, metric, reference compound)
+FORMATS = [("kinobeads", "fold", "CC401"), ("activity", "percent", "HTH01091"), ("binding", "percent", "STF1285")]
+
+def stubResolver(terms):
+    '''
+    Gene symbol resolver that returns each term upper-cased, without any lookups.
+    '''
+    return([term.upper() for term in terms])
+
+def measure(func, args = (), repeats = 3):
+    '''
+    Measure a function call.
+
+    Args
+    - func: function
+    - args: tuple
+        arguments to func
+    - repeats: int
+        number of timed calls
+
+    Returns: (object, dict)
+        result: return value of func
+        measurement: wall_s, cpu_s (minimum over repeats), peak_bytes (from a separate call traced by tracemalloc)
+    '''
+    wall, cpu = [], []
+    for _ in range(repeats):
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        result = func(*args)
+        wall.append(time.perf_counter() - wall0)
+        cpu.append(time.process_time() - cpu0)
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return(result, {"wall_s": min(wall), "cpu_s": min(cpu), "peak_bytes": peak})
+
+def benchmarkPanel(nTargets, nCompounds = 2, nDatasets = 3, repeats = 3, seed = 0, tmpDir = None):
+    '''
+    Benchmark all stages on one set of synthetic datasets.
+
+    Args
+    - nTargets: int
+        number of targets per dataset
+    - nCompounds: int
+        number of compound columns of Kinobeads datasets (at least 2: STF1081 and CC401)
+    - nDatasets: int
+        number of datasets
+    - repeats: int
+        number of timed calls per stage
+    - seed: int
+        seed for synthetic data
+    - tmpDir: str
+        directory for synthetic raw data files. None: system default
+
+    Returns: list of dict
+        one record per stage and dataset: stage, dataset, format, n_targets, rows_in (None for ingest), rows_out,
+        wall_s, cpu_s, peak_bytes
+    '''
+    rng = np.random.default_rng(seed)
+    records = []
+    def run(stage, dataset, fmt, func, args, rowsIn):
+        result, measurement = measure(func, args, repeats)
+        if len(result) == 0:
+            raise RuntimeError("Stage {} of {} returned no rows".format(stage, dataset or "all datasets"))
+        records.append({"stage": stage, "dataset": dataset, "format": fmt, "n_targets": nTargets, "rows_in": rowsIn,
+                        "rows_out": len(result), **measurement})
+        return(result)
+
+    dfs = []
+    with tempfile.TemporaryDirectory(dir=tmpDir) as dataDir:
+        for i in range(nDatasets):
+            fmt, metric, referenceCol = FORMATS[i % len(FORMATS)]
+            dataset = "{}{:d}".format(fmt, i)
+            path = os.path.join(dataDir, dataset + ".csv")
+            if fmt == "kinobeads":
+                compounds = ["STF1081", "CC401"] + ["C{:d}".format(j) for j in range(2, nCompounds)]
+                syntheticData.kinobeadsPanel(nTargets, compounds, rng).to_csv(path, index=False)
+                # as in processing.prepareDataset(), only the compound and reference columns are read and cleaned;
+                # the other compounds only add to the size of the file parsed
+                valueCols = ["STF1081", "CC401"]
+                df = run("ingest", dataset, fmt, readRaw, (path, ['Name'] + valueCols, ["n.d."]), None)
+                df = run("clean", dataset, fmt, cleanKinobeads, (df, valueCols), len(df))
+                df = run("split", dataset, fmt, splitMultiTargetRows, (df, 'Name'), len(df))
+            elif fmt == "activity":
+                syntheticData.activityPanel(nTargets, rng=rng).to_csv(path, index=False)
+                df = run("ingest", dataset, fmt, readRaw, (path,), None)
+                df = run("clean", dataset, fmt, cleanPercent, (df,), len(df))
+            else:
+                syntheticData.bindingPanel(nTargets, rng=rng).to_csv(path, index=False)
+                df = run("ingest", dataset, fmt, readRaw, (path,), None)
+                df = run("clean", dataset, fmt, cleanPercent, (df,), len(df))
+                df = run("condense", dataset, fmt, condenseDuplicatesByKey, (df, "Name", "STF1081", np.mean), len(df))
+            df = run("resolve", dataset, fmt, resolveGeneSymbols, (df, stubResolver), len(df))
+            df = df.assign(bool=run("filter", dataset, fmt, booleanFilter, (df, metric, referenceCol), len(df)))
+            df = df.assign(rank=run("rank", dataset, fmt, normalizedDiffRank, (df, referenceCol), len(df)))
+            dfs.append(df)
+    rowsIn = sum(len(df) for df in dfs)
+    run("intersect", None, None, intersectTargets, (dfs, 'bool', GENE_SYMBOL_COLUMN), rowsIn)
+    run("aggregate", None, None, aggregateRanks, (dfs, GENE_SYMBOL_COLUMN), rowsIn)
+    return(records)
+
+def environment():
+    '''
+    Returns: dict
+        versions of Python, NumPy and pandas, platform, and the git commit of this repository (None if unavailable)
+    '''
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return({"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "commit": commit})
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmark processing and selection stages on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="numbers of targets per dataset")
+    parser.add_argument('--compounds', type=int, default=2, help="number of compounds in Kinobeads datasets")
+    parser.add_argument('--datasets', type=int, default=3, help="number of datasets")
+    parser.add_argument('--repeats', type=int, default=3, help="number of timed runs per stage")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default="benchmark.json", help="path of JSON file of results")
+    args = parser.parse_args(argv)
+
+    records = []
+    for nTargets in args.sizes:
+        records += benchmarkPanel(nTargets, args.compounds, args.datasets, args.repeats, args.seed)
+        total = sum(r["wall_s"] for r in records if r["n_targets"] == nTargets)
+        print("{:d} targets: {:.3f} s".format(nTargets, total))
+    report = {"created": datetime.datetime.now().isoformat(timespec='seconds'), "environment": environment(),
+              "config": {k: getattr(args, k) for k in ('sizes', 'compounds', 'datasets', 'repeats', 'seed')},
+              "stages": records}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+
+if __name__ == '__main__':
+    sys.exit(main())
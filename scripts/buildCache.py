@@ -0,0 +1,151 @@
+'''
+Content-hashed build cache of processed datasets.
+
+Each processed dataset is stored in a directory (data_aux/cache/<dataset name>/) of memory-mappable NumPy .npy files,
+one per column, next to a manifest.json recording
+- key: hash of the raw input file(s), the processing parameters and the source code of the processing modules
+- columns / dtypes: column names and pandas dtypes
+- csv: size and modification time of the CSV file written for the same build (data_aux/<filename>)
+
+processing.processAll() only rebuilds datasets whose key changed; selection.readDataset() reads the cached columns
+(typed, without parsing) as long as the CSV file has not been modified since.
+'''
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# Name of the cache directory in data_aux/
+CACHE_DIRNAME = "cache"
+
+# Modules whose source code affects processed datasets, including all modules on the gene symbol resolution path
+SOURCE_FILES = ["processing.py", "datasets.py", "drugMatrix.py", "buildCache.py", "geneLookup.py", "entrezClient.py",
+                "geneSymbolCache.py", "geneIndex.py", "nameNormalizer.py", "aliasMatcher.py"]
+
+class BuildCache:
+    '''
+    Args
+    - cacheDir: str
+        directory in which to store cached datasets
+    '''
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+
+    def key(self, inputPaths, params):
+        '''
+        Compute the key of a build from its inputs.
+
+        Args
+        - inputPaths: list of str
+            raw input files
+        - params: dict
+            processing parameters (JSON-serializable; functions are represented by their names)
+
+        Returns: str
+            hex digest
+        '''
+        h = hashlib.sha256()
+        for path in inputPaths:
+            h.update(_fileDigest(path))
+        scriptsDir = os.path.dirname(os.path.abspath(__file__))
+        for filename in SOURCE_FILES:
+            h.update(_fileDigest(os.path.join(scriptsDir, filename)))
+        h.update(json.dumps(params, sort_keys=True, default=lambda x: getattr(x, '__name__', repr(x))).encode())
+        return(h.hexdigest())
+
+    def load(self, name, key = None, csvPath = None, mmap = True, csvMissing = False):
+        '''
+        Load a cached dataset.
+
+        Args
+        - name: str
+            dataset name
+        - key: str
+            If given, only return the dataset if it was stored with this key.
+        - csvPath: str
+            If given, only return the dataset if this CSV file is unchanged since the dataset was stored.
+        - mmap: bool
+            memory-map numeric columns instead of reading them into memory
+        - csvMissing: bool
+            read empty strings as NaN, as when reading the CSV file. False: return string columns as stored, with
+            empty strings (e.g., unresolved gene symbols) as "" and missing values as NaN
+
+        Returns: pandas.DataFrame or None
+        '''
+        datasetDir = os.path.join(self.cacheDir, name)
+        try:
+            with open(os.path.join(datasetDir, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return(None)
+        if key is not None and manifest["key"] != key:
+            return(None)
+        if csvPath is not None and manifest.get("csv") != _fileStat(csvPath):
+            return(None)
+        columns = {}
+        for i, (column, dtype) in enumerate(zip(manifest["columns"], manifest["dtypes"])):
+            values = np.load(os.path.join(datasetDir, "{:d}.npy".format(i)), mmap_mode='r' if mmap else None)
+            if dtype == "str":
+                values = pd.Series(values, dtype="str")
+                if csvMissing:
+                    values = values.replace("", np.nan)
+                elif os.path.exists(os.path.join(datasetDir, "{:d}.na.npy".format(i))):
+                    values = values.where(~np.load(os.path.join(datasetDir, "{:d}.na.npy".format(i))), np.nan)
+            columns[column] = values
+        return(pd.DataFrame(columns, columns=manifest["columns"]))
+
+    def store(self, name, key, df, csvPath = None):
+        '''
+        Store a dataset.
+
+        Args
+        - name: str
+            dataset name
+        - key: str
+            build key, e.g. from key()
+        - df: pandas.DataFrame
+            columns must be numeric, boolean or strings (missing values are stored as empty strings, with a mask of
+            missing values)
+        - csvPath: str
+            CSV file written for the same build
+        '''
+        datasetDir = os.path.join(self.cacheDir, name)
+        tmpDir = datasetDir + ".tmp"
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        os.makedirs(tmpDir)
+        dtypes = []
+        for i, column in enumerate(df.columns):
+            series = df[column]
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                values = series.to_numpy()
+                dtypes.append(str(values.dtype))
+            else:
+                missing = series.isna().to_numpy()
+                if missing.any():
+                    np.save(os.path.join(tmpDir, "{:d}.na.npy".format(i)), missing, allow_pickle=False)
+                values = series.fillna("").astype(str).to_numpy(dtype=str)
+                dtypes.append("str")
+            np.save(os.path.join(tmpDir, "{:d}.npy".format(i)), values, allow_pickle=False)
+        manifest = {"key": key, "columns": list(df.columns), "dtypes": dtypes,
+                    "csv": None if csvPath is None else _fileStat(csvPath)}
+        with open(os.path.join(tmpDir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=1)
+        shutil.rmtree(datasetDir, ignore_errors=True)
+        os.replace(tmpDir, datasetDir)
+
+def _fileDigest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return(h.digest())
+
+def _fileStat(path):
+    if not os.path.exists(path):
+        return(None)
+    stat = os.stat(path)
+    return([stat.st_size, stat.st_mtime_ns])
@@ -0,0 +1,208 @@
+'''
+Comparison of inhibition of targets across a series of concentrations (doses) of a compound.
+
+Generalizes selection.compareConcentrations() from two concentrations to any number: the values of a compound at each
+dose are stacked into a targets x doses array (doses ascending; NaN where a target was not measured at a dose), from
+which per-target metrics are computed for all targets at once:
+- pairwise deltas: value at the lower dose - value at the higher dose, for every pair of doses. Values are % control or
+  % activity remaining, so positive deltas indicate stronger inhibition at the higher dose.
+- monotonicity: fraction of consecutive measured doses at which the value does not increase (within a tolerance), and
+  whether the whole series is monotonic
+- half-inhibition dose: dose at which the value first falls to `level` (50 % by default), interpolated linearly in
+  log(dose) between the two doses that bracket it
+
+Usage
+    ladder = ConcentrationLadder.fromFrames({100: dfAnnes100, 500: dfAnnes500}, "STF1285")
+    summary = ladder.summary(diff_percent_thresh=50)
+'''
+
+import numpy as np
+import pandas as pd
+from datasets import GENE_SYMBOL_COLUMN
+
+class ConcentrationLadder:
+    '''
+    Args
+    - targets: array-like of str
+        target identifiers (e.g., official gene symbols), one per row of values
+    - doses: array-like of float
+        concentrations, one per column of values
+    - values: numpy.ndarray of float, shape (len(targets), len(doses))
+        % control or % activity remaining; NaN where not measured
+    - valueCol: str
+        name of the compound, used in column names of summary()
+    - keyCol: str
+        name of the target column of returned DataFrames
+    '''
+
+    def __init__(self, targets, doses, values, valueCol = "value", keyCol = GENE_SYMBOL_COLUMN):
+        doses = np.asarray(doses, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if values.shape != (len(targets), len(doses)):
+            raise ValueError("values must have shape (number of targets, number of doses)")
+        if len(np.unique(doses)) != len(doses) or np.any(doses <= 0):
+            raise ValueError("doses must be distinct and positive")
+        order = np.argsort(doses)
+        self.targets = np.asarray(targets, dtype=object)
+        self.doses = doses[order]
+        self.values = values[:, order]
+        self.valueCol = valueCol
+        self.keyCol = keyCol
+
+    @classmethod
+    def fromFrames(cls, dfs, valueCol, keyCol = GENE_SYMBOL_COLUMN, how = 'inner'):
+        '''
+        Stack datasets measured at different doses.
+
+        Args
+        - dfs: dict: float -> pandas.DataFrame
+            dose -> dataset with columns keyCol and valueCol. Only the first row of each key in a dataset is used.
+        - valueCol: str
+            column of values for the compound
+        - keyCol: str
+            column of target identifiers on which to align datasets
+        - how: str
+            'inner': targets measured at every dose (as selection.compareConcentrations()); 'outer': targets measured at
+            any dose
+
+        Returns: ConcentrationLadder
+        '''
+        series = [df.dropna(subset=[keyCol]).drop_duplicates(subset=keyCol).set_index(keyCol)[valueCol]
+                  for df in dfs.values()]
+        values = pd.concat(series, axis=1, join=how)
+        return(cls(values.index, list(dfs), values.to_numpy(dtype=float), valueCol, keyCol))
+
+    @classmethod
+    def fromLong(cls, df, doseCol, valueCol, keyCol = GENE_SYMBOL_COLUMN):
+        '''
+        Create a ladder from a long-format table with one row per target and dose, e.g. a full dose-response screen.
+
+        Args
+        - df: pandas.DataFrame
+            columns keyCol, doseCol, valueCol. Only the first row of each (key, dose) is used.
+        - doseCol: str
+            column of doses
+        - valueCol: str
+            column of values
+        - keyCol: str
+            column of target identifiers
+
+        Returns: ConcentrationLadder
+            all targets; NaN where a target was not measured at a dose
+        '''
+        df = df.dropna(subset=[keyCol, doseCol]).drop_duplicates(subset=[keyCol, doseCol])
+        values = df.pivot(index=keyCol, columns=doseCol, values=valueCol)
+        return(cls(values.index, values.columns.to_numpy(dtype=float), values.to_numpy(dtype=float), valueCol, keyCol))
+
+    def labels(self):
+        '''
+        Returns: list of str
+            dose labels, e.g. "100 nM"
+        '''
+        return(["{:g} nM".format(dose) for dose in self.doses])
+
+    def pairwiseDeltas(self):
+        '''
+        Returns: pandas.DataFrame
+            value at the lower dose - value at the higher dose, for each target (rows, indexed by target) and each pair
+            of doses (columns "<lower> -> <higher>")
+        '''
+        i, j = np.triu_indices(len(self.doses), k=1)
+        labels = self.labels()
+        return(pd.DataFrame(self.values[:, i] - self.values[:, j], index=pd.Index(self.targets, name=self.keyCol),
+                            columns=["{} -> {}".format(labels[a], labels[b]) for a, b in zip(i, j)]))
+
+    def monotonicity(self, tolerance = 0):
+        '''
+        Args
+        - tolerance: float
+            increase in value between consecutive doses still considered non-increasing (e.g., measurement noise)
+
+        Returns: (numpy.ndarray of float, numpy.ndarray of bool)
+            fraction of consecutive pairs of measured doses with non-increasing value (NaN for targets measured at
+            fewer than 2 doses), and whether all of them are non-increasing
+        '''
+        values = _forwardFill(self.values)
+        steps = np.diff(values, axis=1)
+        # steps from or to unmeasured doses do not count; gaps are bridged by carrying the last measured value forward
+        valid = ~np.isnan(steps) & ~np.isnan(self.values[:, 1:])
+        nonIncreasing = (steps <= tolerance) & valid
+        nValid = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = nonIncreasing.sum(axis=1) / nValid
+        return(fraction, (nValid > 0) & (nonIncreasing.sum(axis=1) == nValid))
+
+    def halfInhibitionDose(self, level = 50):
+        '''
+        Args
+        - level: float
+            value (% control or % activity remaining) considered half inhibition
+
+        Returns: (numpy.ndarray of float, numpy.ndarray of str)
+            dose at which the value first falls to level, interpolated in log(dose) between the bracketing measured
+            doses, and a qualifier: "" (interpolated), "<=" (at or below level at the lowest measured dose; the dose is
+            that dose) or ">" (never reaches level; the dose is the highest measured dose). NaN and "" for targets
+            without measured values.
+        '''
+        values = self.values
+        measured = ~np.isnan(values)
+        reached = measured & (values <= level)
+        anyReached = reached.any(axis=1)
+        first = np.argmax(reached, axis=1)
+        rows = np.arange(len(values))
+        # previous measured dose before the first dose at which level is reached
+        lastMeasured = np.where(measured, np.arange(len(self.doses)), -1)
+        lastMeasured = np.maximum.accumulate(lastMeasured, axis=1)
+        previous = np.where(first > 0, lastMeasured[rows, np.maximum(first - 1, 0)], -1)
+        interpolate = anyReached & (previous >= 0)
+
+        logDoses = np.log(self.doses)
+        v0, v1 = values[rows, np.maximum(previous, 0)], values[rows, first]
+        d0, d1 = logDoses[np.maximum(previous, 0)], logDoses[first]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(v0 != v1, (v0 - level) / (v0 - v1), 1)
+        dose = np.full(len(values), np.nan)
+        dose[interpolate] = np.exp(d0 + fraction * (d1 - d0))[interpolate]
+        qualifier = np.full(len(values), "", dtype=object)
+        atFirst = anyReached & (previous < 0)
+        dose[atFirst] = self.doses[first[atFirst]]
+        qualifier[atFirst] = "<="
+        notReached = ~anyReached & measured.any(axis=1)
+        lastDose = self.doses[lastMeasured[:, -1]]
+        dose[notReached] = lastDose[notReached]
+        qualifier[notReached] = ">"
+        return(dose, qualifier)
+
+    def summary(self, diff_percent_thresh = 50, level = 50, tolerance = 0):
+        '''
+        Per-target dose-shift metrics.
+
+        Args
+        - diff_percent_thresh: float
+            threshold difference between the lowest and highest dose at which a target is labeled True
+        - level, tolerance
+            see halfInhibitionDose(), monotonicity()
+
+        Returns: pandas.DataFrame
+            columns: keyCol; "<valueCol> (<dose>)" for each dose; "diff" (lowest - highest dose, as in
+            selection.compareConcentrations()); "max_delta" (largest pairwise delta); "monotonicity", "monotonic";
+            "half_dose", "half_dose_qualifier"; "bool" (diff >= diff_percent_thresh). Sorted by decreasing diff.
+        '''
+        df = pd.DataFrame(self.values, columns=["{} ({})".format(self.valueCol, label) for label in self.labels()])
+        df.insert(0, self.keyCol, self.targets)
+        df['diff'] = self.values[:, 0] - self.values[:, -1]
+        deltas = self.pairwiseDeltas().to_numpy()
+        maxDelta = np.where(np.isnan(deltas), -np.inf, deltas).max(axis=1, initial=-np.inf)
+        df['max_delta'] = np.where(np.isinf(maxDelta), np.nan, maxDelta)
+        df['monotonicity'], df['monotonic'] = self.monotonicity(tolerance)
+        df['half_dose'], df['half_dose_qualifier'] = self.halfInhibitionDose(level)
+        df = df.sort_values(by='diff', ascending=False, kind='stable').reset_index(drop=True)
+        df['bool'] = df['diff'] >= diff_percent_thresh
+        return(df)
+
+def _forwardFill(values):
+    # carry the last measured value of each row forward over NaNs
+    index = np.where(~np.isnan(values), np.arange(values.shape[1]), 0)
+    index = np.maximum.accumulate(index, axis=1)
+    filled = values[np.arange(values.shape[0])[:, None], index]
+    return(filled)
@@ -0,0 +1,22 @@
+'''
+Registry of kinase profiling datasets.
+
+Each dataset compares STF1081 (compoundCol) to a less toxic compound (referenceCol) across a kinase panel:
+- filename: name of the raw data file (in data/) and of the processed data file (in data_aux/)
+- metric
+    "fold": values are dissociation constants (Kd_app); lower values indicate stronger inhibition, np.inf indicates no
+      inhibition. Compared by fold difference.
+    "percent": values are % control or % activity remaining; lower values indicate stronger inhibition. Compared by
+      absolute difference.
+- referenceCol: column of values for the less toxic compound
+- compoundCol: column of values for STF1081
+'''
+
+# Name of column of official gene symbols
+GENE_SYMBOL_COLUMN = "GeneSymbol"
+
+DATASETS = {
+    "Klaeger": {"filename": "Klaeger.csv", "metric": "fold", "referenceCol": "CC401", "compoundCol": "STF1081"},
+    "Huang": {"filename": "Huang.csv", "metric": "percent", "referenceCol": "HTH01091", "compoundCol": "STF1081"},
+    "Annes100": {"filename": "Annes100.csv", "metric": "percent", "referenceCol": "STF1285", "compoundCol": "STF1081"},
+    "Annes500": {"filename": "Annes500.csv", "metric": "percent", "referenceCol": "STF1285", "compoundCol": "STF1081"}}
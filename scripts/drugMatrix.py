@@ -0,0 +1,120 @@
+'''
+Differential scoring of a compound against every other compound in a Kinobeads drug x target Kd_app matrix
+(Klaeger et al.), e.g. to find less toxic reference compounds whose targets differ most from those of STF-1081.
+
+Values in the raw matrix are parsed as in processData.py:
+- "n.i." (not inhibited): np.inf
+- "n.d." (not determined) or empty: np.nan
+- parenthesized values, e.g. "(123)": low-confidence values
+'''
+
+import numpy as np
+import pandas as pd
+
+def readKinobeadsMatrix(path, nameCol = 'Name', highConfidenceOnly = True, na_values = ["n.d."]):
+    '''
+    Read a Kinobeads drug matrix CSV file (one row per target, one column per compound).
+
+    Args
+    - path: str
+        path to CSV file
+    - nameCol: str
+        column of target names
+    - highConfidenceOnly: bool
+        Set low-confidence (parenthesized) values to np.nan. Otherwise, keep low-confidence values.
+    - na_values: list of str
+        values to be read in as np.nan
+
+    Returns: (pandas.DataFrame, pandas.DataFrame)
+        values: Kd_app values (float), indexed by target name, one column per compound
+        lowConfidence: whether each value was low-confidence (bool), same shape as values
+    '''
+    df = pd.read_csv(path, na_values=na_values, dtype=str).set_index(nameCol)
+    return(parseKinobeadsValues(df, highConfidenceOnly))
+
+def parseKinobeadsValues(df, highConfidenceOnly = True):
+    '''
+    Parse raw Kinobeads values of all columns of df at once.
+
+    Args
+    - df: pandas.DataFrame
+        raw values (str), one column per compound
+    - highConfidenceOnly: bool
+        Set low-confidence (parenthesized) values to np.nan. Otherwise, keep low-confidence values.
+
+    Returns: (pandas.DataFrame, pandas.DataFrame)
+        values: Kd_app values (float), same index and columns as df
+        lowConfidence: whether each value was low-confidence (bool), same shape as values
+    '''
+    raw = df.to_numpy(dtype=object)
+    missing = pd.isna(raw)
+    text = np.where(missing, '', raw).astype(str)
+    lowConfidence = np.char.startswith(text, '(')
+    text = np.char.strip(text, '()')
+    values = np.full(text.shape, np.nan)
+    notInhibited = text == 'n.i.'
+    values[notInhibited] = np.inf
+    numeric = ~missing & ~notInhibited
+    values[numeric] = text[numeric].astype(float)
+    if highConfidenceOnly:
+        values[lowConfidence] = np.nan
+    return(pd.DataFrame(values, index=df.index, columns=df.columns),
+           pd.DataFrame(lowConfidence, index=df.index, columns=df.columns))
+
+def differentialScores(values, compound = 'STF1081', diff_fold_thresh = 20):
+    '''
+    Compare a compound against every other compound (reference) in a Kd_app matrix.
+
+    For each reference, only targets with values for both the compound and the reference are compared. Ranks follow the
+    Rank ordering method of selectTargets.py: targets are ordered by decreasing difference (reference - compound), with
+    ties broken by increasing compound value, and normalized by the number of compared targets.
+
+    Args
+    - values: pandas.DataFrame
+        Kd_app values, one row per target, one column per compound (e.g., from readKinobeadsMatrix())
+    - compound: str
+        column of the compound to compare against all other columns
+    - diff_fold_thresh: int or float
+        fold difference (reference / compound) at or above which a target is considered differentially inhibited
+
+    Returns: (pandas.DataFrame, pandas.DataFrame, pandas.DataFrame)
+        fold: reference / compound fold difference, one column per reference
+        rank: normalized rank of each target, one column per reference (np.nan where not compared)
+        summary: one row per reference, sorted by decreasing n_differential, with columns
+          n_targets: number of compared targets
+          n_differential: number of targets with fold >= diff_fold_thresh
+          n_exclusive: number of targets inhibited by compound but not by the reference (reference value is np.inf)
+          median_log10_fold: median log10 fold difference over compared targets with finite values for both compounds
+    '''
+    references = [col for col in values.columns if col != compound]
+    ref = values[references].to_numpy(dtype=float)
+    cmp = values[compound].to_numpy(dtype=float)[:, None]
+    compared = ~np.isnan(ref) & ~np.isnan(cmp)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fold = np.where(compared, ref / cmp, np.nan)
+        diff = ref - cmp
+
+    # Ordering by (not compared, -diff, compound) via successive stable sorts, least significant key first. Targets not
+    # inhibited by either compound (inf - inf = nan) are ordered after all other compared targets.
+    order = np.argsort(cmp[:, 0], kind='stable')
+    key = np.where(compared, -diff, np.nan)[order]
+    order = order[np.argsort(key, axis=0, kind='stable')]
+    order = np.take_along_axis(order, np.argsort(~np.take_along_axis(compared, order, axis=0), axis=0, kind='stable'),
+                               axis=0)
+    nCompared = compared.sum(axis=0)
+    rank = np.empty(ref.shape)
+    np.put_along_axis(rank, order, np.arange(len(ref))[:, None] / np.maximum(nCompared, 1), axis=0)
+    rank[~compared] = np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logFold = np.where(compared & np.isfinite(fold) & (fold > 0), np.log10(fold), np.nan)
+    summary = pd.DataFrame({
+        'n_targets': nCompared,
+        'n_differential': (compared & (fold >= diff_fold_thresh)).sum(axis=0),
+        'n_exclusive': (compared & np.isinf(ref) & np.isfinite(cmp)).sum(axis=0),
+        'median_log10_fold': pd.DataFrame(logFold).median(axis=0).to_numpy()},
+        index=pd.Index(references, name='reference'))
+    summary.sort_values(by=['n_differential', 'n_exclusive'], ascending=False, kind='stable', inplace=True)
+    return(pd.DataFrame(fold, index=values.index, columns=references),
+           pd.DataFrame(rank, index=values.index, columns=references),
+           summary)
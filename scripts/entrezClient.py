@@ -0,0 +1,222 @@
+'''
+Rate-limited asyncio client for the NCBI E-utilities gene endpoints (esearch and esummary).
+
+NCBI allows at most 3 requests per second without an API key and 10 requests per second with an API key
+(https://www.ncbi.nlm.nih.gov/books/NBK25497/). Requests are spaced by a token bucket limiter tuned to these rates,
+the number of requests in flight is bounded, and requests that fail with HTTP 429 (Too Many Requests), HTTP 5xx or
+a connection error are retried with exponential backoff.
+'''
+
+import asyncio
+import json
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+# Maximum request rates (requests per second) published by NCBI
+NCBI_RATE = 3
+NCBI_RATE_API_KEY = 10
+
+class TokenBucket:
+    '''
+    asyncio token bucket rate limiter.
+
+    Args:
+    - rate: int or float
+        tokens added per second
+    - capacity: int or float
+        maximum number of tokens (burst size)
+    '''
+
+    def __init__(self, rate, capacity = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        '''
+        Wait until a token is available, then consume it.
+        '''
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class AsyncEntrezClient:
+    '''
+    asyncio client for NCBI E-utilities gene esearch and esummary requests (JSON responses).
+
+    Blocking HTTP requests are run in worker threads; at most maxConcurrency requests are in flight at a time, and
+    requests are started at no more than rate requests per second.
+
+    Args:
+    - email: str
+        email registered with NCBI
+    - apiKey: str
+        NCBI API key. None: no API key
+    - rate: int or float
+        maximum requests per second. None: NCBI_RATE_API_KEY if apiKey is given, otherwise NCBI_RATE
+    - maxConcurrency: int
+        maximum number of requests in flight
+    - maxRetries: int
+        maximum number of times to retry a request after HTTP 429, HTTP 5xx or connection errors
+    - backoffBase: int or float
+        seconds to wait before the first retry. Doubles with every retry (with random jitter), up to backoffMax.
+    - backoffMax: int or float
+        maximum seconds to wait before a retry
+    - timeout: int or float
+        seconds to wait for a response
+    - baseUrl: str
+        E-utilities base URL
+
+    Attributes (statistics)
+    - requests: int
+        number of HTTP requests issued, including retries
+    - retries: int
+        number of retried requests
+    - throttled: int
+        number of HTTP 429 responses
+    '''
+
+    def __init__(self, email, apiKey = None, rate = None, maxConcurrency = 10, maxRetries = 5,
+                 backoffBase = 0.5, backoffMax = 30, timeout = 30, baseUrl = EUTILS_URL):
+        if rate is None:
+            rate = NCBI_RATE if apiKey is None else NCBI_RATE_API_KEY
+        self.email = email
+        self.apiKey = apiKey
+        self.rate = rate
+        self.maxConcurrency = maxConcurrency
+        self.maxRetries = maxRetries
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+        self.timeout = timeout
+        self.baseUrl = baseUrl
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self._loop = None
+        self._bucket = None
+        self._semaphore = None
+
+    async def esearchGene(self, term, retmax = 20):
+        '''
+        Search NCBI Gene database for human genes matching term. Same query as searchGeneIds() in geneLookup.py.
+
+        Args:
+        - term: str
+            gene name / alias
+        - retmax: int
+            maximum number of IDs to return
+
+        Returns: list of str
+            NCBI Gene IDs returned by the query
+        '''
+        result = await self.request("esearch.fcgi", {
+            "db": "gene",
+            "term": '(' + term + '[gene]) AND (Homo sapiens[orgn]) AND alive[prop] NOT newentry[gene]',
+            "retmax": retmax})
+        return(list(result['esearchresult']['idlist']))
+
+    async def esummaryGene(self, ids):
+        '''
+        Fetch official gene names and aliases for NCBI Gene IDs in a single request.
+
+        Args:
+        - ids: list of str
+            NCBI Gene IDs
+
+        Returns: dict: str -> dict
+            NCBI Gene ID -> {"name": official gene name, "aliases": list of aliases}
+        '''
+        result = await self.request("esummary.fcgi", {"db": "gene", "id": ",".join(ids)})
+        summaries = {}
+        for uid in result['result'].get('uids', []):
+            summary = result['result'][uid]
+            if 'error' in summary:
+                continue
+            summaries[str(uid)] = {"name": summary['name'], "aliases": summary['otheraliases'].split(', ')}
+        return(summaries)
+
+    async def request(self, cgi, params):
+        '''
+        POST an E-utilities request, retrying with exponential backoff after HTTP 429, HTTP 5xx or connection errors.
+
+        Args:
+        - cgi: str
+            E-utility, e.g. "esearch.fcgi"
+        - params: dict
+            query parameters. retmode, tool, email and api_key are added automatically.
+
+        Returns: dict
+            parsed JSON response
+        '''
+        # The limiter and semaphore are bound to the event loop they are used in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._bucket = TokenBucket(self.rate)
+            self._semaphore = asyncio.Semaphore(self.maxConcurrency)
+        params = dict(params, retmode="json", tool="anneslab", email=self.email)
+        if self.apiKey is not None:
+            params["api_key"] = self.apiKey
+        data = urllib.parse.urlencode(params).encode()
+        url = self.baseUrl + cgi
+        attempt = 0
+        while True:
+            retryAfter = None
+            async with self._semaphore:
+                await self._bucket.acquire()
+                self.requests += 1
+                try:
+                    body = await asyncio.to_thread(self._post, url, data)
+                    return(json.loads(body))
+                except urllib.error.HTTPError as e:
+                    if e.code != 429 and e.code // 100 != 5:
+                        raise
+                    if e.code == 429:
+                        self.throttled += 1
+                    retryAfter = e.headers.get('Retry-After') if e.headers is not None else None
+                    error = e
+                except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                    error = e
+            if attempt >= self.maxRetries:
+                raise error
+            delay = min(self.backoffMax, self.backoffBase * 2 ** attempt) * random.uniform(0.5, 1)
+            if retryAfter is not None and retryAfter.isdigit():
+                delay = max(delay, int(retryAfter))
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def _post(self, url, data):
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=self.timeout) as response:
+            return(response.read())
+
+def runSync(coro):
+    '''
+    Run a coroutine to completion from synchronous code, including from within a running event loop (e.g., a Jupyter
+    notebook), in which case the coroutine is run in a new event loop in a separate thread.
+
+    Args:
+    - coro: coroutine
+
+    Returns: result of coro
+    '''
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return(asyncio.run(coro))
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(1) as executor:
+        return(executor.submit(asyncio.run, coro).result())
@@ -0,0 +1,366 @@
+'''
+Local stand-in for the NCBI E-utilities gene endpoints (esearch.fcgi, esummary.fcgi), for testing and load-testing
+gene symbol lookups (geneLookup.py) without the live NCBI server.
+
+Responses are served from fixtures:
+    {"esearch": {term: [NCBI Gene ID, ...]}, "esummary": {NCBI Gene ID: {"name": str, "aliases": [str, ...]}}}
+recorded from NCBI for the terms of our panels (recordFixtures()), or derived from processed datasets
+(fixturesFromProcessed()). Both JSON (retmode=json; entrezClient.AsyncEntrezClient) and XML (default; Biopython
+Bio.Entrez) responses are served, for GET and POST requests.
+
+Faults of the live server can be injected (see Faults): latency with jitter, HTTP 429 responses at random or above a
+request rate (as NCBI's 3 requests per second limit), HTTP 5xx responses, dropped connections, and esearch responses
+that succeed (HTTP 200) with an empty ID list and a warning, as NCBI returns when its search backend is overloaded.
+
+Usage
+    server = StandInServer(fixtures, Faults(latency=0.2, jitter=0.1, throttleRate=0.05))
+    server.start()
+    client = AsyncEntrezClient(email, baseUrl=server.baseUrl)     # asyncio lookups
+    with server.redirect():                                       # Biopython lookups
+        multiThreadedSearchGeneNames(terms, email)
+    server.stop()
+'''
+
+import contextlib
+import io
+import json
+import random
+import re
+import socket
+import threading
+import time
+import urllib.request
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+EUTILS_HOST = "eutils.ncbi.nlm.nih.gov"
+
+_termPattern = re.compile(r"^\((.*)\[gene\]\) AND ")
+
+@dataclass
+class Faults:
+    '''
+    Faults injected into responses. Probabilities are per request.
+
+    Args
+    - latency: float
+        seconds before each response
+    - jitter: float
+        additional seconds, uniformly distributed between 0 and jitter
+    - throttleRate: float
+        probability of an HTTP 429 (Too Many Requests) response
+    - rateLimit: float
+        requests per second (over the last second) above which requests receive HTTP 429. None: no limit
+    - retryAfter: int
+        value of the Retry-After header of HTTP 429 responses. None: no header
+    - serverErrorRate: float
+        probability of an HTTP 503 response
+    - dropRate: float
+        probability of closing the connection without a response
+    - emptyRate: float
+        probability of an esearch response with HTTP 200, no IDs and a warning
+    - seed: int
+        seed for fault injection. None: not reproducible
+    '''
+    latency: float = 0
+    jitter: float = 0
+    throttleRate: float = 0
+    rateLimit: float = None
+    retryAfter: int = None
+    serverErrorRate: float = 0
+    dropRate: float = 0
+    emptyRate: float = 0
+    seed: int = None
+
+class StandInServer:
+    '''
+    Args
+    - fixtures: dict
+        see module docstring; terms not in fixtures["esearch"] have no IDs, IDs not in fixtures["esummary"] are
+        reported as invalid
+    - faults: Faults
+        None: no faults
+    - host: str
+    - port: int
+        0: any free port
+
+    Attributes (statistics)
+    - counts: dict: str -> int
+        number of requests, esearch, esummary, throttled, server_error, dropped, empty responses
+    '''
+
+    def __init__(self, fixtures, faults = None, host = "127.0.0.1", port = 0):
+        self.fixtures = fixtures
+        self.faults = Faults() if faults is None else faults
+        self.random = random.Random(self.faults.seed)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.counts = dict.fromkeys(["requests", "esearch", "esummary", "throttled", "server_error", "dropped",
+                                     "empty"], 0)
+        handler = type("Handler", (_Handler,), {"server_": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def baseUrl(self):
+        '''
+        E-utilities base URL of the server, e.g. for AsyncEntrezClient(baseUrl=...)
+        '''
+        host, port = self.httpd.server_address[:2]
+        return("http://{}:{:d}/entrez/eutils/".format(host, port))
+
+    def start(self):
+        '''
+        Serve in a background thread.
+        '''
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return(self)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return(self.start())
+
+    def __exit__(self, *exc):
+        self.stop()
+        return(False)
+
+    @contextlib.contextmanager
+    def redirect(self):
+        '''
+        Redirect requests made with urllib.request.urlopen() (e.g., by Biopython Bio.Entrez) to EUTILS_HOST to this
+        server, by installing a global urllib opener for the duration of the with block.
+        '''
+        opener = urllib.request.build_opener(_RedirectHandler(self.baseUrl))
+        previous = urllib.request._opener
+        urllib.request.install_opener(opener)
+        try:
+            yield self
+        finally:
+            urllib.request.install_opener(previous)
+
+    def fault(self):
+        '''
+        Draw the fault of a request.
+
+        Returns: (float, str)
+            seconds before the response; "throttled", "server_error", "dropped", "empty" or None
+        '''
+        faults = self.faults
+        with self.lock:
+            now = time.monotonic()
+            self.recent.append(now)
+            while self.recent[0] < now - 1:
+                self.recent.popleft()
+            self.counts["requests"] += 1
+            delay = faults.latency + self.random.uniform(0, faults.jitter)
+            draw = self.random.random()
+            if faults.rateLimit is not None and len(self.recent) > faults.rateLimit:
+                fault = "throttled"
+            elif draw < faults.throttleRate:
+                fault = "throttled"
+            elif draw < faults.throttleRate + faults.serverErrorRate:
+                fault = "server_error"
+            elif draw < faults.throttleRate + faults.serverErrorRate + faults.dropRate:
+                fault = "dropped"
+            elif draw < faults.throttleRate + faults.serverErrorRate + faults.dropRate + faults.emptyRate:
+                fault = "empty"
+            else:
+                fault = None
+        return(delay, fault)
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+class _RedirectHandler(urllib.request.BaseHandler):
+    # before urllib.request.HTTPSHandler
+    handler_order = 100
+
+    def __init__(self, baseUrl):
+        self.baseUrl = baseUrl
+
+    def https_open(self, req):
+        if req.host != EUTILS_HOST:
+            return(None)
+        url = self.baseUrl + req.selector.split("/entrez/eutils/", 1)[-1]
+        return(self.parent.open(urllib.request.Request(url, data=req.data, method=req.get_method()),
+                                timeout=req.timeout))
+
+class _Handler(BaseHTTPRequestHandler):
+    server_ = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(urlsplit(self.path).query)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._respond(self.rfile.read(length).decode())
+
+    def _respond(self, query):
+        server = self.server_
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        cgi = urlsplit(self.path).path.rsplit("/", 1)[-1]
+        delay, fault = server.fault()
+        if delay > 0:
+            time.sleep(delay)
+        if fault == "dropped":
+            server.count("dropped")
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.wfile = io.BytesIO()
+            return
+        if fault == "throttled":
+            server.count("throttled")
+            headers = {} if server.faults.retryAfter is None else {"Retry-After": str(server.faults.retryAfter)}
+            return(self._send(429, '{"error":"API rate limit exceeded"}', "application/json", headers))
+        if fault == "server_error":
+            server.count("server_error")
+            return(self._send(503, "Service Unavailable", "text/plain"))
+
+        json_ = params.get("retmode") == "json"
+        if cgi == "esearch.fcgi":
+            server.count("esearch")
+            match = _termPattern.match(params.get("term", ""))
+            ids = [] if match is None else server.fixtures["esearch"].get(match.group(1), [])
+            warning = None
+            if fault == "empty":
+                server.count("empty")
+                ids, warning = [], "Search backend temporarily unavailable"
+            ids = ids[:int(params.get("retmax", 20))]
+            body = _esearchJson(ids, warning) if json_ else _esearchXml(ids, warning)
+        elif cgi == "esummary.fcgi":
+            server.count("esummary")
+            ids = [id for id in params.get("id", "").split(",") if id]
+            summaries = server.fixtures["esummary"]
+            body = _esummaryJson(ids, summaries) if json_ else _esummaryXml(ids, summaries)
+        else:
+            return(self._send(404, "Unknown E-utility: " + cgi, "text/plain"))
+        self._send(200, body, "application/json" if json_ else "text/xml")
+
+    def _send(self, status, body, contentType, headers = None):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", contentType + "; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def _esearchJson(ids, warning = None):
+    result = {"count": str(len(ids)), "retmax": str(len(ids)), "retstart": "0", "idlist": list(ids)}
+    if warning is not None:
+        result["warninglist"] = {"phrasesignored": [], "quotedphrasesnotfound": [], "outputmessages": [warning]}
+    return(json.dumps({"header": {"type": "esearch", "version": "0.3"}, "esearchresult": result}))
+
+def _esearchXml(ids, warning = None):
+    xml = ['<?xml version="1.0" encoding="UTF-8" ?>',
+           '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+           '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">',
+           '<eSearchResult><Count>{0:d}</Count><RetMax>{0:d}</RetMax><RetStart>0</RetStart><IdList>'.format(len(ids))]
+    xml += ["<Id>{}</Id>".format(escape(id)) for id in ids]
+    xml.append("</IdList><TranslationSet/>")
+    if warning is not None:
+        xml.append("<WarningList><OutputMessage>{}</OutputMessage></WarningList>".format(escape(warning)))
+    xml.append("</eSearchResult>")
+    return("\n".join(xml))
+
+def _esummaryJson(ids, summaries):
+    result = {"uids": list(ids)}
+    for id in ids:
+        if id in summaries:
+            result[id] = {"uid": id, "name": summaries[id]["name"],
+                          "otheraliases": ", ".join(summaries[id]["aliases"])}
+        else:
+            result[id] = {"uid": id, "error": "cannot get document summary"}
+    return(json.dumps({"header": {"type": "esummary", "version": "0.3"}, "result": result}))
+
+def _esummaryXml(ids, summaries):
+    xml = ['<?xml version="1.0" encoding="UTF-8" ?>',
+           '<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary gene 20130912//EN" '
+           '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20130912/esummary_gene.dtd">',
+           '<eSummaryResult><DocumentSummarySet status="OK">']
+    for id in ids:
+        if id in summaries:
+            xml.append('<DocumentSummary uid="{}"><Name>{}</Name><OtherAliases>{}</OtherAliases></DocumentSummary>'
+                       .format(escape(id), escape(summaries[id]["name"]), escape(", ".join(summaries[id]["aliases"]))))
+        else:
+            xml.append('<DocumentSummary uid="{}"><error>cannot get document summary</error></DocumentSummary>'
+                       .format(escape(id)))
+    xml.append("</DocumentSummarySet></eSummaryResult>")
+    return("\n".join(xml))
+
+def fixturesFromProcessed(dfs, keyCol = 'Name', geneSymbolColumn = 'GeneSymbol'):
+    '''
+    Derive fixtures from processed datasets, such that each name resolves to its gene symbol in the datasets.
+
+    Each distinct gene symbol is given a synthetic NCBI Gene ID whose summary lists the names resolved to it (other
+    than the symbol itself) as aliases; esearch for a name returns that ID. Names without a gene symbol have no IDs.
+
+    Args
+    - dfs: iterable of pandas.DataFrame
+        processed datasets with columns keyCol and geneSymbolColumn
+    - keyCol, geneSymbolColumn: str
+
+    Returns: dict
+        fixtures (see module docstring)
+    '''
+    ids, esearch, esummary = {}, {}, {}
+    for df in dfs:
+        for name, symbol in zip(df[keyCol], df[geneSymbolColumn]):
+            if not isinstance(name, str) or name in esearch:
+                continue
+            if not isinstance(symbol, str) or symbol == "":
+                esearch[name] = []
+                continue
+            if symbol not in ids:
+                ids[symbol] = str(100000 + len(ids))
+                esummary[ids[symbol]] = {"name": symbol, "aliases": []}
+            if name != symbol:
+                esummary[ids[symbol]]["aliases"].append(name)
+            esearch[name] = [ids[symbol]]
+    return({"esearch": esearch, "esummary": esummary})
+
+async def _record(terms, client):
+    import asyncio
+    idLists = await asyncio.gather(*[client.esearchGene(term) for term in terms])
+    ids = list(dict.fromkeys(id for idList in idLists for id in idList))
+    summaries = {}
+    for i in range(0, len(ids), 500):
+        summaries.update(await client.esummaryGene(ids[i:i+500]))
+    return({"esearch": dict(zip(terms, idLists)), "esummary": summaries})
+
+def recordFixtures(terms, client):
+    '''
+    Record fixtures from the live NCBI server.
+
+    Args
+    - terms: list of str
+        terms to look up
+    - client: entrezClient.AsyncEntrezClient
+
+    Returns: dict
+        fixtures (see module docstring)
+    '''
+    from entrezClient import runSync
+    return(runSync(_record(list(dict.fromkeys(terms)), client)))
+
+def readFixtures(path):
+    with open(path) as f:
+        return(json.load(f))
+
+def writeFixtures(fixtures, path):
+    with open(path, "w") as f:
+        json.dump(fixtures, f, indent=1, sort_keys=True)
@@ -0,0 +1,232 @@
+'''
+Local (offline) index of official human gene symbols, previous symbols and aliases.
+
+Built from a downloaded gene nomenclature dump, so that gene symbols can be resolved without network access:
+- HGNC complete set (hgnc_complete_set.txt), available from https://www.genenames.org/download/archive/
+- NCBI gene_info (Homo_sapiens.gene_info.gz), available from https://ftp.ncbi.nlm.nih.gov/gene/DATA/GENE_INFO/Mammalia/
+'''
+
+import csv
+import gzip
+import os
+import pickle
+
+# Match priorities: a term matching an official symbol takes precedence over a previous symbol, which takes
+# precedence over an alias
+SYMBOL, PREVIOUS_SYMBOL, ALIAS = 0, 1, 2
+
+class LocalGeneIndex:
+    '''
+    In-memory hash index mapping (case-insensitive) official gene symbols, previous symbols and aliases to official
+    gene symbols and NCBI Gene IDs.
+
+    Args:
+    - symbols: list of str
+        official gene symbols
+    - ids: list of str
+        NCBI Gene IDs corresponding to symbols ('' if unknown)
+    - index: dict: str -> tuple of int
+        upper-case term -> indices into symbols / ids, ordered by match priority
+    '''
+
+    version = 1
+
+    def __init__(self, symbols, ids, index):
+        self.symbols = symbols
+        self.ids = ids
+        self.index = index
+
+    @classmethod
+    def fromRecords(cls, records):
+        '''
+        Build an index from gene records.
+
+        Args:
+        - records: iterable of (str, str, list of str, list of str)
+            (official symbol, NCBI Gene ID, previous symbols, aliases)
+
+        Returns: LocalGeneIndex
+        '''
+        symbols, ids, matches = [], [], {}
+        for symbol, geneId, previousSymbols, aliases in records:
+            i = len(symbols)
+            symbols.append(symbol)
+            ids.append(geneId)
+            for priority, terms in ((SYMBOL, [symbol]), (PREVIOUS_SYMBOL, previousSymbols), (ALIAS, aliases)):
+                for term in terms:
+                    matches.setdefault(term.upper(), set()).add((priority, i))
+        index = {term: tuple(i for _, i in sorted(match)) for term, match in matches.items()}
+        return(cls(symbols, ids, index))
+
+    @classmethod
+    def fromFile(cls, path):
+        '''
+        Build an index from an HGNC complete set or NCBI gene_info dump (optionally gzip-compressed). The format is
+        determined from the header line.
+
+        Args:
+        - path: str
+            path to dump
+
+        Returns: LocalGeneIndex
+        '''
+        with _open(path) as f:
+            header = f.readline()
+        if header.startswith('hgnc_id'):
+            return(cls.fromHgnc(path))
+        if header.startswith('#tax_id') or header.startswith('#Format: tax_id'):
+            return(cls.fromNcbiGeneInfo(path))
+        raise ValueError("Unrecognized gene nomenclature file format: " + path)
+
+    @classmethod
+    def fromHgnc(cls, path):
+        '''
+        Build an index from an HGNC complete set (tab-separated, with columns symbol, prev_symbol, alias_symbol,
+        entrez_id and status). Only approved symbols are indexed.
+
+        Args:
+        - path: str
+            path to hgnc_complete_set.txt (optionally gzip-compressed)
+
+        Returns: LocalGeneIndex
+        '''
+        def records():
+            with _open(path) as f:
+                for row in csv.DictReader(f, delimiter='\t'):
+                    if row.get('status', 'Approved') != 'Approved':
+                        continue
+                    yield (row['symbol'], row.get('entrez_id') or '',
+                           _splitField(row.get('prev_symbol'), '|'), _splitField(row.get('alias_symbol'), '|'))
+        return(cls.fromRecords(records()))
+
+    @classmethod
+    def fromNcbiGeneInfo(cls, path, taxId = '9606'):
+        '''
+        Build an index from an NCBI gene_info dump. Synonyms are indexed as aliases; the nomenclature authority symbol,
+        if different from Symbol, is indexed as a previous symbol.
+
+        Args:
+        - path: str
+            path to gene_info file (optionally gzip-compressed)
+        - taxId: str
+            NCBI Taxonomy ID of genes to index. Default: '9606' (Homo sapiens)
+
+        Returns: LocalGeneIndex
+        '''
+        def records():
+            with _open(path) as f:
+                header = f.readline().lstrip('#').replace('Format: ', '').split()
+                col = {name: i for i, name in enumerate(header)}
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if fields[col['tax_id']] != taxId:
+                        continue
+                    symbol = fields[col['Symbol']]
+                    authoritySymbol = fields[col['Symbol_from_nomenclature_authority']] \
+                        if 'Symbol_from_nomenclature_authority' in col else '-'
+                    previousSymbols = _splitField(authoritySymbol, '|')
+                    if symbol in previousSymbols:
+                        previousSymbols.remove(symbol)
+                    yield (symbol, fields[col['GeneID']], previousSymbols, _splitField(fields[col['Synonyms']], '|'))
+        return(cls.fromRecords(records()))
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load an index saved by save().
+
+        Args:
+        - path: str
+
+        Returns: LocalGeneIndex
+        '''
+        with open(path, 'rb') as f:
+            version, symbols, ids, index = pickle.load(f)
+        if version != cls.version:
+            raise ValueError("Gene index {} has version {}; expected {}".format(path, version, cls.version))
+        return(cls(symbols, ids, index))
+
+    @classmethod
+    def loadOrBuild(cls, indexPath, sourcePath):
+        '''
+        Load an index from indexPath, (re)building it from sourcePath if indexPath does not exist or is older than
+        sourcePath.
+
+        Args:
+        - indexPath: str
+            path to binary index written by save()
+        - sourcePath: str
+            path to HGNC complete set or NCBI gene_info dump
+
+        Returns: LocalGeneIndex
+        '''
+        if os.path.exists(indexPath) and \
+           (not os.path.exists(sourcePath) or os.path.getmtime(indexPath) >= os.path.getmtime(sourcePath)):
+            try:
+                return(cls.load(indexPath))
+            except ValueError:
+                pass
+        geneIndex = cls.fromFile(sourcePath)
+        geneIndex.save(indexPath)
+        return(geneIndex)
+
+    def save(self, path):
+        '''
+        Serialize index to a binary file that can be loaded with load().
+
+        Args:
+        - path: str
+        '''
+        with open(path, 'wb') as f:
+            pickle.dump((self.version, self.symbols, self.ids, self.index), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def searchGeneNames(self, term, useSingleIndirectMatch = True):
+        '''
+        Search official gene symbols, previous symbols and aliases for a match to term. Same return value as
+        searchGeneNames() in geneLookup.py.
+
+        Args:
+        - term: str
+            gene name / alias
+        - useSingleIndirectMatch
+            Unused; accepted for compatibility with searchGeneNames(). All matches in the index are direct matches.
+
+        Returns: dict: str -> list
+            "names": list of matched official gene name(s), ordered by match priority
+            "ids": list of NCBI Gene IDs corresponding to matched official gene name(s)
+        '''
+        matches = self.index.get(term.upper(), ())
+        return({"names": [self.symbols[i] for i in matches], "ids": [self.ids[i] for i in matches]})
+
+    def lookup(self, terms):
+        '''
+        Look up official gene symbols for terms. Same return value as multiThreadedSearchGeneNames() in geneLookup.py.
+
+        Args:
+        - terms: list of str
+            terms to lookup
+
+        Returns: list of str
+          Where no matches found, returns the empty string. Otherwise, returns the highest-priority matched official gene
+          symbol.
+        '''
+        symbols = self.symbols
+        gene_symbols = []
+        for term in terms:
+            matches = self.index.get(term.upper())
+            gene_symbols.append(symbols[matches[0]] if matches else "")
+        return(gene_symbols)
+
+    def __len__(self):
+        return(len(self.symbols))
+
+def _open(path):
+    if path.endswith('.gz'):
+        return(gzip.open(path, 'rt', encoding='utf-8'))
+    return(open(path, 'r', encoding='utf-8'))
+
+def _splitField(value, sep):
+    value = (value or '').strip().strip('"')
+    if value in ('', '-'):
+        return([])
+    return([v.strip() for v in value.split(sep) if v.strip() != ''])
@@ -0,0 +1,327 @@
+'''
+Official human gene symbol lookup via the NCBI Gene database (Entrez).
+
+- searchGeneNames(), geneSymbolLookupFromSeries(), multiThreadedSearchGeneNames(): Biopython-based lookups. Biopython
+  is only imported when these are called.
+- asyncSearchGeneNames(), lookupGeneSymbols(): rate-limited asyncio lookups (see entrezClient.py) that report terms
+  whose lookup failed separately from terms without a match
+'''
+
+import asyncio
+from multiprocessing.pool import ThreadPool
+from entrezClient import AsyncEntrezClient, runSync
+
+class GeneLookupError(RuntimeError):
+    '''
+    Raised when gene symbol lookups fail (e.g., after repeated HTTP 429 or server errors), as opposed to completing
+    without a match.
+
+    Attributes
+    - failures: dict: str -> Exception
+        term -> error raised by its lookup
+    '''
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__("Gene symbol lookup failed for {:d} term(s): {}".format(
+            len(failures), ", ".join("{} ({})".format(term, error) for term, error in failures.items())))
+
+def searchGeneIds(term, email):
+    '''
+    Search NCBI Gene database for human genes matching term.
+    Dependencies: Biopython
+    
+    Args:
+    - term: str
+        gene name / alias
+    - email: str
+        email registered with NCBI
+    
+    Returns: list of str
+        NCBI Gene IDs returned by the query
+    '''
+    
+    from Bio import Entrez
+    Entrez.email = email
+    handle = Entrez.esearch(db="gene", term='(' + term + '[gene]) AND (Homo sapiens[orgn]) AND alive[prop] NOT newentry[gene]')
+    return(list(Entrez.read(handle)['IdList']))
+
+def fetchGeneSummaries(ids, email, batchSize = 500):
+    '''
+    Fetch official gene names and aliases for NCBI Gene IDs, requesting summaries of up to batchSize IDs per request.
+    Dependencies: Biopython
+    
+    Args:
+    - ids: iterable of str
+        NCBI Gene IDs. Duplicates are only fetched once.
+    - email: str
+        email registered with NCBI
+    - batchSize: int
+        maximum number of IDs per esummary request. Biopython automatically uses HTTP POST for long ID lists.
+    
+    Returns: dict: str -> dict
+        NCBI Gene ID -> {"name": official gene name, "aliases": list of aliases}
+    '''
+    
+    from Bio import Entrez
+    ids = list(dict.fromkeys(ids))
+    summaries = {}
+    Entrez.email = email
+    for i in range(0, len(ids), batchSize):
+        handle = Entrez.esummary(db='gene', id=','.join(ids[i:i+batchSize]))
+        record = Entrez.read(handle)
+        for summary in record['DocumentSummarySet']['DocumentSummary']:
+            summaries[str(summary.attributes['uid'])] = {
+                "name": summary['Name'],
+                "aliases": summary['OtherAliases'].split(', ')}
+    return(summaries)
+
+def matchGeneSummaries(term, idList, summaries, useSingleIndirectMatch = True):
+    '''
+    Match term against the official gene names and aliases of the NCBI Gene IDs returned by searchGeneIds().
+    
+    Args:
+    - term: str
+        gene name / alias
+    - idList: list of str
+        NCBI Gene IDs returned by searchGeneIds(term, ...)
+    - summaries: dict: str -> dict
+        official gene names and aliases as returned by fetchGeneSummaries(). IDs in idList without a summary (e.g.,
+        retired or replaced Gene IDs) are skipped.
+    - useSingleIndirectMatch
+        If idList contains only 1 NCBI Gene ID, even if the term does not exactly match the gene symbol or an alias,
+        use the match.
+    
+    Returns: dict: str -> list
+        "names": list of matched official gene name(s)
+        "ids": list of NCBI Gene IDs corresponding to matched official gene name(s)
+    '''
+    
+    idList = [id for id in idList if id in summaries]
+    names, ids = [], []
+    for id in idList:
+        if (term in [summaries[id]["name"]] + summaries[id]["aliases"]):
+            names.append(summaries[id]["name"])
+            ids.append(id)
+    if useSingleIndirectMatch:
+        if len(names) == 0 and len(idList) == 1:
+            ids.append(idList[0])
+            names.append(summaries[idList[0]]["name"])
+    return({"names": names, "ids": ids})
+
+def searchGeneNames(term, email, useSingleIndirectMatch = True, cache = None):
+    '''
+    Search official human gene names and aliases in NCBI Gene database for a match to term, returning offical names and IDs.
+    Dependencies: Biopython
+    
+    Args:
+    - term: str
+        gene name / alias
+    - email: str
+        email registered with NCBI
+    - useSingleIndirectMatch
+        If the Entrez Gene Database query returns only 1 NCBI Gene ID, even if the term does not exactly match the gene symbol
+        or an alias, use the match.
+    - cache: GeneSymbolCache
+        If given, return the cached result for term if present; otherwise, store the result of the query in the cache.
+    
+    Returns: dict: str -> list
+        "names": list of matched official gene name(s)
+        "ids": list of NCBI Gene IDs corresponding to matched official gene name(s)
+    '''
+
+    if cache is not None:
+        match = cache.get(term, useSingleIndirectMatch=useSingleIndirectMatch)
+        if match is not None:
+            return(match)
+
+    idList = searchGeneIds(term, email)
+    match = matchGeneSummaries(term, idList, fetchGeneSummaries(idList, email), useSingleIndirectMatch)
+    if cache is not None:
+        cache.set(term, match, useSingleIndirectMatch=useSingleIndirectMatch)
+    return(match)
+
+def geneSymbolFromMatch(term, match):
+    '''
+    Choose the official gene symbol for term from the matches returned by searchGeneNames().
+    
+    Args:
+    - term: str
+        gene name / alias
+    - match: dict: str -> list
+        result of searchGeneNames(term, ...)
+    
+    Returns: str
+      If no match found, returns the empty string. If term is itself a matched official gene symbol, returns term.
+      Otherwise, returns the first matched official gene symbol.
+    '''
+    
+    if len(match["names"]) == 0:
+        return("")
+    if (term in match["names"]):
+        return(term)
+    return(match["names"][0])
+
+def geneSymbolLookupFromSeries(series, email, cache = None):
+    '''
+    Search official human gene names and aliases in NCBI Gene database for the value in 'Name' index of given pandas Series.
+    
+    Args
+    - series: pandas.Series
+        must have 'Name' index
+    - email: str
+        email registered with NCBI
+    - cache: GeneSymbolCache
+        cache of previous lookups. None: always query NCBI
+    
+    Returns: str
+      If no match found, returns the empty string. Otherwise, returns the first matched official gene symbol.
+    '''
+    
+    term = series['Name']
+    return(geneSymbolFromMatch(term, searchGeneNames(term, email, cache = cache)))
+
+def multiThreadedSearchGeneNames(terms, email, nThreads = None, cache = None, batchSize = 500):
+    '''
+    Search official human gene names and aliases in NCBI Gene database for terms.
+    
+    Gene IDs are searched for each term in parallel. Summaries of all candidate IDs across all terms are then fetched
+    together in batches of batchSize IDs (see fetchGeneSummaries()), rather than one request per ID.
+    
+    Args
+    - terms: list of str
+        terms to lookup
+    - email: str
+        email registered with NCBI
+    - nThreads: int
+        None: Uses a ThreadPool of a default number of threads as returned by os.cpu_count()
+        1+: Uses a ThreadPool of nThreads
+    - cache: GeneSymbolCache
+        cache of previous lookups. Only terms not found in the cache are queried; no ThreadPool is started if all
+        terms are cached.
+    - batchSize: int
+        maximum number of IDs per esummary request
+    
+    Returns: list of str
+      Where no matches found, returns the empty string. Otherwise, returns the first matched official gene symbol.
+    '''
+    
+    dict_results = [None] * len(terms)
+    gene_symbols = []
+    if cache is not None:
+        for i in range(len(terms)):
+            dict_results[i] = cache.get(terms[i], useSingleIndirectMatch=True)
+    missing = [i for i in range(len(terms)) if dict_results[i] is None]
+    if len(missing) > 0:
+        pool = ThreadPool(nThreads)
+        idLists = {}
+        for i in missing:
+            idLists[i] = pool.apply_async(searchGeneIds, (terms[i], email))
+        pool.close()
+        pool.join()
+        for i in missing:
+            idLists[i] = idLists[i].get()
+        summaries = fetchGeneSummaries([id for i in missing for id in idLists[i]], email, batchSize)
+        for i in missing:
+            dict_results[i] = matchGeneSummaries(terms[i], idLists[i], summaries)
+            if cache is not None:
+                cache.set(terms[i], dict_results[i], useSingleIndirectMatch=True)
+    for i in range(len(terms)):
+        gene_symbols.append(geneSymbolFromMatch(terms[i], dict_results[i]))
+    return(gene_symbols)
+
+async def asyncSearchGeneNames(terms, client, useSingleIndirectMatch = True, cache = None, batchSize = 500):
+    '''
+    Search official human gene names and aliases in NCBI Gene database for terms using a rate-limited asyncio client.
+    
+    Cached terms are not queried. Gene IDs are searched for each remaining distinct term concurrently; summaries of all
+    candidate IDs are then fetched in batches of batchSize IDs.
+    
+    Args
+    - terms: list of str
+        terms to lookup
+    - client: AsyncEntrezClient
+    - useSingleIndirectMatch
+        see searchGeneNames()
+    - cache: GeneSymbolCache
+        cache of previous lookups. Successful lookups are added to the cache; failed lookups are not.
+    - batchSize: int
+        maximum number of IDs per esummary request
+    
+    Returns: (dict: str -> dict, dict: str -> Exception)
+        matches: term -> result as returned by searchGeneNames(), for terms whose lookup succeeded
+        failures: term -> error raised by its lookup, for terms whose lookup failed
+    '''
+    
+    matches, failures = {}, {}
+    missing = []
+    for term in dict.fromkeys(terms):
+        match = None if cache is None else cache.get(term, useSingleIndirectMatch=useSingleIndirectMatch)
+        if match is None:
+            missing.append(term)
+        else:
+            matches[term] = match
+    
+    idLists = {}
+    results = await asyncio.gather(*[client.esearchGene(term) for term in missing], return_exceptions=True)
+    for term, result in zip(missing, results):
+        if isinstance(result, Exception):
+            failures[term] = result
+        else:
+            idLists[term] = result
+    
+    ids = list(dict.fromkeys(id for idList in idLists.values() for id in idList))
+    batches = [ids[i:i+batchSize] for i in range(0, len(ids), batchSize)]
+    summaries, failedIds = {}, {}
+    results = await asyncio.gather(*[client.esummaryGene(batch) for batch in batches], return_exceptions=True)
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            failedIds.update(dict.fromkeys(batch, result))
+        else:
+            summaries.update(result)
+    
+    for term, idList in idLists.items():
+        errors = [failedIds[id] for id in idList if id in failedIds]
+        if len(errors) > 0:
+            failures[term] = errors[0]
+            continue
+        matches[term] = matchGeneSummaries(term, [id for id in idList if id in summaries], summaries,
+                                           useSingleIndirectMatch)
+        if cache is not None:
+            cache.set(term, matches[term], useSingleIndirectMatch=useSingleIndirectMatch)
+    return(matches, failures)
+
+def lookupGeneSymbols(terms, email, apiKey = None, maxConcurrency = 10, cache = None, batchSize = 500, client = None):
+    '''
+    Look up official human gene symbols for terms in NCBI Gene database, using a rate-limited asyncio client that
+    retries throttled (HTTP 429) and failed (HTTP 5xx, connection error) requests with exponential backoff.
+    
+    Args
+    - terms: list of str
+        terms to lookup
+    - email: str
+        email registered with NCBI
+    - apiKey: str
+        NCBI API key, which raises the allowed request rate from 3 to 10 requests per second. None: no API key
+    - maxConcurrency: int
+        maximum number of requests in flight
+    - cache: GeneSymbolCache
+        cache of previous lookups
+    - batchSize: int
+        maximum number of IDs per esummary request
+    - client: AsyncEntrezClient
+        client to use instead of one created from email, apiKey and maxConcurrency
+    
+    Returns: list of str
+      Where no matches found, returns the empty string. Otherwise, returns the first matched official gene symbol.
+    
+    Raises: GeneLookupError
+      if the lookup of any term failed after all retries. Successful lookups are still added to cache.
+    '''
+    
+    if client is None:
+        client = AsyncEntrezClient(email, apiKey=apiKey, maxConcurrency=maxConcurrency)
+    matches, failures = runSync(asyncSearchGeneNames(terms, client, cache=cache, batchSize=batchSize))
+    if len(failures) > 0:
+        raise GeneLookupError(failures)
+    return([geneSymbolFromMatch(term, matches[term]) for term in terms])
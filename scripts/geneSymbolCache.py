@@ -0,0 +1,125 @@
+'''
+Persistent on-disk cache of gene symbol lookups.
+
+Results of searchGeneNames() (official gene symbols and NCBI Gene IDs matched to a term) rarely change between runs,
+so they are stored in a SQLite database keyed on the term and the query options used to resolve it.
+'''
+
+import json
+import sqlite3
+import threading
+import time
+
+class GeneSymbolCache:
+    '''
+    SQLite-backed cache of gene symbol lookup results with time-to-live (TTL) expiry and least-recently-used (LRU)
+    size eviction. Safe to share between threads (e.g., the ThreadPool in multiThreadedSearchGeneNames).
+
+    Args:
+    - path: str
+        path to SQLite database file. Created if it does not exist. Use ":memory:" for a non-persistent cache.
+    - ttl: int or float
+        number of seconds after which a cached result expires. None: results never expire.
+    - maxEntries: int
+        maximum number of results to keep; least recently used results are evicted first. None: no limit.
+    '''
+
+    def __init__(self, path, ttl=30*24*60*60, maxEntries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS lookups ('
+                               'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS lookups_accessed ON lookups (accessed)')
+
+    @staticmethod
+    def makeKey(term, **options):
+        '''
+        Build the cache key for a term and the query options used to resolve it.
+
+        Args:
+        - term: str
+            gene name / alias
+        - **options
+            query options that affect the result, e.g. useSingleIndirectMatch
+
+        Returns: str
+        '''
+        return(json.dumps([term, options], sort_keys=True))
+
+    def get(self, term, **options):
+        '''
+        Look up a cached result.
+
+        Args:
+        - term: str
+            gene name / alias
+        - **options
+            query options that affect the result, e.g. useSingleIndirectMatch
+
+        Returns: dict: str -> list, or None
+            Cached result as returned by searchGeneNames(), or None if the term is not cached or has expired.
+        '''
+        key = self.makeKey(term, **options)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, created FROM lookups WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                with self._conn:
+                    self._conn.execute('DELETE FROM lookups WHERE key = ?', (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return(None)
+            with self._conn:
+                self._conn.execute('UPDATE lookups SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+        return(json.loads(row[0]))
+
+    def set(self, term, result, **options):
+        '''
+        Store a result, evicting least recently used results if the cache exceeds maxEntries.
+
+        Args:
+        - term: str
+            gene name / alias
+        - result: dict: str -> list
+            result as returned by searchGeneNames()
+        - **options
+            query options that affect the result, e.g. useSingleIndirectMatch
+        '''
+        key = self.makeKey(term, **options)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO lookups (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                               (key, json.dumps(result), now, now))
+            if self.maxEntries is not None:
+                self._conn.execute('DELETE FROM lookups WHERE key IN '
+                                   '(SELECT key FROM lookups ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                                   (self.maxEntries,))
+
+    def purgeExpired(self):
+        '''
+        Remove all expired results.
+
+        Returns: int
+            number of results removed
+        '''
+        if self.ttl is None:
+            return(0)
+        with self._lock, self._conn:
+            cursor = self._conn.execute('DELETE FROM lookups WHERE created < ?', (time.time() - self.ttl,))
+        return(cursor.rowcount)
+
+    def __len__(self):
+        with self._lock:
+            return(self._conn.execute('SELECT COUNT(*) FROM lookups').fetchone()[0])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,175 @@
+'''
+Instrumentation of pipeline stages.
+
+A RunReport records, for each stage (e.g., reading, cleaning or resolving a dataset):
+- wall and CPU time
+- number of rows in and out
+- changes of counters of registered sources during the stage, e.g. Entrez requests, retries and throttling events and
+  lookup cache hits / misses of a resolver (processing.Resolver.counters())
+
+The report is written as JSON; optionally, the whole run is profiled with cProfile and the profile written to a file
+that can be read with pstats or visualized with, e.g., snakeviz.
+
+Usage
+    report = RunReport(profilePath="process.prof")
+    report.addSource(resolver.counters)
+    with report:
+        df = report.run("read", "Klaeger", readRaw, path)
+        with report.stage("custom", "Klaeger") as record:
+            ...
+            record["rows_out"] = len(df)
+    report.write("process.json")
+'''
+
+import contextlib
+import cProfile
+import datetime
+import json
+import time
+import pandas as pd
+
+class RunReport:
+    '''
+    Args
+    - profilePath: str
+        path to which to write a cProfile profile of the run (between __enter__ and __exit__). None: do not profile
+    '''
+
+    def __init__(self, profilePath = None):
+        self.profilePath = profilePath
+        self.stages = []
+        self.sources = []
+        self.started = None
+        self.wall = None
+        self.cpu = None
+        self.counters = None
+        self._profiler = None
+        self._wall = None
+        self._cpu = None
+        self._counters0 = {}
+
+    def addSource(self, counters):
+        '''
+        Register a source of counters.
+
+        Args
+        - counters: function
+            () -> dict: str -> int or float, returning current (cumulative) values
+        '''
+        self.sources.append(counters)
+
+    def _counters(self):
+        values = {}
+        for source in self.sources:
+            values.update(source())
+        return(values)
+
+    @contextlib.contextmanager
+    def stage(self, name, dataset = None, rowsIn = None):
+        '''
+        Record a stage.
+
+        Args
+        - name: str
+            stage name
+        - dataset: str
+            dataset name. None: the stage applies to several or no datasets
+        - rowsIn: int
+            number of rows into the stage
+
+        Yields: dict
+            record of the stage; set "rows_out" (or other keys) before the end of the with block
+        '''
+        record = {"stage": name, "dataset": dataset, "rows_in": rowsIn, "rows_out": None}
+        counters = self._counters()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            after = self._counters()
+            record["counters"] = {k: v - counters.get(k, 0) for k, v in after.items() if v != counters.get(k, 0)}
+            self.stages.append(record)
+
+    def run(self, name, dataset, func, *args, **kwargs):
+        '''
+        Call a function as a stage. Rows in and out are the lengths of the first argument and the result if they are
+        pandas objects, or the total length of the pandas objects they contain if they are dicts or lists.
+
+        Args
+        - name: str
+            stage name
+        - dataset: str
+            dataset name
+        - func: function
+        - args, kwargs
+            arguments to func
+
+        Returns: return value of func
+        '''
+        rowsIn = _length(args[0]) if len(args) > 0 else None
+        with self.stage(name, dataset, rowsIn) as record:
+            result = func(*args, **kwargs)
+            record["rows_out"] = _length(result)
+        return(result)
+
+    def __enter__(self):
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        self._counters0 = self._counters()
+        if self.profilePath is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return(self)
+
+    def __exit__(self, *exc):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profilePath)
+            self._profiler = None
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        after = self._counters()
+        self.counters = {k: v - self._counters0.get(k, 0) for k, v in after.items()}
+        return(False)
+
+    def toDict(self):
+        '''
+        Returns: dict
+            started, wall_s, cpu_s, counters (totals over the run), stages (records in order of completion), profile
+        '''
+        return({"started": self.started, "wall_s": self.wall, "cpu_s": self.cpu,
+                "counters": self.counters, "stages": self.stages,
+                "profile": self.profilePath})
+
+    def write(self, path):
+        '''
+        Write the report as JSON.
+
+        Args
+        - path: str
+        '''
+        with open(path, "w") as f:
+            json.dump(self.toDict(), f, indent=1)
+
+def stageRunner(report):
+    '''
+    Args
+    - report: RunReport or None
+
+    Returns: function
+        (name, dataset, func, *args, **kwargs) -> func(*args, **kwargs), recorded as a stage of report if it is not None
+    '''
+    if report is not None:
+        return(report.run)
+    return(lambda name, dataset, func, *args, **kwargs: func(*args, **kwargs))
+
+def _length(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return(len(obj))
+    if isinstance(obj, (dict, list, tuple)):
+        lengths = [_length(x) for x in (obj.values() if isinstance(obj, dict) else obj)]
+        if len(lengths) > 0 and all(length is not None for length in lengths):
+            return(sum(lengths))
+    return(None)
@@ -0,0 +1,255 @@
+'''
+Compact, integer-coded representation of processed datasets for target selection.
+
+Instead of one DataFrame per dataset with string gene symbols, a KinomeMatrix holds
+- vocabulary: sorted array of the distinct gene symbols of all datasets (interned once)
+- per dataset, one row per processed row:
+    codes: int32 index of the row's gene symbol into the vocabulary (-1: no gene symbol)
+    values: float32 array per compound column (e.g. STF1081 and CC401 at the dataset's concentration). Columns whose
+      values are not exactly representable in float32 (e.g., 5.7 % control) are kept as float64 unless exact=False, so
+      that ties between differences, and hence ranks, are the same as for the processed data files.
+- present: uint64 bitmask per target; bit i is set if the target is in the i-th dataset (at most 64 datasets)
+
+Rows of a dataset are aligned to targets by indexing with their codes, so that filtering, intersection and rank
+aggregation across datasets are array operations without string merges. Results are identical to
+selection.intersectTargets() and selection.aggregateRanks() on the same datasets.
+
+Usage
+    matrix = KinomeMatrix.fromProcessed(["Klaeger", "Huang", "Annes100"], dataAux_dir)
+    intersect = matrix.intersect(diff_percent_thresh=20)
+    rank = matrix.rankSums()
+'''
+
+import numpy as np
+import pandas as pd
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+from rankAggregation import normalizedRanks
+from selection import booleanFilter, diffRankArray, readDataset
+
+MAX_DATASETS = 64
+
+class KinomeMatrix:
+    '''
+    Args
+    - vocabulary: numpy.ndarray of str
+        sorted distinct gene symbols
+    - datasets: dict: str -> dict
+        dataset name -> {"codes": numpy.ndarray of int32, "values": dict: str -> numpy.ndarray of float32 or float64,
+                         "metric", "referenceCol", "compoundCol": see datasets.py}
+    - keyCol: str
+        name of the gene symbol column of returned Series
+    '''
+
+    def __init__(self, vocabulary, datasets, keyCol = GENE_SYMBOL_COLUMN):
+        if len(datasets) > MAX_DATASETS:
+            raise ValueError("At most {:d} datasets are supported".format(MAX_DATASETS))
+        self.vocabulary = vocabulary
+        self.datasets = datasets
+        self.keyCol = keyCol
+        self.present = np.zeros(len(vocabulary), dtype=np.uint64)
+        for i, dataset in enumerate(datasets.values()):
+            codes = dataset["codes"]
+            self.present[codes[codes >= 0]] |= np.uint64(1 << i)
+
+    @classmethod
+    def fromFrames(cls, dfs, specs = None, keyCol = GENE_SYMBOL_COLUMN, exact = True):
+        '''
+        Args
+        - dfs: dict: str -> pandas.DataFrame
+            dataset name -> processed dataset
+        - specs: dict: str -> dict
+            dataset name -> metric, referenceCol and compoundCol. None: DATASETS
+        - keyCol: str
+            column of gene symbols
+        - exact: bool
+            keep columns not exactly representable in float32 as float64. False: store all values as float32
+
+        Returns: KinomeMatrix
+        '''
+        specs = DATASETS if specs is None else specs
+        keys = {name: df[keyCol].to_numpy(dtype=object) for name, df in dfs.items()}
+        symbols = pd.unique(np.concatenate([k[pd.notna(k)] for k in keys.values()]).astype(str))
+        vocabulary = np.sort(symbols.astype(object))
+        index = pd.Index(vocabulary)
+        datasets = {}
+        for name, df in dfs.items():
+            spec = specs[name]
+            valueCols = [col for col in df.columns if col != keyCol and pd.api.types.is_numeric_dtype(df[col])
+                         and not pd.api.types.is_bool_dtype(df[col])]
+            datasets[name] = {"codes": index.get_indexer(keys[name]).astype(np.int32),
+                              "values": {col: _compact(df[col].to_numpy(dtype=float), exact) for col in valueCols},
+                              "metric": spec["metric"], "referenceCol": spec["referenceCol"],
+                              "compoundCol": spec["compoundCol"]}
+        return(cls(vocabulary, datasets, keyCol))
+
+    @classmethod
+    def fromProcessed(cls, names, dataAux_dir, useCache = True, exact = True):
+        '''
+        Args
+        - names: list of str
+            datasets, keys of DATASETS
+        - dataAux_dir: str
+            directory of processed data files
+        - useCache: bool
+            see selection.readDataset()
+        - exact: bool
+            see fromFrames()
+
+        Returns: KinomeMatrix
+        '''
+        return(cls.fromFrames({name: readDataset(name, dataAux_dir, useCache) for name in names}, exact=exact))
+
+    def nbytes(self):
+        '''
+        Returns: int
+            bytes of codes, values and bitmask arrays (the vocabulary is counted as the sizes of its strings)
+        '''
+        total = self.present.nbytes + sum(len(symbol) for symbol in self.vocabulary)
+        for dataset in self.datasets.values():
+            total += dataset["codes"].nbytes + sum(values.nbytes for values in dataset["values"].values())
+        return(total)
+
+    def targetMask(self, name, rows):
+        '''
+        Align a row-level mask of a dataset to targets.
+
+        Args
+        - name: str
+            dataset name
+        - rows: numpy.ndarray of bool
+            one value per row of the dataset
+
+        Returns: numpy.ndarray of bool
+            one value per target of the vocabulary; True if any row of the target is True
+        '''
+        codes = self.datasets[name]["codes"]
+        mask = np.zeros(len(self.vocabulary), dtype=bool)
+        mask[codes[rows & (codes >= 0)]] = True
+        return(mask)
+
+    def firstRows(self, name):
+        '''
+        Args
+        - name: str
+            dataset name
+
+        Returns: numpy.ndarray of int
+            index of the first row of each target in the dataset; -1 for targets not in the dataset
+        '''
+        codes = self.datasets[name]["codes"]
+        rows = np.full(len(self.vocabulary), -1, dtype=np.int64)
+        valid = np.flatnonzero(codes >= 0)
+        # assign in reverse so that the first row of each target is written last
+        rows[codes[valid[::-1]]] = valid[::-1]
+        return(rows)
+
+    def filter(self, name, **thresholds):
+        '''
+        Boolean filtering of a dataset (selection.booleanFilter()) on value arrays.
+
+        Args
+        - name: str
+            dataset name
+        - thresholds
+            keyword arguments of selection.booleanFilter()
+
+        Returns: numpy.ndarray of bool
+            one label per row of the dataset
+        '''
+        dataset = self.datasets[name]
+        values = {col: v.astype(float) for col, v in dataset["values"].items()}
+        with np.errstate(invalid='ignore'):
+            return(np.asarray(booleanFilter(values, dataset["metric"], dataset["referenceCol"], dataset["compoundCol"],
+                                            **thresholds)))
+
+    def intersect(self, names = None, **thresholds):
+        '''
+        Targets labeled True in every dataset (see selection.intersectTargets()).
+
+        Args
+        - names: list of str
+            datasets. None: all datasets
+        - thresholds
+            keyword arguments of selection.booleanFilter()
+
+        Returns: pandas.Series
+            sorted targets
+        '''
+        names = list(self.datasets) if names is None else names
+        mask = np.ones(len(self.vocabulary), dtype=bool)
+        for name in names:
+            mask &= self.targetMask(name, self.filter(name, **thresholds))
+        return(pd.Series(self.vocabulary[mask], name=self.keyCol, dtype=object))
+
+    def ranks(self, name):
+        '''
+        Normalized difference rank (selection.normalizedDiffRank()) of each row of a dataset.
+
+        Args
+        - name: str
+            dataset name
+
+        Returns: numpy.ndarray of float
+        '''
+        dataset = self.datasets[name]
+        return(diffRankArray(dataset["values"][dataset["referenceCol"]], dataset["values"][dataset["compoundCol"]]))
+
+    def rankSums(self, names = None):
+        '''
+        Sum ranks across datasets for targets present in all datasets (see selection.aggregateRanks()).
+
+        Args
+        - names: list of str
+            datasets; repeated names are used once. None: all datasets
+
+        Returns: pandas.Series
+            summed rank of each target present in all datasets, indexed by target and sorted by increasing summed rank;
+            ties are in order of first occurrence in the first dataset
+        '''
+        names, bits = self._bits(names)
+        common = np.flatnonzero(self.present & bits == bits)
+        total = np.zeros(len(common))
+        for name in names:
+            rows = self.firstRows(name)[common]
+            if np.any(rows < 0):
+                raise RuntimeError("Targets present in all datasets are missing from " + name)
+            total += self.ranks(name)[rows]
+        order = np.argsort(self.firstRows(names[0])[common], kind='stable')
+        common, total = common[order], total[order]
+        order = np.argsort(total, kind='stable')
+        return(pd.Series(total[order], index=pd.Index(self.vocabulary[common[order]], name=self.keyCol)))
+
+    def rankMatrix(self, names = None):
+        '''
+        Normalized ranks of the targets of each dataset, including targets missing from some datasets (see
+        rankAggregation.rankMatrix()).
+
+        Args
+        - names: list of str
+            datasets; repeated names are used once. None: all datasets
+
+        Returns: pandas.DataFrame
+            one row per target in any of the datasets (sorted), one column per dataset; NaN where a target is not in a
+            dataset
+        '''
+        names, bits = self._bits(names)
+        targets = np.flatnonzero(self.present & bits)
+        ranks = np.full((len(targets), len(names)), np.nan)
+        for i, name in enumerate(names):
+            rows = self.firstRows(name)[targets]
+            present = rows >= 0
+            ranks[present, i] = normalizedRanks(self.ranks(name)[rows[present]])
+        return(pd.DataFrame(ranks, index=pd.Index(self.vocabulary[targets], name=self.keyCol), columns=names))
+
+    def _bits(self, names):
+        # distinct names (in order) and the bitmask of their datasets in present
+        names = list(self.datasets) if names is None else list(dict.fromkeys(names))
+        order = list(self.datasets)
+        bits = np.bitwise_or.reduce([np.uint64(1 << order.index(name)) for name in names], initial=np.uint64(0))
+        return(names, np.uint64(bits))
+
+def _compact(values, exact = True):
+    compact = values.astype(np.float32)
+    if exact and not np.array_equal(compact, values, equal_nan=True):
+        return(values)
+    return(compact)
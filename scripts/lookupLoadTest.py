@@ -0,0 +1,219 @@
+'''
+Load test of gene symbol lookups (geneLookup.py) against the local E-utilities stand-in (eutilsStandIn.py).
+
+For each lookup mode and concurrency level, looks up a set of terms against a fresh stand-in server with the given
+faults, and reports
+- throughput: terms looked up per second
+- tail latency: 50th, 95th and 99th percentile seconds per term lookup (esearch + esummary, from when a thread or
+  task starts the lookup; not available for multiThreadedSearchGeneNames, which fetches summaries of all terms
+  together)
+- error rate: fraction of terms whose lookup raised an error
+- silently empty rate: fraction of terms with an expected gene symbol (from the fixtures) for which the lookup returned
+  no symbol without raising an error
+- wrong rate: fraction of terms for which the lookup returned a different symbol
+- server counts: requests, HTTP 429, 503, dropped connections and empty responses served
+
+Modes
+- searchGeneNames: geneLookup.searchGeneNames() per term (Biopython) in a ThreadPool of `concurrency` threads
+- multiThreadedSearchGeneNames: geneLookup.multiThreadedSearchGeneNames() with `concurrency` threads (Biopython)
+- async: geneLookup.asyncSearchGeneNames() per term with an AsyncEntrezClient of maxConcurrency `concurrency`
+
+Both Biopython and AsyncEntrezClient limit requests to about 3 per second (the async client's rate is set by
+--client-rate). Biopython sleeps Bio.Entrez.sleep_between_tries seconds (15 by default; --biopython-retry-sleep) after
+connection errors.
+
+Usage
+    python scripts/lookupLoadTest.py [--fixtures PATH] [--modes MODE ...] [--concurrency N ...] [--latency S]
+        [--jitter S] [--throttle-rate P] [--rate-limit R] [--drop-rate P] [--empty-rate P] [--output PATH]
+    python scripts/lookupLoadTest.py --record PATH --email EMAIL   # record fixtures for our panels from NCBI
+'''
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import pandas as pd
+from datasets import DATASETS
+from entrezClient import AsyncEntrezClient, runSync
+from eutilsStandIn import (Faults, StandInServer, fixturesFromProcessed, readFixtures, recordFixtures,
+                           writeFixtures)
+import geneLookup
+
+MODES = ["searchGeneNames", "multiThreadedSearchGeneNames", "async"]
+EMAIL = "example@gmail.com"
+
+def expectedSymbols(fixtures, terms):
+    '''
+    Gene symbols that lookups of terms should return when served from fixtures without faults.
+
+    Args
+    - fixtures: dict
+        see eutilsStandIn.py
+    - terms: list of str
+
+    Returns: list of str
+        "" where no symbol is expected
+    '''
+    symbols = []
+    for term in terms:
+        idList = [id for id in fixtures["esearch"].get(term, []) if id in fixtures["esummary"]]
+        match = geneLookup.matchGeneSummaries(term, idList, fixtures["esummary"])
+        symbols.append(geneLookup.geneSymbolFromMatch(term, match))
+    return(symbols)
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    try:
+        return(func(*args), time.perf_counter() - start, None)
+    except Exception as e:
+        return(None, time.perf_counter() - start, e)
+
+def lookupSearchGeneNames(terms, concurrency):
+    def lookup(term):
+        return(geneLookup.geneSymbolFromMatch(term, geneLookup.searchGeneNames(term, EMAIL)))
+    with ThreadPool(concurrency) as pool:
+        return(pool.starmap(_timed, [(lookup, term) for term in terms]))
+
+def lookupMultiThreaded(terms, concurrency):
+    symbols, seconds, error = _timed(geneLookup.multiThreadedSearchGeneNames, terms, EMAIL, concurrency)
+    if error is not None:
+        return([(None, None, error)] * len(terms))
+    return([(symbol, None, None) for symbol in symbols])
+
+def lookupAsync(terms, concurrency, baseUrl, rate = None):
+    client = AsyncEntrezClient(EMAIL, rate=rate, maxConcurrency=concurrency, baseUrl=baseUrl)
+    semaphore = asyncio.Semaphore(concurrency)
+    async def lookup(term):
+        async with semaphore:
+            start = time.perf_counter()
+            matches, failures = await geneLookup.asyncSearchGeneNames([term], client)
+            seconds = time.perf_counter() - start
+        if term in failures:
+            return(None, seconds, failures[term])
+        return(geneLookup.geneSymbolFromMatch(term, matches[term]), seconds, None)
+    async def lookupAll():
+        return(await asyncio.gather(*[lookup(term) for term in terms]))
+    return(runSync(lookupAll()))
+
+def runLoad(fixtures, terms, mode, concurrency, faults = None, clientRate = None):
+    '''
+    Look up terms against a new stand-in server.
+
+    Args
+    - fixtures: dict
+        see eutilsStandIn.py
+    - terms: list of str
+    - mode: str
+        see MODES
+    - concurrency: int
+        number of threads or requests in flight
+    - faults: eutilsStandIn.Faults
+    - clientRate: float
+        maximum requests per second of the AsyncEntrezClient (async mode). None: NCBI's limit without an API key
+
+    Returns: dict
+        mode, concurrency, n_terms, wall_s, throughput, latency_p50_s, latency_p95_s, latency_p99_s, error_rate,
+        silently_empty_rate, wrong_rate, server (counts of the stand-in server)
+    '''
+    expected = expectedSymbols(fixtures, terms)
+    with StandInServer(fixtures, faults) as server:
+        start = time.perf_counter()
+        if mode == "async":
+            results = lookupAsync(terms, concurrency, server.baseUrl, clientRate)
+        else:
+            lookup = lookupSearchGeneNames if mode == "searchGeneNames" else lookupMultiThreaded
+            with server.redirect():
+                results = lookup(terms, concurrency)
+        wall = time.perf_counter() - start
+        counts = dict(server.counts)
+    symbols = [symbol for symbol, _, _ in results]
+    errors = np.array([error is not None for _, _, error in results])
+    empty = np.array([error is None and not symbol and bool(exp) for symbol, exp, (_, _, error)
+                      in zip(symbols, expected, results)])
+    wrong = np.array([error is None and bool(symbol) and symbol != exp for symbol, exp, (_, _, error)
+                      in zip(symbols, expected, results)])
+    latencies = [seconds for _, seconds, _ in results if seconds is not None]
+    percentiles = np.percentile(latencies, [50, 95, 99]) if len(latencies) > 0 else [None] * 3
+    n = len(terms)
+    return({"mode": mode, "concurrency": concurrency, "n_terms": n, "wall_s": wall, "throughput": n / wall,
+            "latency_p50_s": _float(percentiles[0]), "latency_p95_s": _float(percentiles[1]),
+            "latency_p99_s": _float(percentiles[2]), "error_rate": errors.mean(), "silently_empty_rate": empty.mean(),
+            "wrong_rate": wrong.mean(), "server": counts})
+
+def _float(x):
+    return(None if x is None else float(x))
+
+def panelTerms(dataAux_dir):
+    '''
+    Returns: list of str
+        distinct names of all processed datasets
+    '''
+    names = [pd.read_csv(os.path.join(dataAux_dir, dataset["filename"]))['Name'] for dataset in DATASETS.values()]
+    return(list(dict.fromkeys(pd.concat(names).dropna())))
+
+def main(argv = None):
+    rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Load test gene symbol lookups against a local E-utilities stand-in")
+    parser.add_argument('--data-aux-dir', default=os.path.join(rootDir, "data_aux"),
+                        help="processed datasets whose names are looked up")
+    parser.add_argument('--fixtures', default=None,
+                        help="JSON fixtures (see eutilsStandIn.py). Default: derived from processed datasets")
+    parser.add_argument('--record', default=None, metavar="PATH",
+                        help="record fixtures for the names of processed datasets from NCBI to PATH and exit")
+    parser.add_argument('--email', default=EMAIL, help="email registered with NCBI (--record)")
+    parser.add_argument('--terms', type=int, default=100, help="number of names to look up. 0: all")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds before each response")
+    parser.add_argument('--jitter', type=float, default=0.05, help="maximum additional seconds before each response")
+    parser.add_argument('--throttle-rate', type=float, default=0, help="probability of HTTP 429")
+    parser.add_argument('--rate-limit', type=float, default=None, help="requests per second above which to send 429")
+    parser.add_argument('--server-error-rate', type=float, default=0, help="probability of HTTP 503")
+    parser.add_argument('--drop-rate', type=float, default=0, help="probability of dropping the connection")
+    parser.add_argument('--empty-rate', type=float, default=0, help="probability of an empty esearch response")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--client-rate', type=float, default=None,
+                        help="maximum requests per second of the asyncio client. Default: NCBI's limit (3)")
+    parser.add_argument('--biopython-retry-sleep', type=float, default=1,
+                        help="seconds Biopython waits before retrying after a connection error")
+    parser.add_argument('--output', default="lookupLoadTest.json", help="path of JSON file of results")
+    args = parser.parse_args(argv)
+
+    terms = panelTerms(args.data_aux_dir)
+    if args.record is not None:
+        writeFixtures(recordFixtures(terms, AsyncEntrezClient(args.email)), args.record)
+        return
+    if args.fixtures is not None:
+        fixtures = readFixtures(args.fixtures)
+    else:
+        fixtures = fixturesFromProcessed([pd.read_csv(os.path.join(args.data_aux_dir, dataset["filename"]))
+                                          for dataset in DATASETS.values()])
+    terms = terms[:args.terms or None]
+    if any(mode != "async" for mode in args.modes):
+        from Bio import Entrez
+        Entrez.sleep_between_tries = args.biopython_retry_sleep
+
+    records = []
+    for mode in args.modes:
+        for concurrency in args.concurrency:
+            faults = Faults(args.latency, args.jitter, args.throttle_rate, args.rate_limit, None,
+                            args.server_error_rate, args.drop_rate, args.empty_rate, args.seed)
+            record = runLoad(fixtures, terms, mode, concurrency, faults, args.client_rate)
+            records.append(record)
+            print("{:<29} {:>3d}: {:7.1f} terms/s, p95 {}, errors {:.1%}, silently empty {:.1%}".format(
+                mode, concurrency, record["throughput"],
+                "-" if record["latency_p95_s"] is None else "{:.3f} s".format(record["latency_p95_s"]),
+                record["error_rate"], record["silently_empty_rate"]))
+    report = {"created": datetime.datetime.now().isoformat(timespec='seconds'),
+              "config": {k: v for k, v in vars(args).items() if k not in ('record', 'email')},
+              "results": records}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+'''
+Local rule-based normalization of kinase names to official gene symbols, applied before remote lookups.
+
+Panels often name kinases by protein names or common aliases ("p38 alpha", "EPH-A2", "CDK2-Cyclin A", "Aurora B").
+KinaseNameNormalizer resolves such names locally when possible:
+1. normalize: upper-case; strip a trailing species tag ("(hum)") and cyclin partner ("-Cyclin A"); write Greek letter
+   words as the letters used in gene symbols ("beta" -> "B") or, alternatively, as numbers ("beta" -> "2"); remove
+   hyphens, spaces and underscores ("EPH-A2" -> "EPHA2")
+2. match: the first normalized form that is a known official gene symbol (a symbol of the alias table KINASE_ALIASES or
+   of the manual overrides in processing.py, or of a previously processed dataset) or a key of the alias table resolves
+   the name. As in NCBI Gene lookups, a name that is an
+   official gene symbol resolves to that symbol even if it is also an alias of another gene.
+
+Names that are not matched are left for the remote resolver. All rules are vectorized pandas string operations over
+the distinct names of a call.
+'''
+
+import os
+import pandas as pd
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+
+# Version of KINASE_ALIASES and the normalization rules; included in build cache keys of datasets resolved with them
+KINASE_ALIASES_VERSION = 2
+
+# Common kinase aliases (protein names) -> official gene symbols. Keys are normalized when the table is loaded.
+KINASE_ALIASES = {
+    "ABL": "ABL1",
+    "AMPK (hum)": "PRKAA1",
+    "ASK1": "MAP3K5",
+    "Aurora A": "AURKA",
+    "Aurora B": "AURKB",
+    "Aurora C": "AURKC",
+    "BRK": "PTK6",
+    "CAMKK alpha": "CAMKK1",
+    "CAMKK beta": "CAMKK2",
+    "CHK1": "CHEK1",
+    "CHK2": "CHEK2",
+    "CK1 alpha": "CSNK1A1",
+    "CK1 delta": "CSNK1D",
+    "CK1 epsilon": "CSNK1E",
+    "CK1 gamma 1": "CSNK1G1",
+    "CK1 gamma 2": "CSNK1G2",
+    "CK1 gamma 3": "CSNK1G3",
+    "CK2": "CSNK2A1",
+    "CK2 alpha": "CSNK2A1",
+    "CK2 alpha'": "CSNK2A2",
+    "EF2K": "EEF2K",
+    "ERK1": "MAPK3",
+    "ERK2": "MAPK1",
+    "ERK5": "MAPK7",
+    "ERK8": "MAPK15",
+    "HER2": "ERBB2",
+    "HER4": "ERBB4",
+    "IKK alpha": "CHUK",
+    "IKK beta": "IKBKB",
+    "IKK epsilon": "IKBKE",
+    "IRR": "INSRR",
+    "JNK1": "MAPK8",
+    "JNK2": "MAPK9",
+    "JNK3": "MAPK10",
+    "LKB1": "STK11",
+    "MAPKAP-K2": "MAPKAPK2",
+    "MAPKAP-K3": "MAPKAPK3",
+    "MEKK1": "MAP3K1",
+    "MKK1": "MAP2K1",
+    "MKK2": "MAP2K2",
+    "MKK4": "MAP2K4",
+    "MKK6": "MAP2K6",
+    "MKK7": "MAP2K7",
+    "MLK1": "MAP3K9",
+    "MLK3": "MAP3K11",
+    "MNK1": "MKNK1",
+    "MNK2": "MKNK2",
+    "MPSK1": "STK16",
+    "MSK1": "RPS6KA5",
+    "MSK2": "RPS6KA4",
+    "MST1": "STK4",
+    "MST2": "STK3",
+    "MST3": "STK24",
+    "MST4": "STK26",
+    "NEK2a": "NEK2",
+    "p38 alpha": "MAPK14",
+    "p38 beta": "MAPK11",
+    "p38 gamma": "MAPK12",
+    "p38 delta": "MAPK13",
+    "PINK": "PINK1",
+    "PKA": "PRKACA",
+    "PKB alpha": "AKT1",
+    "PKB beta": "AKT2",
+    "PKB gamma": "AKT3",
+    "PKC alpha": "PRKCA",
+    "PKC beta": "PRKCB",
+    "PKC gamma": "PRKCG",
+    "PKC delta": "PRKCD",
+    "PKC epsilon": "PRKCE",
+    "PKC zeta": "PRKCZ",
+    "PKC theta": "PRKCQ",
+    "PKC iota": "PRKCI",
+    "PRAK": "MAPKAPK5",
+    "PRK2": "PKN2",
+    "RSK1": "RPS6KA1",
+    "RSK2": "RPS6KA3",
+    "RSK3": "RPS6KA2",
+    "RSK4": "RPS6KA6",
+    "S6K1": "RPS6KB1",
+    "SmMLCK": "MYLK",
+    "TAK1": "MAP3K7",
+    "TAO1": "TAOK1",
+    "TIE2": "TEK",
+    "TrkA": "NTRK1",
+    "TrkB": "NTRK2",
+    "TrkC": "NTRK3",
+    "VEGFR1": "FLT1",
+    "VEGFR2": "KDR",
+    "VEGFR3": "FLT4"}
+
+# Greek letter words -> letters used in gene symbols (e.g., GSK3B) and numbers (e.g., CAMKK2)
+GREEK_LETTERS = {"ALPHA": "A", "BETA": "B", "GAMMA": "G", "DELTA": "D", "EPSILON": "E", "ZETA": "Z", "ETA": "H",
+                 "THETA": "Q", "IOTA": "I"}
+GREEK_NUMBERS = {"ALPHA": "1", "BETA": "2", "GAMMA": "3", "DELTA": "4", "EPSILON": "5", "ZETA": "6", "ETA": "7",
+                 "THETA": "8", "IOTA": "9"}
+
+_greekPattern = r"(?<![A-Z])(" + "|".join(sorted(GREEK_LETTERS, key=len, reverse=True)) + r")(?![A-Z])"
+
+def normalizeNames(names, greek = GREEK_LETTERS):
+    '''
+    Normalize names (see module docstring).
+
+    Args
+    - names: pandas.Series of str
+    - greek: dict: str -> str
+        replacements of upper-case Greek letter words
+
+    Returns: pandas.Series of str
+        same index as names
+    '''
+    names = names.str.upper().str.strip()
+    names = names.str.replace(r"\s*\((HUM|HUMAN|H)\)$", "", regex=True)
+    names = names.str.replace(r"[-\s/]*CYCLIN[-\s]*[A-Z]?\d*$", "", regex=True)
+    names = names.str.replace(_greekPattern, lambda m: greek[m.group(1)], regex=True)
+    return(names.str.replace(r"[-\s_]", "", regex=True))
+
+class KinaseNameNormalizer:
+    '''
+    Args
+    - symbols: iterable of str
+        additional known official gene symbols, e.g. from fromProcessed()
+    - aliases: dict: str -> str
+        aliases -> official gene symbols; keys are normalized, values are known official gene symbols
+    - overrides: dict: str -> dict: str -> str
+        dataset name -> manual official gene symbols for names; values are known official gene symbols.
+        None: processing.GENE_SYMBOL_OVERRIDES
+    '''
+
+    def __init__(self, symbols = (), aliases = None, overrides = None):
+        aliases = KINASE_ALIASES if aliases is None else aliases
+        if overrides is None:
+            from processing import GENE_SYMBOL_OVERRIDES
+            overrides = GENE_SYMBOL_OVERRIDES
+        keys = pd.Series(list(aliases), dtype=object)
+        self.table = dict(zip(normalizeNames(keys, GREEK_NUMBERS), aliases.values()))
+        self.table.update(zip(normalizeNames(keys), aliases.values()))
+        # official gene symbols take precedence over aliases
+        symbols = list(symbols) + list(aliases.values())
+        for table in overrides.values():
+            symbols.extend(table.values())
+        self.table.update({symbol.upper(): symbol for symbol in symbols if isinstance(symbol, str) and symbol})
+        self.version = KINASE_ALIASES_VERSION
+
+    @classmethod
+    def fromProcessed(cls, dataAux_dir, names = None, aliases = None, overrides = None):
+        '''
+        Create a normalizer whose known official gene symbols also include those of processed datasets. Datasets not
+        yet processed are skipped.
+
+        Args
+        - dataAux_dir: str
+            directory of processed data files
+        - names: list of str
+            datasets whose symbols to use. None: all datasets in DATASETS
+        - aliases, overrides: dict
+            see KinaseNameNormalizer
+
+        Returns: KinaseNameNormalizer
+        '''
+        symbols = set()
+        for name in (list(DATASETS) if names is None else names):
+            path = os.path.join(dataAux_dir, DATASETS[name]["filename"])
+            if os.path.exists(path):
+                symbols.update(pd.read_csv(path, usecols=[GENE_SYMBOL_COLUMN])[GENE_SYMBOL_COLUMN].dropna())
+        return(cls(symbols, aliases, overrides))
+
+    def normalize(self, terms):
+        '''
+        Resolve terms locally.
+
+        Args
+        - terms: list of str
+
+        Returns: list of str or None
+            official gene symbol of each term; None where the term was not resolved
+        '''
+        if len(terms) == 0:
+            return([])
+        unique = pd.Series(pd.unique(pd.Series(terms, dtype=object)), dtype=object)
+        resolved = normalizeNames(unique).map(self.table)
+        missing = resolved.isna()
+        if missing.any():
+            resolved[missing] = normalizeNames(unique[missing], GREEK_NUMBERS).map(self.table)
+        symbols = dict(zip(unique, resolved.astype(object).where(resolved.notna(), None)))
+        return([symbols[term] for term in terms])
@@ -0,0 +1,154 @@
+'''
+Processing and selection as a graph of tasks (see scheduler.py), so that datasets are processed concurrently.
+
+Each dataset to process is a chain of tasks
+    read (io) -> clean (cpu) -> split / condense (cpu) -> resolve (io) -> finalize (cpu) -> write (io)
+and each dataset to select from continues with
+    filter (cpu), rank (cpu)
+as soon as it is finalized (or read from data_aux/ if it is not processed in this run). Selection across datasets
+(intersection, summed ranks) starts when every selected dataset has been filtered and ranked. Resolve tasks share a
+scheduler.SharedResolver, so names shared by datasets are looked up once even when datasets are resolved concurrently.
+
+End-to-end time is therefore bounded by the slowest chain rather than the sum over datasets. Results are identical to
+running processing.processAll() followed by `stf1081.py select`.
+'''
+
+import os
+import numpy as np
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+from processing import (GENE_SYMBOL_OVERRIDES, buildParams, readRaw, cleanKinobeads, cleanPercent,
+                        splitMultiTargetRows, condenseDuplicatesByKey, resolveGeneSymbols, finalizeDataset, writeDataset)
+from scheduler import SharedResolver, TaskGraph
+from selection import (readDataset, booleanFilter, intersectTargets, normalizedDiffRank, aggregateRanks,
+                       writeIntersect, writeRank)
+
+def addProcessingTasks(graph, name, data_dir, dataAux_dir, resolver, highConfidenceOnly = True,
+                       condense_func = np.mean, cache = None, key = None):
+    '''
+    Add the tasks processing a dataset to a graph.
+
+    Args
+    - graph: scheduler.TaskGraph
+    - name: str
+        dataset name, a key of DATASETS
+    - data_dir, dataAux_dir, highConfidenceOnly, condense_func
+        see processing.processAll()
+    - resolver: function
+        gene symbol resolver; should be a scheduler.SharedResolver if several datasets are processed
+    - cache: buildCache.BuildCache
+        cache in which to store the processed dataset. None: do not store
+    - key: str
+        cache key of the dataset (see processing.buildParams())
+
+    Returns: scheduler.Dep
+        placeholder for the processed dataset (result of task "finalize:<name>")
+    '''
+    dataset = DATASETS[name]
+    valueCols = [dataset["compoundCol"], dataset["referenceCol"]]
+    path = os.path.join(data_dir, dataset["filename"])
+    if dataset["metric"] == "fold":
+        df = graph.add("read:" + name, readRaw, path, ['Name'] + valueCols, na_values=["n.d."])
+        df = graph.add("clean:" + name, cleanKinobeads, df, valueCols, highConfidenceOnly, kind="cpu")
+        df = graph.add("split:" + name, splitMultiTargetRows, df, 'Name', kind="cpu")
+    else:
+        df = graph.add("read:" + name, readRaw, path)
+        df = graph.add("clean:" + name, cleanPercent, df, kind="cpu")
+        if name.startswith("Annes"):
+            df = graph.add("condense:" + name, condenseDuplicatesByKey, df, "Name", dataset["compoundCol"],
+                           condense_func, kind="cpu")
+    df = graph.add("resolve:" + name, resolveGeneSymbols, df, resolver, GENE_SYMBOL_OVERRIDES.get(name))
+    df = graph.add("finalize:" + name, finalizeDataset, df, valueCols, kind="cpu")
+    graph.add("write:" + name, writeDataset, df, name, dataAux_dir)
+    if cache is not None:
+        graph.add("store:" + name, cache.store, name, key, df, os.path.join(dataAux_dir, dataset["filename"]),
+                  after=["write:" + name])
+    return(df)
+
+def addSelectionTasks(graph, datasets, thresholds, results_dir):
+    '''
+    Add the tasks selecting targets from datasets to a graph.
+
+    Args
+    - graph: scheduler.TaskGraph
+    - datasets: dict: str -> scheduler.Dep
+        dataset name -> placeholder for the processed dataset
+    - thresholds: dict
+        keyword arguments of selection.booleanFilter()
+    - results_dir: str
+        directory to which to write intersect.txt and rank.tsv
+
+    Returns: scheduler.Dep
+        placeholder for (intersection of targets, summed ranks) (result of task "select")
+    '''
+    bools, ranks = [], []
+    for name, df in datasets.items():
+        dataset = DATASETS[name]
+        bools.append(graph.add("filter:" + name, _filter, df, dataset["metric"], dataset["referenceCol"],
+                               dataset["compoundCol"], thresholds, kind="cpu"))
+        ranks.append(graph.add("rank:" + name, _rank, df, dataset["referenceCol"], dataset["compoundCol"], kind="cpu"))
+    return(graph.add("select", _select, results_dir, list(datasets.values()), bools, ranks))
+
+def runPipeline(data_dir, dataAux_dir, results_dir, resolver, processNames = None, selectNames = None,
+                thresholds = None, highConfidenceOnly = True, condense_func = np.mean, cache = None, resolverKey = None,
+                nProcesses = None, nThreads = None):
+    '''
+    Process datasets and select targets, running independent tasks concurrently.
+
+    Args
+    - data_dir, dataAux_dir, resolver, highConfidenceOnly, condense_func, cache, resolverKey
+        see processing.processAll()
+    - results_dir: str
+        directory to which to write intersect.txt and rank.tsv
+    - processNames: list of str
+        datasets to process. None: all datasets in DATASETS
+    - selectNames: list of str
+        datasets from which to select targets; datasets not processed are read from dataAux_dir. None or empty: do not
+        select targets
+    - thresholds: dict
+        keyword arguments of selection.booleanFilter(). None: defaults
+    - nProcesses, nThreads
+        see scheduler.TaskGraph.run()
+
+    Returns: dict: str -> object
+        task name -> result; "finalize:<name>" are processed datasets, "select" is (intersection, summed ranks)
+    '''
+    processNames = list(DATASETS) if processNames is None else processNames
+    selectNames = [] if selectNames is None else selectNames
+    graph = TaskGraph()
+    resolver = SharedResolver(resolver)
+    datasets = {}
+    for name in processNames:
+        key = None
+        if cache is not None:
+            key = cache.key([os.path.join(data_dir, DATASETS[name]["filename"])],
+                            buildParams(name, highConfidenceOnly, condense_func, resolverKey))
+            df = cache.load(name, key, os.path.join(dataAux_dir, DATASETS[name]["filename"]))
+            if df is not None:
+                datasets[name] = graph.add("finalize:" + name, lambda df: df, df)
+                continue
+        datasets[name] = addProcessingTasks(graph, name, data_dir, dataAux_dir, resolver, highConfidenceOnly,
+                                            condense_func, cache, key)
+    if len(selectNames) > 0:
+        selected = {name: datasets[name] if name in datasets else graph.add("readProcessed:" + name, readDataset, name,
+                                                                            dataAux_dir)
+                    for name in selectNames}
+        addSelectionTasks(graph, selected, thresholds or {}, results_dir)
+    return(graph.run(nProcesses, nThreads))
+
+def _asWritten(df):
+    # Missing gene symbols are empty strings in processed datasets and NaN when read back from data_aux/
+    return(df.replace({GENE_SYMBOL_COLUMN: {"": np.nan}}))
+
+def _filter(df, metric, referenceCol, compoundCol, thresholds):
+    return(booleanFilter(df, metric, referenceCol, compoundCol, **thresholds))
+
+def _rank(df, referenceCol, compoundCol):
+    return(normalizedDiffRank(df, referenceCol, compoundCol))
+
+def _select(results_dir, dfs, bools, ranks):
+    dfs = [_asWritten(df).assign(bool=b, rank=r) for df, b, r in zip(dfs, bools, ranks)]
+    intersect = intersectTargets(dfs)
+    rank = aggregateRanks(dfs)
+    writeIntersect(intersect, os.path.join(results_dir, "intersect.txt"))
+    writeRank(rank, os.path.join(results_dir, "rank.tsv"))
+    return(intersect, rank)
@@ -5,12 +5,19 @@
 
 
 # Import all packages
+# - Processing functions are defined in processing.py; this script runs them step by step and displays intermediate
+#   results. To run without Jupyter / IPython, use `python stf1081.py process` instead, which also resolves the names of
+#   all datasets in a single pass.
 import os
-from multiprocessing.pool import ThreadPool
 import numpy as np
 import pandas as pd
-from Bio import Entrez
-from IPython.display import display
+try:
+    from IPython.display import display
+except ImportError:
+    display = print
+from processing import (makeResolver, readRaw, cleanKinobeads, cleanPercent, splitMultiTargetRows,
+                        condenseDuplicatesByKey, resolveGeneSymbols, resolveGeneSymbolsShared, finalizeDataset,
+                        KLAEGER_GENE_SYMBOLS, HUANG_GENE_SYMBOLS, ANNES_GENE_SYMBOLS)
 
 
 # In[2]:
@@ -29,120 +36,61 @@ EntrezEmail = "example@gmail.com"
 # Name of column of official gene symbols to be added to data frames
 geneSymbolColumn = "GeneSymbol"
 
-# Number of threads to use for looking up official gene symbols via Entrez
+# Backend for looking up official gene symbols
 # - Possible values
-#     None: uses a ThreadPool of a default number of threads as returned by os.cpu_count()
-#     1: uses main thread for lookup, no ThreadPool
-#     > 1: Uses a ThreadPool of nThreads
-# - If too large (say, > 50), may run into server errors such as "HTTP Error 429: Too Many Requests"
-nThreads = 50
-
-
-# In[3]:
-
-
-# Gene symbol lookup functions
-
-def searchGeneNames(term, email, useSingleIndirectMatch = True):
-    '''
-    Search official human gene names and aliases in NCBI Gene database for a match to term, returning offical names and IDs.
-    Dependencies: Biopython
-    
-    Args:
-    - term: str
-        gene name / alias
-    - email: str
-        email registered with NCBI
-    - useSingleIndirectMatch
-        If the Entrez Gene Database query returns only 1 NCBI Gene ID, even if the term does not exactly match the gene symbol
-        or an alias, use the match.
-    
-    Returns: dict: str -> list
-        "names": list of matched official gene name(s)
-        "ids": list of NCBI Gene IDs corresponding to matched official gene name(s)
-    '''
-
-    names, ids = [], []
-    Entrez.email = email
-    handle = Entrez.esearch(db="gene", term='(' + term + '[gene]) AND (Homo sapiens[orgn]) AND alive[prop] NOT newentry[gene]')
-    idList = Entrez.read(handle)['IdList']
-    for id in idList:
-        handle = Entrez.esummary(db='gene', id=id)
-        record = Entrez.read(handle)
-        name = record['DocumentSummarySet']['DocumentSummary'][0]['Name']
-        aliases = record['DocumentSummarySet']['DocumentSummary'][0]['OtherAliases'].split(', ')
-        if (term in [name] + aliases):
-            names.append(name)
-            ids.append(id)
-    if useSingleIndirectMatch:
-        if len(names) == 0 and len(idList) == 1:
-            ids.append(idList[0])
-            handle = Entrez.esummary(db='gene', id=id)
-            record = Entrez.read(handle)
-            names.append(record['DocumentSummarySet']['DocumentSummary'][0]['Name'])
-    return({"names": names, "ids": ids})
-
-def geneSymbolLookupFromSeries(series, email):
-    '''
-    Search official human gene names and aliases in NCBI Gene database for the value in 'Name' index of given pandas Series.
-    
-    Args
-    - series: pandas.Series
-        must have 'Name' index
-    - email: str
-        email registered with NCBI
-    
-    Returns: str
-      If no match found, returns the empty string. Otherwise, returns the first matched official gene symbol.
-    '''
-    
-    term = series['Name']
-    match = searchGeneNames(term, email)
-    if len(match["names"]) == 0:
-        return("")
-    if (term in match["names"]):
-        return(term)
-    return(match["names"][0])
-
-def multiThreadedSearchGeneNames(terms, email, nThreads = None):
-    '''
-    Search official human gene names and aliases in NCBI Gene database for terms.
-    
-    Args
-    - terms: list of str
-        terms to lookup
-    - email: str
-        email registered with NCBI
-    - nThreads: int
-        None: Uses a ThreadPool of a default number of threads as returned by os.cpu_count()
-        1+: Uses a ThreadPool of nThreads
-    
-    Returns: list of str
-      Where no matches found, returns the empty string. Otherwise, returns the first matched official gene symbol.
-    '''
-    
-    dict_results = []
-    gene_symbols = []
-    pool = ThreadPool(nThreads)
-    print("Using {:d} threads...".format(pool._processes))
-    for i in range(len(terms)):
-        dict_results.append(pool.apply_async(searchGeneNames, (terms[i], email)))
-    pool.close()
-    pool.join()
-    for i in range(len(terms)):
-        match = dict_results[i].get()
-        if len(match["names"]) == 0:
-            gene_symbols.append("")
-        elif terms[i] in match["names"]:
-            gene_symbols.append(terms[i])
-        else:
-            gene_symbols.append(match["names"][0])
-    return(gene_symbols)
+#     "entrez": query the NCBI Gene database via Entrez (requires network access)
+#     "local": use a local index built from a downloaded HGNC complete set or NCBI gene_info dump (geneInfo_filename
+#              in data_dir). The index is saved to geneIndex_filename in dataAux_dir and rebuilt when the dump changes.
+geneSymbolBackend = "entrez"
+geneInfo_filename = "Homo_sapiens.gene_info.gz"
+geneIndex_filename = "geneIndex.pickle"
+
+# Entrez request settings
+# - EntrezApiKey: str
+#     NCBI API key. Requests are rate-limited to 3 per second without an API key and 10 per second with one.
+#     None: no API key
+# - EntrezMaxConcurrency: int
+#     Maximum number of Entrez requests in flight. Requests throttled by NCBI ("HTTP Error 429: Too Many Requests")
+#     or failing with server errors are retried with exponential backoff; terms whose lookup still fails are reported
+#     in a GeneLookupError rather than treated as having no official gene symbol.
+EntrezApiKey = None
+EntrezMaxConcurrency = 10
+
+# Persistent cache of gene symbol lookups
+# - geneSymbolCache_filename: str
+#     SQLite database (in dataAux_dir) storing previous lookups. None: do not use a cache
+# - geneSymbolCacheTTL: int or float
+#     Number of seconds after which a cached lookup expires and is repeated. None: never expire
+# - geneSymbolCacheMaxEntries: int
+#     Maximum number of cached lookups; least recently used lookups are evicted first
+geneSymbolCache_filename = "geneSymbolCache.sqlite"
+geneSymbolCacheTTL = 30 * 24 * 60 * 60
+geneSymbolCacheMaxEntries = 100000
+
+# Local name normalization
+# - normalizeNames: bool
+#     Resolve names locally where possible (see nameNormalizer.py): normalize names by rules (case, hyphens / spaces,
+#     Greek letter words, cyclin partners), then match them to an alias table and to official gene symbols of the alias
+#     table, the manual overrides and previously processed datasets in dataAux_dir. Only the remaining names are looked
+#     up with geneSymbolBackend.
+normalizeNames = True
+
+normalizer = None
+if normalizeNames:
+    from nameNormalizer import KinaseNameNormalizer
+    normalizer = KinaseNameNormalizer.fromProcessed(dataAux_dir)
+
+resolver = makeResolver(
+    geneSymbolBackend, email=EntrezEmail, apiKey=EntrezApiKey, maxConcurrency=EntrezMaxConcurrency,
+    cachePath=None if geneSymbolCache_filename is None else os.path.join(dataAux_dir, geneSymbolCache_filename),
+    cacheTTL=geneSymbolCacheTTL, cacheMaxEntries=geneSymbolCacheMaxEntries,
+    geneIndexPath=os.path.join(dataAux_dir, geneIndex_filename), geneInfoPath=os.path.join(data_dir, geneInfo_filename),
+    normalizer=normalizer)
 
 
 # ## Process data from Klaeger et al.
 
-# In[4]:
+# In[3]:
 
 
 # Parameters
@@ -152,101 +100,56 @@ def multiThreadedSearchGeneNames(terms, email, nThreads = None):
 #        with a dose-dependent decrease in binding to the Kinobeads." (Klaeger et al., Supplementary Materials)
 # - na_values_klaeger: list of str
 #     Values from CSV file to be read in as np.nan
-# - dtype_klaeger: dict: str -> dtype
-#     dtypes of columns of data
 
 highConfidenceOnly = True
 na_values_klaeger = ["n.d."]
-dtype_klaeger = {'Name': 'str', 'STF1081': np.float64, 'CC401': np.float64}
 
 
-# In[5]:
+# In[4]:
 
 
 # Read in data
-# - cannot set dtype of columns yet because of string "n.i." (not inhibited) values in STF1081 and CC401 columns,
-#   which should be of dtype np.float
-df1 = pd.read_csv(os.path.join(data_dir, Klaeger_filename), na_values=na_values_klaeger)
+df1 = readRaw(os.path.join(data_dir, Klaeger_filename), ["Name", "STF1081", "CC401"], na_values=na_values_klaeger)
 
 
-# In[6]:
-
-
-# Remove rows (targets) where values are NA
-df1.dropna(axis=0, how='any', inplace=True)
-
-
-# In[7]:
-
-
-# Remove low-confidence values if specified
-if highConfidenceOnly:
-    df1.drop(df1.index[df1['STF1081'].str.contains('\(') == True], axis=0, inplace=True)
-    df1.drop(df1.index[df1['CC401'].str.contains('\(') == True], axis=0, inplace=True)
-else:
-    df1['STF1081'] = df1['STF1081'].str.strip('()')
-    df1['CC401'] = df1['CC401'].str.strip('()')
-
-
-# In[8]:
+# In[5]:
 
 
-# Convert "n.i." (not inhibited) values to np.inf
-df1.replace('n.i.', np.inf, inplace=True)
-df1 = df1.astype(dtype_klaeger)
+# Remove rows (targets) where values are NA, remove low-confidence values if specified, and convert "n.i."
+# (not inhibited) values to np.inf
+df1 = cleanKinobeads(df1, ["STF1081", "CC401"], highConfidenceOnly)
 
 
-# In[9]:
+# In[6]:
 
 
 # Split combined target names into individual target names with their own row
-# - Ex: 
+# - Ex:
 #             Name  CC401  STF1081          Name  CC401  STF1081
 #  CSNK2A1;CSNK2A3  747.0    11.0  -->  CSNK2A1  747.0      11.0
 #                                       CSNK2A3  747.0      11.0
-for name in df1.loc[:,'Name']:
-    names = name.split(';')
-    if (len(names) > 1):
-        series = df1.loc[df1.index[df1['Name'] == name]].squeeze()
-        for sub_name in names:
-            series['Name'] = sub_name
-            df1 = df1.append(series, ignore_index=True)
-        df1.drop(df1.index[df1['Name'] == name], axis=0, inplace=True)
-df1.reset_index(drop=True, inplace=True)
+df1 = splitMultiTargetRows(df1, 'Name')
 
 
-# In[10]:
+# In[7]:
 
 
 # Add official gene names as a new column
-if (nThreads is None) or nThreads > 1:
-    df1[geneSymbolColumn] = multiThreadedSearchGeneNames(df1['Name'].tolist(), EntrezEmail, nThreads)
-else:
-    df1[geneSymbolColumn] = df1.apply(geneSymbolLookupFromSeries, 1, email = EntrezEmail)
+# - For genes with missing official gene symbols, manually add official gene symbols (KLAEGER_GENE_SYMBOLS)
+df1 = resolveGeneSymbols(df1, resolver, KLAEGER_GENE_SYMBOLS)
 
 # Show rows where no official gene symbol was found
 display(df1.loc[df1[geneSymbolColumn] == ""])
 
 
-# In[12]:
-
-
-# For genes with missing official gene symbols, manually add official gene symbols
-df1.loc[df1['Name'] == 'Q6ZSR9', geneSymbolColumn] = 'Q6ZSR9'
-
-
-# In[13]:
-
+# In[8]:
 
-# Sort by official gene names
-df1.sort_values(by=geneSymbolColumn, inplace=True)
-df1.reset_index(drop=True, inplace=True)
 
-# Reorder columns
-df1 = df1[[geneSymbolColumn, "Name", "STF1081", "CC401"]]
+# Sort by official gene names and reorder columns
+df1 = finalizeDataset(df1, ["STF1081", "CC401"])
 
 
-# In[14]:
+# In[9]:
 
 
 # Quick verification of gene symbol lookups
@@ -258,13 +161,13 @@ display(df1[df1['Name'] != df1[geneSymbolColumn]])
 print("Number of duplicated rows: " + str(sum(df1.duplicated() == True)))
 
 
-# In[15]:
+# In[10]:
 
 
 display(df1)
 
 
-# In[16]:
+# In[11]:
 
 
 df1.to_csv(os.path.join(dataAux_dir, Klaeger_filename), index=False)
@@ -272,79 +175,38 @@ df1.to_csv(os.path.join(dataAux_dir, Klaeger_filename), index=False)
 
 # ## Process data from Huang et al.
 
-# In[17]:
+# In[12]:
 
 
-df2 = pd.read_csv(os.path.join(data_dir, Huang_filename))
+df2 = readRaw(os.path.join(data_dir, Huang_filename))
 
 
-# In[18]:
+# In[13]:
 
 
 # Remove rows (targets) where values are NA
-df2.dropna(axis=0, how='any', inplace=True)
+df2 = cleanPercent(df2)
 
 
-# In[19]:
+# In[14]:
 
 
 # Add official gene names as a new column
-if (nThreads is None) or nThreads > 1:
-    df2[geneSymbolColumn] = multiThreadedSearchGeneNames(df2['Name'].tolist(), EntrezEmail, nThreads)
-else:
-    df2[geneSymbolColumn] = df2.apply(geneSymbolLookupFromSeries, 1, email = EntrezEmail)
+# - For genes with missing official gene symbols, manually add official gene symbols (HUANG_GENE_SYMBOLS)
+df2 = resolveGeneSymbols(df2, resolver, HUANG_GENE_SYMBOLS)
 
 # Show rows where no official gene symbol was found
 display(df2.loc[df2[geneSymbolColumn] == ""])
 
 
-# In[20]:
-
-
-# For genes with missing official gene symbols, manually add official gene symbols
-df2.loc[df2['Name'] == 'p38 alpha', geneSymbolColumn] = 'MAPK14'
-df2.loc[df2['Name'] == 'p38 beta', geneSymbolColumn] = 'MAPK11'
-df2.loc[df2['Name'] == 'p38 gamma', geneSymbolColumn] = 'MAPK12'
-df2.loc[df2['Name'] == 'p38 delta', geneSymbolColumn] = 'MAPK13'
-df2.loc[df2['Name'] == 'PKB beta', geneSymbolColumn] = 'AKT2'
-df2.loc[df2['Name'] == 'PKA', geneSymbolColumn] = 'PRKACA'
-df2.loc[df2['Name'] == 'CAMKK beta', geneSymbolColumn] = 'CAMKK2'
-df2.loc[df2['Name'] == 'GSK3 beta', geneSymbolColumn] = 'GSK3B'
-df2.loc[df2['Name'] == 'CDK2-Cyclin A', geneSymbolColumn] = 'CDK2'
-df2.loc[df2['Name'] == 'CDK9-Cyclin T1', geneSymbolColumn] = 'CDK9'
-df2.loc[df2['Name'] == 'Aurora A', geneSymbolColumn] = 'AURKA'
-df2.loc[df2['Name'] == 'Aurora B', geneSymbolColumn] = 'AURKB'
-df2.loc[df2['Name'] == 'AMPK (hum)', geneSymbolColumn] = 'PRKAA1'
-df2.loc[df2['Name'] == 'CK1 gamma 2', geneSymbolColumn] = 'CSNK1G2'
-df2.loc[df2['Name'] == 'CK1 delta', geneSymbolColumn] = 'CSNK1D'
-df2.loc[df2['Name'] == 'CK2', geneSymbolColumn] = 'CSNK2A1'
-df2.loc[df2['Name'] == 'IKK epsilon', geneSymbolColumn] = 'IKBKE'
-df2.loc[df2['Name'] == 'EF2K', geneSymbolColumn] = 'EEF2K' # based on UniProt
-df2.loc[df2['Name'] == 'MPSK1', geneSymbolColumn] = 'STK16'
-df2.loc[df2['Name'] == 'EPH-A2', geneSymbolColumn] = 'EPHA2'
-df2.loc[df2['Name'] == 'EPH-A4', geneSymbolColumn] = 'EPHA4'
-df2.loc[df2['Name'] == 'EPH-B1', geneSymbolColumn] = 'EPHB1'
-df2.loc[df2['Name'] == 'EPH-B2', geneSymbolColumn] = 'EPHB2'
-df2.loc[df2['Name'] == 'EPH-B3', geneSymbolColumn] = 'EPHB3'
-df2.loc[df2['Name'] == 'EPH-B4', geneSymbolColumn] = 'EPHB4'
-df2.loc[df2['Name'] == 'FGF-R1', geneSymbolColumn] = 'FGFR1'
-df2.loc[df2['Name'] == 'IGF-1R', geneSymbolColumn] = 'IGF1R'
-df2.loc[df2['Name'] == 'IR', geneSymbolColumn] = '' # unknown
-df2.loc[df2['Name'] == 'PINK', geneSymbolColumn] = 'PINK1'
-
-
-# In[21]:
-
+# In[15]:
 
-# Sort by official gene names
-df2.sort_values(by=geneSymbolColumn, inplace=True)
-df2.reset_index(drop=True, inplace=True)
 
-# Reorder columns
-df2 = df2[[geneSymbolColumn, "Name", "STF1081", "HTH01091"]]
+# Sort by official gene names and reorder columns
+df2 = finalizeDataset(df2, ["STF1081", "HTH01091"])
 
 
-# In[22]:
+# In[16]:
 
 
 # Quick verification of gene symbol lookups
@@ -357,13 +219,13 @@ with pd.option_context('display.max_rows', None):
 print("Number of duplicated rows: " + str(sum(df2.duplicated() == True)))
 
 
-# In[23]:
+# In[17]:
 
 
 display(df2)
 
 
-# In[24]:
+# In[18]:
 
 
 df2.to_csv(os.path.join(dataAux_dir, Huang_filename), index=False)
@@ -371,7 +233,7 @@ df2.to_csv(os.path.join(dataAux_dir, Huang_filename), index=False)
 
 # ## Process data from Annes et al.
 
-# In[25]:
+# In[19]:
 
 
 # Parameters
@@ -380,102 +242,52 @@ df2.to_csv(os.path.join(dataAux_dir, Huang_filename), index=False)
 condense_func = np.mean
 
 
-# In[26]:
+# In[20]:
 
 
-df3 = pd.read_csv(os.path.join(data_dir, Annes100_filename))
-df4 = pd.read_csv(os.path.join(data_dir, Annes500_filename))
+df3 = readRaw(os.path.join(data_dir, Annes100_filename))
+df4 = readRaw(os.path.join(data_dir, Annes500_filename))
 
 
-# In[27]:
+# In[21]:
 
 
 # Remove rows (targets) where values are NA
-df3.dropna(axis=0, how='any', inplace=True)
-df4.dropna(axis=0, how='any', inplace=True)
-
-
-# In[28]:
+df3 = cleanPercent(df3)
+df4 = cleanPercent(df4)
 
 
-def condenseDuplicatesByKey(df, keyCol, valueCol, func):
-    '''
-    Condense duplicate rows (based on the keyCol column) by applying a specified function to elements in the valueCol column.
-    
-    Args
-    - df: pandas.DataFrame
-    - keyCol: str
-        column in which to look for duplicates
-    - valueCol: str
-        name of column of values to condense
-    - func: function
-        function to apply to duplicate values. Must take a list and return a single element
-    
-    Return: pandas.DataFrame
-    '''
-    for key in df[keyCol]:
-        data = df[df[keyCol] == key]
-        if data.shape[0] > 1:
-            series = data.iloc[0,:].copy() # deep copy to avoid error of assigning value (next line) to a view of slice from df
-            series[valueCol] = func(data[valueCol])
-            df.drop(df.index[df[keyCol] == key], axis=0, inplace=True)
-            df = df.append(series, ignore_index=True)
-    return(df)
-
-
-# In[29]:
+# In[22]:
 
 
 df3 = condenseDuplicatesByKey(df3, "Name", "STF1081", condense_func)
 df4 = condenseDuplicatesByKey(df4, "Name", "STF1081", condense_func)
 
 
-# In[30]:
+# In[23]:
 
 
 # Add official gene names as a new column
-if (nThreads is None) or nThreads > 1:
-    df3[geneSymbolColumn] = multiThreadedSearchGeneNames(df3['Name'].tolist(), EntrezEmail, nThreads)
-    df4[geneSymbolColumn] = multiThreadedSearchGeneNames(df4['Name'].tolist(), EntrezEmail, nThreads)
-else:
-    df3[geneSymbolColumn] = df3.apply(geneSymbolLookupFromSeries, 1, email = EntrezEmail)
-    df4[geneSymbolColumn] = df4.apply(geneSymbolLookupFromSeries, 1, email = EntrezEmail)
+# - For genes with missing official gene symbols, manually add official gene symbols (ANNES_GENE_SYMBOLS)
+# - Both concentrations share the same kinase names, so names are resolved once for both data frames
+resolved = resolveGeneSymbolsShared({"Annes100": df3, "Annes500": df4}, resolver,
+                                    {"Annes100": ANNES_GENE_SYMBOLS, "Annes500": ANNES_GENE_SYMBOLS})
+df3, df4 = resolved["Annes100"], resolved["Annes500"]
 
 # Show rows where no official gene symbol was found
 display(df3.loc[df3[geneSymbolColumn] == ""])
 display(df4.loc[df4[geneSymbolColumn] == ""])
 
 
-# In[31]:
-
-
-# For genes with missing official gene symbols, manually add official gene symbols
-geneSymbolsMap = {
-    "MGC42105": "NIM1K",
-    "CDPK1": "PF3D7_0217500", # Genus/species: Plasmodium falciparum 3D7 - https://www.ncbi.nlm.nih.gov/gene/812762
-    "MAL13P1.279": "PF3D7_1356900", # Genus/species: Plasmodium falciparum 3D7 - https://www.ncbi.nlm.nih.gov/gene/813841
-    "pknB": "pknB", # Genus/species: Mycobacterium tuberculosis H37Rv - https://www.ncbi.nlm.nih.gov/gene/887072
-    "KIAA0999": "SIK3"}
-
-df3.loc[df3["Name"].isin(geneSymbolsMap), geneSymbolColumn] = list(geneSymbolsMap.values())
-df4.loc[df3["Name"].isin(geneSymbolsMap), geneSymbolColumn] = list(geneSymbolsMap.values())
-
-
-# In[32]:
-
+# In[24]:
 
-# Sort by official gene names
-df3.sort_values(by=geneSymbolColumn, inplace=True)
-df3.reset_index(drop=True, inplace=True)
-df4.sort_values(by=geneSymbolColumn, inplace=True)
-df4.reset_index(drop=True, inplace=True)
 
-# Reorder columns
-df3 = df3[[geneSymbolColumn, "Name", "STF1081", "STF1285"]]
-df4 = df4[[geneSymbolColumn, "Name", "STF1081", "STF1285"]]
+# Sort by official gene names and reorder columns
+df3 = finalizeDataset(df3, ["STF1081", "STF1285"])
+df4 = finalizeDataset(df4, ["STF1081", "STF1285"])
 
 
-# In[33]:
+# In[25]:
 
 
 # Quick verification of gene symbol lookups
@@ -489,19 +301,19 @@ print("Number of duplicated rows: " + str(sum(df3.duplicated() == True)))
 print("Number of duplicated rows: " + str(sum(df4.duplicated() == True)))
 
 
-# In[34]:
+# In[26]:
 
 
 display(df3)
 
 
-# In[35]:
+# In[27]:
 
 
 display(df4)
 
 
-# In[36]:
+# In[28]:
 
 
 df3.to_csv(os.path.join(dataAux_dir, Annes100_filename), index=False)
@@ -0,0 +1,525 @@
+'''
+Processing of raw kinase profiling data (data/) into datasets of official gene symbols and inhibition values
+(data_aux/).
+
+Stages, applied to each dataset in DATASETS:
+1. read: read raw CSV file
+2. clean: remove targets with missing values; for Klaeger, remove (or keep) low-confidence values and convert "n.i."
+   (not inhibited) values to np.inf
+3. split / condense: split combined target names (Klaeger) or condense multiple variants of the same kinase (Annes)
+4. resolve: add official gene symbols, looked up with a resolver (see makeResolver()) and manual overrides. processAll()
+   resolves the distinct names of all datasets in one pass (resolveGeneSymbolsShared()).
+5. write: sort by official gene symbol and write to data_aux/
+
+Gene symbol lookup dependencies (Biopython, the lookup cache, the local gene index) are only imported when a resolver
+is created.
+'''
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+from drugMatrix import parseKinobeadsValues
+from instrumentation import stageRunner
+
+# Manual official gene symbols for target names without a (correct) match, applied in place of lookups
+
+KLAEGER_GENE_SYMBOLS = {
+    "Q6ZSR9": "Q6ZSR9"}
+
+HUANG_GENE_SYMBOLS = {
+    "p38 alpha": "MAPK14",
+    "p38 beta": "MAPK11",
+    "p38 gamma": "MAPK12",
+    "p38 delta": "MAPK13",
+    "PKB beta": "AKT2",
+    "PKA": "PRKACA",
+    "CAMKK beta": "CAMKK2",
+    "GSK3 beta": "GSK3B",
+    "CDK2-Cyclin A": "CDK2",
+    "CDK9-Cyclin T1": "CDK9",
+    "Aurora A": "AURKA",
+    "Aurora B": "AURKB",
+    "AMPK (hum)": "PRKAA1",
+    "CK1 gamma 2": "CSNK1G2",
+    "CK1 delta": "CSNK1D",
+    "CK2": "CSNK2A1",
+    "IKK epsilon": "IKBKE",
+    "EF2K": "EEF2K", # based on UniProt
+    "MPSK1": "STK16",
+    "EPH-A2": "EPHA2",
+    "EPH-A4": "EPHA4",
+    "EPH-B1": "EPHB1",
+    "EPH-B2": "EPHB2",
+    "EPH-B3": "EPHB3",
+    "EPH-B4": "EPHB4",
+    "FGF-R1": "FGFR1",
+    "IGF-1R": "IGF1R",
+    "IR": "", # unknown
+    "PINK": "PINK1"}
+
+ANNES_GENE_SYMBOLS = {
+    "MGC42105": "NIM1K",
+    "CDPK1": "PF3D7_0217500", # Genus/species: Plasmodium falciparum 3D7 - https://www.ncbi.nlm.nih.gov/gene/812762
+    "MAL13P1.279": "PF3D7_1356900", # Genus/species: Plasmodium falciparum 3D7 - https://www.ncbi.nlm.nih.gov/gene/813841
+    "pknB": "pknB", # Genus/species: Mycobacterium tuberculosis H37Rv - https://www.ncbi.nlm.nih.gov/gene/887072
+    "KIAA0999": "SIK3"}
+
+GENE_SYMBOL_OVERRIDES = {
+    "Klaeger": KLAEGER_GENE_SYMBOLS,
+    "Huang": HUANG_GENE_SYMBOLS,
+    "Annes100": ANNES_GENE_SYMBOLS,
+    "Annes500": ANNES_GENE_SYMBOLS}
+
+def makeResolver(backend = "entrez", email = None, apiKey = None, maxConcurrency = 10,
+                 cachePath = None, cacheTTL = 30*24*60*60, cacheMaxEntries = 100000,
+                 geneIndexPath = None, geneInfoPath = None, normalizer = None, fuzzyMatcher = None):
+    '''
+    Create a gene symbol resolver.
+
+    Args
+    - backend: str
+        "entrez": query the NCBI Gene database (see geneLookup.lookupGeneSymbols())
+        "local": use a local index built from an HGNC complete set or NCBI gene_info dump (see geneIndex.LocalGeneIndex)
+    - email: str
+        email registered with NCBI ("entrez" backend)
+    - apiKey: str
+        NCBI API key ("entrez" backend). None: no API key
+    - maxConcurrency: int
+        maximum number of Entrez requests in flight ("entrez" backend)
+    - cachePath: str
+        path to SQLite cache of lookups ("entrez" backend). None: no cache
+    - cacheTTL: int or float
+        seconds after which a cached lookup expires. None: never expire
+    - cacheMaxEntries: int
+        maximum number of cached lookups
+    - geneIndexPath: str
+        path to binary local gene index ("local" backend)
+    - geneInfoPath: str
+        path to HGNC complete set or NCBI gene_info dump from which to (re)build the index ("local" backend)
+    - normalizer: nameNormalizer.KinaseNameNormalizer
+        resolves names locally where possible before looking up the remaining names with the backend. None: look up all
+        names with the backend
+    - fuzzyMatcher: aliasMatcher.FuzzyAliasMatcher
+        approximately matches names that were not resolved, applying high-confidence matches and queueing the rest for
+        review (see Resolver.review). None: leave names that were not resolved without a symbol
+
+    Returns: Resolver
+        list of str (terms) -> list of str (official gene symbols; the empty string where no match was found)
+    '''
+    if backend == "local":
+        from geneIndex import LocalGeneIndex
+        return(Resolver(LocalGeneIndex.loadOrBuild(geneIndexPath, geneInfoPath).lookup, normalizer=normalizer,
+                        fuzzyMatcher=fuzzyMatcher))
+    if backend == "entrez":
+        from entrezClient import AsyncEntrezClient
+        from geneLookup import lookupGeneSymbols
+        cache = None
+        if cachePath is not None:
+            from geneSymbolCache import GeneSymbolCache
+            cache = GeneSymbolCache(cachePath, ttl=cacheTTL, maxEntries=cacheMaxEntries)
+        client = AsyncEntrezClient(email, apiKey=apiKey, maxConcurrency=maxConcurrency)
+        return(Resolver(lambda terms: lookupGeneSymbols(terms, email, cache=cache, client=client), client, cache,
+                        normalizer, fuzzyMatcher))
+    raise ValueError("Unknown gene symbol backend: " + str(backend))
+
+class Resolver:
+    '''
+    Gene symbol resolver returned by makeResolver(): list of str (terms) -> list of str (official gene symbols), keeping
+    counts of lookups.
+
+    Args
+    - lookup: function
+        list of str -> list of str
+    - client: entrezClient.AsyncEntrezClient
+        Entrez client used by lookup, whose request counters are reported by counters(). None: no Entrez client
+    - cache: geneSymbolCache.GeneSymbolCache
+        lookup cache used by lookup, whose hit / miss counters are reported by counters(). None: no cache
+    - normalizer: nameNormalizer.KinaseNameNormalizer
+        resolves terms locally where possible; only the remaining terms are passed to lookup. None: pass all terms
+    - fuzzyMatcher: aliasMatcher.FuzzyAliasMatcher
+        matches terms not resolved by lookup approximately. High-confidence matches are applied; the matches of other
+        terms with candidates are kept in review. None: do not match approximately
+    '''
+
+    def __init__(self, lookup, client = None, cache = None, normalizer = None, fuzzyMatcher = None):
+        self.lookup = lookup
+        self.client = client
+        self.cache = cache
+        self.normalizer = normalizer
+        self.fuzzyMatcher = fuzzyMatcher
+        self.calls = 0
+        self.terms = 0
+        self.localTerms = 0
+        self.fuzzyTerms = 0
+        self.review = {}
+        # guards the counters and review, which calls from several threads update
+        self._lock = threading.Lock()
+
+    def __call__(self, terms):
+        with self._lock:
+            self.calls += 1
+            self.terms += len(terms)
+        if self.normalizer is None:
+            symbols = self.lookup(terms)
+        else:
+            symbols = self.normalizer.normalize(terms)
+            remaining = [term for term, symbol in zip(terms, symbols) if symbol is None]
+            with self._lock:
+                self.localTerms += len(terms) - len(remaining)
+            remote = dict(zip(remaining, self.lookup(remaining))) if len(remaining) > 0 else {}
+            symbols = [remote[term] if symbol is None else symbol for term, symbol in zip(terms, symbols)]
+        if self.fuzzyMatcher is None:
+            return(symbols)
+        unresolved = [term for term, symbol in zip(terms, symbols) if not symbol]
+        if len(unresolved) == 0:
+            return(symbols)
+        matches = self.fuzzyMatcher.match(unresolved)
+        applied = matches[matches['status'] == "auto"]
+        with self._lock:
+            self.fuzzyTerms += len(applied)
+            for _, row in matches[matches['status'] == "review"].iterrows():
+                self.review[row['name']] = row
+        fuzzy = dict(zip(applied['name'], applied['symbol']))
+        return([fuzzy.get(term, symbol) if not symbol else symbol for term, symbol in zip(terms, symbols)])
+
+    def reviewQueue(self):
+        '''
+        Returns: pandas.DataFrame
+            approximate matches of terms that were not resolved and not matched with high confidence, with columns as
+            returned by aliasMatcher.FuzzyAliasMatcher.match(); empty without a fuzzyMatcher
+        '''
+        with self._lock:
+            review = list(self.review.values())
+        return(pd.DataFrame(review, columns=["name", "symbol", "score", "status", "candidates"])
+               .reset_index(drop=True))
+
+    def counters(self):
+        '''
+        Returns: dict: str -> int
+            resolver_calls, resolver_terms; resolver_local_terms (with a normalizer); resolver_fuzzy_terms,
+            resolver_review_terms (with a fuzzyMatcher); entrez_requests, entrez_retries, entrez_throttled (with an
+            Entrez client); cache_hits, cache_misses (with a cache)
+        '''
+        with self._lock:
+            counters = {"resolver_calls": self.calls, "resolver_terms": self.terms}
+            if self.normalizer is not None:
+                counters.update(resolver_local_terms=self.localTerms)
+            if self.fuzzyMatcher is not None:
+                counters.update(resolver_fuzzy_terms=self.fuzzyTerms, resolver_review_terms=len(self.review))
+        if self.client is not None:
+            counters.update(entrez_requests=self.client.requests, entrez_retries=self.client.retries,
+                            entrez_throttled=self.client.throttled)
+        if self.cache is not None:
+            counters.update(cache_hits=self.cache.hits, cache_misses=self.cache.misses)
+        return(counters)
+
+def readRaw(path, columns = None, na_values = None):
+    '''
+    Read a raw data CSV file.
+
+    Args
+    - path: str
+    - columns: list of str
+        columns to keep. None: keep all columns
+    - na_values: list of str
+        values to be read in as np.nan
+
+    Returns: pandas.DataFrame
+    '''
+    df = pd.read_csv(path, na_values=na_values)
+    if columns is not None:
+        df = df[columns]
+    return(df)
+
+def cleanKinobeads(df, valueCols, highConfidenceOnly = True):
+    '''
+    Convert raw Kinobeads values to Kd_app values (float) and remove targets with missing values.
+
+    Args
+    - df: pandas.DataFrame
+    - valueCols: list of str
+        columns of raw values
+    - highConfidenceOnly: bool
+        Remove targets with a low-confidence (parenthesized) value in any of valueCols. Otherwise, keep low-confidence
+        values.
+          "A protein was considered a high-confidence target if the binding curve showed a sigmoidal shape
+           with a dose-dependent decrease in binding to the Kinobeads." (Klaeger et al., Supplementary Materials)
+
+    Returns: pandas.DataFrame
+    '''
+    values, _ = parseKinobeadsValues(df[valueCols], highConfidenceOnly)
+    return(df.assign(**values).dropna(axis=0, how='any'))
+
+def cleanPercent(df):
+    '''
+    Remove targets with missing values.
+
+    Args
+    - df: pandas.DataFrame
+
+    Returns: pandas.DataFrame
+    '''
+    return(df.dropna(axis=0, how='any'))
+
+def splitMultiTargetRows(df, keyCol, sep = ';'):
+    '''
+    Split rows whose keyCol value joins multiple names by sep into one row per name. Values in all other columns are
+    copied to each new row.
+    - Ex:
+                Name  CC401  STF1081          Name  CC401  STF1081
+     CSNK2A1;CSNK2A3  747.0    11.0  -->  CSNK2A1  747.0      11.0
+                                          CSNK2A3  747.0      11.0
+
+    Args
+    - df: pandas.DataFrame
+    - keyCol: str
+        column of (possibly sep-joined) names
+    - sep: str
+        separator between names
+
+    Return: pandas.DataFrame
+    '''
+    df = df.assign(**{keyCol: df[keyCol].str.split(sep, regex=False)})
+    return(df.explode(keyCol, ignore_index=True))
+
+def condenseDuplicatesByKey(df, keyCol, valueCol, func):
+    '''
+    Condense duplicate rows (based on the keyCol column) by applying a specified function to elements in the valueCol column(s).
+    Other columns keep the values of the first row of each set of duplicates. Rows are ordered by the first occurrence of
+    each key.
+
+    Args
+    - df: pandas.DataFrame
+    - keyCol: str
+        column in which to look for duplicates
+    - valueCol: str or list of str
+        name(s) of column(s) of values to condense
+    - func: function or str
+        function to apply to duplicate values. Must take a list (pandas.Series) and return a single element.
+        Common NumPy reducers (np.mean, np.median, np.min, np.max, np.sum) and pandas aggregation names ("mean", "median",
+        ...) use the corresponding vectorized pandas groupby aggregation.
+
+    Return: pandas.DataFrame
+    '''
+    valueCols = [valueCol] if isinstance(valueCol, str) else list(valueCol)
+    func = _groupbyReducers.get(func, func)
+    condensed = df.drop_duplicates(subset=keyCol, keep='first').set_index(keyCol)
+    condensed[valueCols] = df.groupby(keyCol, sort=False)[valueCols].agg(func)
+    return(condensed.reset_index()[df.columns])
+
+_groupbyReducers = {np.mean: "mean", np.median: "median", np.min: "min", np.max: "max", np.sum: "sum"}
+
+def resolveGeneSymbols(df, resolver, overrides = None, keyCol = 'Name', geneSymbolColumn = GENE_SYMBOL_COLUMN):
+    '''
+    Add official gene symbols as a new column. Each distinct name is resolved once.
+
+    Args
+    - df: pandas.DataFrame
+    - resolver: function
+        list of str -> list of str, e.g. from makeResolver()
+    - overrides: dict: str -> str
+        manual official gene symbols for names; these names are not passed to resolver
+    - keyCol: str
+        column of names to resolve
+    - geneSymbolColumn: str
+        name of column of official gene symbols to add
+
+    Returns: pandas.DataFrame
+    '''
+    overrides = {} if overrides is None else overrides
+    names = df[keyCol]
+    terms = list(pd.unique(names[~names.isin(list(overrides))]))
+    symbols = dict(zip(terms, resolver(terms)))
+    symbols.update(overrides)
+    return(df.assign(**{geneSymbolColumn: names.map(symbols)}))
+
+def resolveGeneSymbolsShared(dfs, resolver, overrides = None, keyCol = 'Name', geneSymbolColumn = GENE_SYMBOL_COLUMN):
+    '''
+    Add official gene symbols to several datasets, resolving each distinct name across all datasets once.
+
+    Args
+    - dfs: dict: str -> pandas.DataFrame
+        dataset name -> dataset
+    - resolver: function
+        list of str -> list of str, e.g. from makeResolver()
+    - overrides: dict: str -> dict: str -> str
+        dataset name -> manual official gene symbols for names in that dataset (see resolveGeneSymbols()). A name is
+        passed to resolver if it is not overridden in at least one dataset in which it occurs.
+    - keyCol: str
+        column of names to resolve
+    - geneSymbolColumn: str
+        name of column of official gene symbols to add
+
+    Returns: dict: str -> pandas.DataFrame
+        dataset name -> dataset with geneSymbolColumn
+    '''
+    overrides = {} if overrides is None else overrides
+    terms = []
+    for name, df in dfs.items():
+        names = df[keyCol]
+        terms.append(names[~names.isin(list(overrides.get(name) or {}))])
+    terms = list(pd.unique(pd.concat(terms, ignore_index=True))) if len(terms) > 0 else []
+    symbols = dict(zip(terms, resolver(terms))) if len(terms) > 0 else {}
+    return({name: resolveGeneSymbols(df, lambda terms: [symbols[term] for term in terms], overrides.get(name), keyCol,
+                                     geneSymbolColumn)
+            for name, df in dfs.items()})
+
+def finalizeDataset(df, valueCols, keyCol = 'Name', geneSymbolColumn = GENE_SYMBOL_COLUMN):
+    '''
+    Sort by official gene symbol and reorder columns (official gene symbol, name, values).
+
+    Args
+    - df: pandas.DataFrame
+    - valueCols: list of str
+    - keyCol: str
+        column of names
+    - geneSymbolColumn: str
+        column of official gene symbols
+
+    Returns: pandas.DataFrame
+    '''
+    df = df.sort_values(by=geneSymbolColumn, kind='stable').reset_index(drop=True)
+    return(df[[geneSymbolColumn, keyCol] + list(valueCols)])
+
+def prepareDataset(name, data_dir, highConfidenceOnly = True, condense_func = np.mean, report = None):
+    '''
+    Read, clean and split / condense a raw dataset (stages 1-3), without resolving official gene symbols.
+
+    Args
+    - name: str
+        dataset name, a key of DATASETS
+    - data_dir: str
+        directory of raw data files
+    - highConfidenceOnly: bool
+        Keep only "high confidence" protein-drug interactions (Klaeger)
+    - condense_func: function
+        function to condense values of multiple variants (different phosphorylation states, mutants) of the same kinase
+        (Annes)
+    - report: instrumentation.RunReport
+        report in which to record each stage. None: do not record
+
+    Returns: pandas.DataFrame
+        columns: Name, compound values, reference values (and any other columns of the raw file)
+    '''
+    run = stageRunner(report)
+    dataset = DATASETS[name]
+    valueCols = [dataset["compoundCol"], dataset["referenceCol"]]
+    path = os.path.join(data_dir, dataset["filename"])
+    if dataset["metric"] == "fold":
+        df = run("read", name, readRaw, path, ['Name'] + valueCols, na_values=["n.d."])
+        df = run("clean", name, cleanKinobeads, df, valueCols, highConfidenceOnly)
+        return(run("split", name, splitMultiTargetRows, df, 'Name'))
+    df = run("read", name, readRaw, path)
+    df = run("clean", name, cleanPercent, df)
+    if name.startswith("Annes"):
+        df = run("condense", name, condenseDuplicatesByKey, df, "Name", dataset["compoundCol"], condense_func)
+    return(df)
+
+def processDataset(name, data_dir, resolver, highConfidenceOnly = True, condense_func = np.mean):
+    '''
+    Process a raw dataset (read, clean, split / condense, resolve) without writing it.
+
+    Args
+    - name: str
+        dataset name, a key of DATASETS
+    - data_dir: str
+        directory of raw data files
+    - resolver: function
+        gene symbol resolver, e.g. from makeResolver()
+    - highConfidenceOnly, condense_func
+        see prepareDataset()
+
+    Returns: pandas.DataFrame
+        columns: official gene symbol, Name, compound values, reference values
+    '''
+    df = prepareDataset(name, data_dir, highConfidenceOnly, condense_func)
+    df = resolveGeneSymbols(df, resolver, GENE_SYMBOL_OVERRIDES.get(name))
+    return(finalizeDataset(df, [DATASETS[name]["compoundCol"], DATASETS[name]["referenceCol"]]))
+
+def writeDataset(df, name, dataAux_dir):
+    '''
+    Write a processed dataset to dataAux_dir.
+
+    Args
+    - df: pandas.DataFrame
+    - name: str
+        dataset name, a key of DATASETS
+    - dataAux_dir: str
+    '''
+    df.to_csv(os.path.join(dataAux_dir, DATASETS[name]["filename"]), index=False)
+
+def buildParams(name, highConfidenceOnly = True, condense_func = np.mean, resolverKey = None):
+    '''
+    Parameters that affect a processed dataset, for build cache keys (see buildCache.py).
+
+    Args
+    - name: str
+        dataset name, a key of DATASETS
+    - highConfidenceOnly, condense_func
+        see processDataset(); only included for the datasets they apply to
+    - resolverKey: str
+        identifies the gene symbol resolver, e.g. the backend passed to makeResolver()
+
+    Returns: dict
+    '''
+    params = {"name": name, "dataset": DATASETS[name], "resolver": resolverKey}
+    if DATASETS[name]["metric"] == "fold":
+        params["highConfidenceOnly"] = highConfidenceOnly
+    elif name.startswith("Annes"):
+        params["condense_func"] = getattr(condense_func, '__name__', repr(condense_func))
+    return(params)
+
+def processAll(data_dir, dataAux_dir, resolver, names = None, highConfidenceOnly = True, condense_func = np.mean,
+               cache = None, resolverKey = None, report = None):
+    '''
+    Process raw datasets and write them to dataAux_dir.
+
+    Args
+    - data_dir: str
+        directory of raw data files
+    - dataAux_dir: str
+        directory to which to write processed data files
+    - resolver: function
+        gene symbol resolver, e.g. from makeResolver()
+    - names: list of str
+        names of datasets to process. None: all datasets in DATASETS
+    - highConfidenceOnly, condense_func
+        see processDataset()
+    - cache: buildCache.BuildCache
+        If given, datasets whose raw file, parameters and processing code are unchanged since they were last stored in
+        the cache (and whose processed data file is unchanged) are loaded from the cache instead of being processed.
+        None: process all datasets
+    - resolverKey: str
+        identifies the resolver in cache keys (see buildParams())
+    - report: instrumentation.RunReport
+        report in which to record each stage. None: do not record
+
+    Returns: dict: str -> pandas.DataFrame
+        dataset name -> processed dataset
+    '''
+    run = stageRunner(report)
+    names = list(DATASETS) if names is None else names
+    dfs, keys, prepared = {}, {}, {}
+    for name in names:
+        if cache is not None:
+            keys[name] = cache.key([os.path.join(data_dir, DATASETS[name]["filename"])],
+                                   buildParams(name, highConfidenceOnly, condense_func, resolverKey))
+            df = run("cache_load", name, cache.load, name, keys[name],
+                     os.path.join(dataAux_dir, DATASETS[name]["filename"]))
+            if df is not None:
+                dfs[name] = df
+                continue
+        prepared[name] = prepareDataset(name, data_dir, highConfidenceOnly, condense_func, report)
+
+    # resolve names of all datasets to be processed together, so that names shared by datasets are looked up once
+    resolved = run("resolve", None, resolveGeneSymbolsShared, prepared, resolver, GENE_SYMBOL_OVERRIDES)
+    for name, df in resolved.items():
+        dfs[name] = run("finalize", name, finalizeDataset, df,
+                        [DATASETS[name]["compoundCol"], DATASETS[name]["referenceCol"]])
+        run("write", name, writeDataset, dfs[name], name, dataAux_dir)
+        if cache is not None:
+            run("cache_store", name, cache.store, name, keys[name], dfs[name],
+                os.path.join(dataAux_dir, DATASETS[name]["filename"]))
+    return({name: dfs[name] for name in names})
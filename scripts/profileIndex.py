@@ -0,0 +1,239 @@
+'''
+Nearest-neighbour search over compound selectivity profiles, e.g. to find the profiled compounds whose kinome
+inhibition is most similar to, or most different from, that of STF-1081 when choosing reference compounds.
+
+A profile is a vector of inhibition scores of one compound over features (dataset, target). Values are normalized so
+that datasets of different metrics are comparable, with 0 meaning no inhibition and 1 complete inhibition:
+- "fold" (Kd_app, nM): fraction of target bound at a reference concentration, c / (c + Kd_app); np.inf -> 0
+- "percent" (% control or % activity remaining): 1 - value / 100, clipped to [0, 1]
+
+Distances (1 - similarity) between two compounds are computed over the features measured for both (pairwise masks),
+so that a target missing from one compound's panel counts neither as similar nor as different inhibition; otherwise
+distances between datasets of different panel sizes would mostly reflect panel coverage. Distances are computed for
+all compounds at once:
+- "cosine": cosine distance between the shared features of both profiles (by matrix products with measured masks)
+- "spearman": 1 - Spearman rank correlation of the shared features, each profile re-ranked over the shared features
+Pairs of compounds with fewer than minShared shared features (see ProfileIndex), or whose shared values are all 0
+(for "spearman": constant), have distance NaN and are ranked last.
+With approximate=True, nearest-neighbour queries first estimate similarities from low-dimensional random projections of
+the profiles (unmeasured features scored 0) and compute exact distances only for the best candidates. This is intended
+for matrices of tens of thousands of compounds.
+
+Usage
+    values, _ = drugMatrix.readKinobeadsMatrix(path)
+    index = ProfileIndex(kinobeadsProfiles(values))
+    index.query("STF1081", k=10, metric="spearman")
+'''
+
+import numpy as np
+import pandas as pd
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+
+METRICS = ("cosine", "spearman")
+
+def normalizeValues(values, metric, concentration = 1000):
+    '''
+    Normalize values to inhibition scores in [0, 1].
+
+    Args
+    - values: numpy.ndarray of float
+    - metric: str
+        "fold" (Kd_app, nM) or "percent" (% control or % activity remaining); see datasets.py
+    - concentration: float
+        reference concentration (nM) for "fold" values
+
+    Returns: numpy.ndarray of float
+        same shape as values; NaN where values are NaN
+    '''
+    values = np.asarray(values, dtype=float)
+    if metric == "fold":
+        with np.errstate(invalid='ignore'):
+            return(np.where(np.isinf(values), 0, concentration / (concentration + values)))
+    return(np.clip(1 - values / 100, 0, 1))
+
+def kinobeadsProfiles(values, concentration = 1000):
+    '''
+    Profiles from a Kinobeads drug matrix.
+
+    Args
+    - values: pandas.DataFrame
+        Kd_app values, one row per target, one column per compound (e.g., from drugMatrix.readKinobeadsMatrix())
+    - concentration: float
+        see normalizeValues()
+
+    Returns: pandas.DataFrame
+        inhibition scores, one row per compound, one column per target
+    '''
+    return(pd.DataFrame(normalizeValues(values.to_numpy(dtype=float), "fold", concentration).T,
+                        index=values.columns, columns=values.index))
+
+def datasetProfiles(dfs, specs = None, keyCol = GENE_SYMBOL_COLUMN, concentration = 1000):
+    '''
+    Profiles from processed datasets. Every numeric column of a dataset is a compound; compounds of the same name in
+    different datasets share a profile, whose features are (dataset, target) pairs.
+
+    Args
+    - dfs: dict: str -> pandas.DataFrame
+        dataset name -> processed dataset. Only the first row of each target is used.
+    - specs: dict: str -> dict
+        dataset name -> metric. None: DATASETS
+    - keyCol: str
+        column of target identifiers
+    - concentration: float
+        see normalizeValues()
+
+    Returns: pandas.DataFrame
+        inhibition scores, one row per compound, one column per "<dataset>:<target>"; NaN where not measured
+    '''
+    specs = DATASETS if specs is None else specs
+    blocks = []
+    for name, df in dfs.items():
+        df = df.dropna(subset=[keyCol]).drop_duplicates(subset=keyCol).set_index(keyCol)
+        compounds = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])
+                     and not pd.api.types.is_bool_dtype(df[col])]
+        scores = normalizeValues(df[compounds].to_numpy(dtype=float), specs[name]["metric"], concentration)
+        blocks.append(pd.DataFrame(scores.T, index=compounds, columns=[name + ":" + target for target in df.index]))
+    return(pd.concat(blocks, axis=0).groupby(level=0, sort=False).first())
+
+class ProfileIndex:
+    '''
+    Args
+    - profiles: pandas.DataFrame
+        inhibition scores, one row per compound, one column per feature (e.g., from kinobeadsProfiles())
+    - approximate: bool
+        build random projections of the profiles for approximate queries
+    - nComponents: int
+        number of dimensions of the random projections
+    - nCandidates: int
+        minimum number of candidates (at least 10 x k) selected by approximate distances and re-ranked exactly
+    - seed: int
+        seed for the random projections
+    - minShared: int
+        minimum number of features measured for both compounds for their distance to be defined. Distances over a few
+        shared features are not meaningful (e.g., the cosine distance over a single feature is always 0).
+    '''
+
+    def __init__(self, profiles, approximate = False, nComponents = 64, nCandidates = 200, seed = 0, minShared = 10):
+        self.compounds = pd.Index(profiles.index)
+        self.features = pd.Index(profiles.columns)
+        measured = profiles.notna().to_numpy()
+        scores = np.where(measured, profiles.to_numpy(dtype=float), 0)
+        self.measured = measured
+        self.scores = scores
+        self.squares = scores ** 2
+        # unit vectors with unmeasured features scored 0, for random projections
+        self.vectors = {"cosine": _unitRows(scores).astype(np.float32),
+                        "spearman": _unitRows(_centeredRanks(scores)).astype(np.float32)}
+        self.projections = None
+        self.nCandidates = nCandidates
+        self.minShared = minShared
+        if approximate and nComponents < len(self.features):
+            rng = np.random.default_rng(seed)
+            projection = rng.standard_normal((len(self.features), nComponents)) / np.sqrt(nComponents)
+            self.projection = projection.astype(np.float32)
+            self.projections = {metric: vectors @ self.projection for metric, vectors in self.vectors.items()}
+
+    def query(self, compound, k = 10, metric = "cosine", furthest = False, approximate = None):
+        '''
+        Compounds with the most similar (or most different) profiles.
+
+        Args
+        - compound: str or array-like of float
+            compound in the index, or a profile over the index's features (NaN: not measured)
+        - k: int
+            number of compounds to return
+        - metric: str
+            "cosine" or "spearman"
+        - furthest: bool
+            return the compounds with the largest distances instead
+        - approximate: bool
+            select candidates by distances between random projections, then rank them by exact distances (see
+            ProfileIndex). None: if the projections were built. Queries for the furthest compounds are always exact, as
+            the largest distances are too close to each other to be selected reliably from projections.
+
+        Returns: pandas.DataFrame
+            columns: compound, distance, n_shared (number of features measured for both compounds); sorted by increasing
+            (decreasing if furthest) distance. The query compound itself is excluded.
+        '''
+        if metric not in METRICS:
+            raise ValueError("metric must be one of " + ", ".join(METRICS))
+        approximate = self.projections is not None if approximate is None else approximate
+        if isinstance(compound, str):
+            i = self.compounds.get_loc(compound)
+            scores, measured, exclude = self.scores[i], self.measured[i], i
+        else:
+            scores = np.asarray(compound, dtype=float)
+            measured = ~np.isnan(scores)
+            scores = np.where(measured, scores, 0)
+            exclude = None
+
+        nCandidates = max(self.nCandidates, 10 * k)
+        if approximate and not furthest and self.projections is not None and nCandidates < len(self.compounds) - 1:
+            # similarity estimated from random projections; the query compound is ranked last
+            vector = _unitRows(_centeredRanks(scores[None, :]) if metric == "spearman" else scores[None, :])[0]
+            estimate = self.projections[metric] @ (vector.astype(np.float32) @ self.projection)
+            if exclude is not None:
+                estimate[exclude] = -np.inf
+            candidates = np.argpartition(-estimate, nCandidates - 1)[:nCandidates]
+        else:
+            candidates = np.arange(len(self.compounds))
+            if exclude is not None:
+                candidates = np.delete(candidates, exclude)
+        distance = self.distances(candidates, scores, measured, metric)
+        k = min(k, len(candidates))
+        # NaN distances (no shared features) are ranked last
+        key = np.where(np.isnan(distance), np.inf, -distance if furthest else distance)
+        top = np.argpartition(key, k - 1)[:k] if k > 0 else np.array([], dtype=int)
+        top = top[np.argsort(key[top], kind='stable')]
+        selected = candidates[top]
+        return(pd.DataFrame({"compound": self.compounds[selected], "distance": distance[top],
+                             "n_shared": (self.measured[selected] & measured).sum(axis=1)}))
+
+    def distances(self, rows, scores, measured, metric = "cosine", chunkSize = 4096):
+        '''
+        Exact distances between compounds of the index and a profile, over the features measured for both.
+
+        Args
+        - rows: numpy.ndarray of int
+            positions of compounds in the index
+        - scores: numpy.ndarray of float
+            profile over the index's features; 0 where not measured
+        - measured: numpy.ndarray of bool
+            whether each feature of the profile was measured
+        - metric: str
+            "cosine" or "spearman"
+        - chunkSize: int
+            number of compounds whose masked profiles are ranked at a time ("spearman")
+
+        Returns: numpy.ndarray of float
+            distance of each compound in rows; NaN where not defined (see module docstring)
+        '''
+        nShared = (self.measured[rows] & measured).sum(axis=1)
+        if metric == "cosine":
+            dot = self.scores[rows] @ scores
+            norms = (self.squares[rows] @ measured) * (self.measured[rows] @ scores ** 2)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return(np.where((norms > 0) & (nShared >= self.minShared), 1 - dot / np.sqrt(norms), np.nan))
+        distance = np.empty(len(rows))
+        for start in range(0, len(rows), chunkSize):
+            chunk = rows[start:start + chunkSize]
+            shared = self.measured[chunk] & measured
+            a = _centeredRanks(np.where(shared, self.scores[chunk], np.nan))
+            b = _centeredRanks(np.where(shared, scores, np.nan))
+            a, b = np.nan_to_num(a), np.nan_to_num(b)
+            norms = (a ** 2).sum(axis=1) * (b ** 2).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                distance[start:start + chunkSize] = np.where(norms > 0, 1 - (a * b).sum(axis=1) / np.sqrt(norms),
+                                                             np.nan)
+        return(np.where(nShared >= self.minShared, distance, np.nan))
+
+def _unitRows(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return(np.divide(x, norms, out=np.zeros_like(x), where=norms > 0))
+
+def _centeredRanks(x):
+    # NaN values are not ranked and stay NaN
+    ranks = pd.DataFrame(x).rank(axis=1, method='average').to_numpy()
+    counts = (~np.isnan(ranks)).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return(ranks - np.nansum(ranks, axis=1, keepdims=True) / counts)
@@ -0,0 +1,217 @@
+'''
+Resident query service for interactive target selection.
+
+Loads the processed datasets once into a kinomeMatrix.KinomeMatrix and answers Boolean filtering and rank ordering
+queries for any thresholds and subset of datasets over local HTTP (JSON), without re-reading data_aux/. Results of
+repeated queries are memoized in an LRU cache.
+
+Endpoints (GET; thresholds are keyword arguments of selection.booleanFilter(), defaults as in selectTargets.py)
+    /datasets
+        loaded datasets
+    /intersect?datasets=Klaeger,Huang,Annes500&diff_fold_thresh=10&use_diff=true
+        {"datasets": [...], "thresholds": {...}, "targets": [...]}
+    /rank?datasets=Klaeger,Annes100
+        {"datasets": [...], "targets": [...], "ranks": [...]}, sorted by increasing summed rank
+    /stats
+        LRU cache hits, misses and size
+    /reload (POST)
+        re-read the processed datasets and clear the cache
+
+Usage
+    python scripts/stf1081.py serve [--port 8050]
+    curl "http://127.0.0.1:8050/intersect?datasets=Klaeger,Annes500&diff_percent_thresh=30"
+'''
+
+import functools
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from datasets import DATASETS
+from kinomeMatrix import KinomeMatrix
+
+DEFAULT_DATASETS = ("Klaeger", "Huang", "Annes100")
+
+# Thresholds of selection.booleanFilter() accepted in queries -> type
+THRESHOLDS = {"use_diff": bool, "diff_percent_thresh": float, "diff_fold_thresh": float,
+              "min_percent_thresh": float, "max_percent_thresh": float}
+
+class QueryError(ValueError):
+    pass
+
+class SelectionService:
+    '''
+    Args
+    - dataAux_dir: str
+        directory of processed data files
+    - names: list of str
+        datasets to load. None: all datasets in DATASETS
+    - cacheSize: int
+        maximum number of memoized query results per query type
+    '''
+
+    def __init__(self, dataAux_dir, names = None, cacheSize = 256):
+        self.dataAux_dir = dataAux_dir
+        self.names = list(DATASETS) if names is None else list(names)
+        self.cacheSize = cacheSize
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        '''
+        (Re-)read the processed datasets and clear memoized results.
+        '''
+        matrix = KinomeMatrix.fromProcessed(self.names, self.dataAux_dir)
+        intersect = functools.lru_cache(self.cacheSize)(
+            lambda names, thresholds: tuple(matrix.intersect(list(names), **dict(thresholds))))
+        rank = functools.lru_cache(self.cacheSize)(
+            lambda names: tuple(matrix.rankSums(list(names)).items()))
+        with self.lock:
+            self.matrix, self._intersect, self._rank = matrix, intersect, rank
+
+    def intersect(self, names = DEFAULT_DATASETS, **thresholds):
+        '''
+        Args
+        - names: list of str
+            datasets
+        - thresholds
+            keyword arguments of selection.booleanFilter()
+
+        Returns: tuple of str
+            sorted targets labeled True in every dataset
+        '''
+        matrix, intersect, _ = self._snapshot()
+        return(intersect(self._names(names, matrix), tuple(sorted(thresholds.items()))))
+
+    def rank(self, names = DEFAULT_DATASETS):
+        '''
+        Args
+        - names: list of str
+            datasets
+
+        Returns: tuple of (str, float)
+            targets present in all datasets and their summed ranks, sorted by increasing summed rank
+        '''
+        matrix, _, rank = self._snapshot()
+        return(rank(self._names(names, matrix)))
+
+    def stats(self):
+        '''
+        Returns: dict
+            hits, misses and current size of the LRU caches of each query type
+        '''
+        _, intersect, rank = self._snapshot()
+        return({query: {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+                for query, info in [("intersect", intersect.cache_info()), ("rank", rank.cache_info())]})
+
+    def _snapshot(self):
+        # matrix and caches of the same reload()
+        with self.lock:
+            return(self.matrix, self._intersect, self._rank)
+
+    def _names(self, names, matrix):
+        names = tuple(names)
+        repeated = sorted({name for name in names if names.count(name) > 1})
+        if repeated:
+            raise QueryError("Repeated datasets: " + ", ".join(repeated))
+        unknown = [name for name in names if name not in matrix.datasets]
+        if len(names) == 0 or unknown:
+            raise QueryError("Unknown datasets: {}; loaded: {}".format(", ".join(unknown) or "(none given)",
+                                                                     ", ".join(self.names)))
+        return(names)
+
+def parseQuery(query):
+    '''
+    Parse the query string of an intersect or rank request.
+
+    Args
+    - query: str
+        e.g. "datasets=Klaeger,Huang&diff_fold_thresh=10"
+
+    Returns: (list of str, dict)
+        datasets (DEFAULT_DATASETS if not given) and thresholds
+    '''
+    params = {k: v[-1] for k, v in parse_qs(query, keep_blank_values=True).items()}
+    names = params.pop("datasets", None)
+    names = list(DEFAULT_DATASETS) if names is None else [name for name in names.split(",") if name]
+    thresholds = {}
+    for key, value in params.items():
+        if key not in THRESHOLDS:
+            raise QueryError("Unknown parameter: {}; thresholds: {}".format(key, ", ".join(THRESHOLDS)))
+        if THRESHOLDS[key] is bool:
+            if value.lower() not in ("true", "false", "1", "0"):
+                raise QueryError("{} must be true or false".format(key))
+            thresholds[key] = value.lower() in ("true", "1")
+        else:
+            try:
+                thresholds[key] = float(value)
+            except ValueError:
+                raise QueryError("{} must be a number".format(key))
+            if not math.isfinite(thresholds[key]):
+                raise QueryError("{} must be a finite number".format(key))
+    return(names, thresholds)
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            if url.path == "/datasets":
+                self._send(200, {"datasets": self.service.names})
+            elif url.path == "/stats":
+                self._send(200, self.service.stats())
+            elif url.path == "/intersect":
+                names, thresholds = parseQuery(url.query)
+                targets = self.service.intersect(names, **thresholds)
+                self._send(200, {"datasets": names, "thresholds": thresholds, "targets": list(targets)})
+            elif url.path == "/rank":
+                names, thresholds = parseQuery(url.query)
+                if thresholds:
+                    raise QueryError("Ranks do not depend on thresholds")
+                rank = self.service.rank(names)
+                self._send(200, {"datasets": names, "targets": [target for target, _ in rank],
+                                 "ranks": [value for _, value in rank]})
+            else:
+                self._send(404, {"error": "Unknown path: " + url.path})
+        except QueryError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": "{}: {}".format(type(e).__name__, e)})
+
+    def do_POST(self):
+        try:
+            if urlsplit(self.path).path == "/reload":
+                self.service.reload()
+                self._send(200, {"datasets": self.service.names})
+            else:
+                self._send(404, {"error": "Unknown path: " + self.path})
+        except Exception as e:
+            self._send(500, {"error": "{}: {}".format(type(e).__name__, e)})
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def makeServer(service, host = "127.0.0.1", port = 8050):
+    '''
+    Args
+    - service: SelectionService
+    - host: str
+        address to bind; the default only accepts local connections
+    - port: int
+        0: any free port (see server.server_address)
+
+    Returns: http.server.ThreadingHTTPServer
+        call serve_forever() to start serving and shutdown() from another thread to stop
+    '''
+    handler = type("Handler", (_Handler,), {"service": service})
+    return(ThreadingHTTPServer((host, port), handler))
@@ -0,0 +1,154 @@
+'''
+Rank aggregation of targets missing from some datasets (robust rank aggregation, Kolde et al. 2012).
+
+selection.aggregateRanks() sums ranks only over targets present in every dataset, so a small panel (e.g., Huang's
+140 kinases) removes most targets shared by the other datasets. Here, every target measured in at least minDatasets
+datasets is scored from the ranks it has:
+- within each dataset, targets (first row of each) are re-ranked by their rank column and normalized to
+  (position + 1) / (number of ranked targets), in (0, 1]; lower is more differentially inhibited
+- for a target with normalized ranks r_(1) <= ... <= r_(n) in the n datasets that measured it, the beta score of the
+  k-th order statistic is P(Beta(k, n - k + 1) <= r_(k)): the probability that the k-th smallest of n uniform random
+  ranks is at most r_(k). rho is the smallest beta score over k.
+- score: rho corrected for the n order statistics tested, 1 - (1 - rho)^n (an upper bound of the p-value of rho under
+  the null hypothesis of random ranks). Targets are ordered by increasing score.
+
+Beta scores are computed for all targets of the same coverage n at once from binomial tail probabilities,
+P(Beta(k, n - k + 1) <= x) = P(Binomial(n, x) >= k), in chunks of bounded memory.
+
+Usage
+    ranks = rankMatrix({"Klaeger": df1, "Huang": df2, "Annes100": df3})   # each with a 'rank' column
+    result = robustRankAggregation(ranks, minDatasets=2)
+'''
+
+import numpy as np
+import pandas as pd
+from datasets import GENE_SYMBOL_COLUMN
+
+def normalizedRanks(values):
+    '''
+    Args
+    - values: numpy.ndarray of float
+        ranks or scores, lower is better; NaN: not ranked
+
+    Returns: numpy.ndarray of float
+        (position + 1) / (number of non-NaN values) in increasing order of values (ties in order of occurrence); NaN
+        where values are NaN
+    '''
+    values = np.asarray(values, dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    order = valid[np.argsort(values[valid], kind='stable')]
+    normalized = np.full(len(values), np.nan)
+    normalized[order] = np.arange(1, len(order) + 1) / max(len(order), 1)
+    return(normalized)
+
+def rankMatrix(dfs, keyCol = GENE_SYMBOL_COLUMN, rankCol = 'rank'):
+    '''
+    Align the normalized ranks of datasets by target.
+
+    Args
+    - dfs: dict: str -> pandas.DataFrame
+        dataset name -> dataset with columns keyCol and rankCol (e.g., from selection.normalizedDiffRank()). Only the
+        first row of each key in a dataset is used.
+    - keyCol: str
+        column of target identifiers on which to align datasets
+    - rankCol: str
+        column of ranks, lower is better
+
+    Returns: pandas.DataFrame
+        normalized ranks (see normalizedRanks()), one row per target in order of first occurrence, one column per
+        dataset; NaN where a target is not in a dataset
+    '''
+    series = []
+    for name, df in dfs.items():
+        df = df.dropna(subset=[keyCol]).drop_duplicates(subset=keyCol)
+        series.append(pd.Series(normalizedRanks(df[rankCol].to_numpy(dtype=float)), index=df[keyCol].to_numpy(),
+                                name=name))
+    ranks = pd.concat(series, axis=1, join='outer', sort=False)
+    ranks.index.name = keyCol
+    return(ranks)
+
+def betaScores(ranks, chunkSize = 2 ** 22):
+    '''
+    Smallest beta score of the order statistics of each row.
+
+    Args
+    - ranks: numpy.ndarray of float, shape (targets, datasets)
+        normalized ranks in (0, 1]; NaN where not ranked
+    - chunkSize: int
+        maximum number of binomial probabilities computed at once, bounding memory use to about 24 * chunkSize bytes
+
+    Returns: (numpy.ndarray of float, numpy.ndarray of int)
+        rho (smallest beta score over the order statistics) and the order statistic k (from 1) at which it is attained;
+        NaN and 0 for rows without ranks
+    '''
+    ranks = np.asarray(ranks, dtype=float)
+    coverage = (~np.isnan(ranks)).sum(axis=1)
+    # order statistics: NaNs are sorted last
+    ranks = np.sort(ranks, axis=1)
+    rho = np.full(len(ranks), np.nan)
+    bestK = np.zeros(len(ranks), dtype=int)
+    for n in np.unique(coverage[coverage > 0]):
+        rows = np.flatnonzero(coverage == n)
+        j = np.arange(n + 1)
+        logFactorials = _logFactorials(n)
+        logChoose = logFactorials[n] - logFactorials[j] - logFactorials[n - j]
+        step = max(1, chunkSize // (n * (n + 1)))
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            x = ranks[chunk, :n, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                logPmf = logChoose + j * np.log(x) + np.where(j < n, (n - j) * np.log1p(-x), 0)
+            # P(Binomial(n, x) >= j) for j = 0..n, by summing probabilities from j = n down
+            tail = np.cumsum(np.exp(logPmf)[:, :, ::-1], axis=2)[:, :, ::-1]
+            scores = np.minimum(tail[:, np.arange(n), np.arange(1, n + 1)], 1)
+            bestK[chunk] = np.argmin(scores, axis=1) + 1
+            rho[chunk] = scores.min(axis=1)
+    return(rho, bestK)
+
+def robustRankAggregation(ranks, minDatasets = 2, chunkSize = 2 ** 22):
+    '''
+    Score targets ranked in at least minDatasets datasets.
+
+    Args
+    - ranks: pandas.DataFrame
+        normalized ranks, one row per target, one column per dataset; NaN where a target is not in a dataset (e.g.,
+        from rankMatrix() or kinomeMatrix.KinomeMatrix.rankMatrix())
+    - minDatasets: int
+        minimum number of datasets in which a target must be ranked
+    - chunkSize: int
+        see betaScores()
+
+    Returns: pandas.DataFrame
+        indexed by target, sorted by increasing score (ties: by decreasing n_datasets, then in order of ranks), with
+        columns
+        - score: rho corrected for the number of order statistics, 1 - (1 - rho)^n_datasets
+        - rho: smallest beta score over the order statistics of the target's ranks
+        - best_k: order statistic at which rho is attained
+        - mean_rank: mean normalized rank over the datasets in which the target is ranked
+        - n_datasets: number of datasets in which the target is ranked
+        - coverage: n_datasets / number of datasets
+        - datasets: comma-separated names of those datasets
+    '''
+    measured = ranks.notna().to_numpy()
+    nDatasets = measured.sum(axis=1)
+    keep = nDatasets >= max(minDatasets, 1)
+    ranks, measured, nDatasets = ranks[keep], measured[keep], nDatasets[keep]
+    values = ranks.to_numpy(dtype=float)
+    rho, bestK = betaScores(values, chunkSize)
+    columns = np.asarray(ranks.columns.astype(str), dtype=object)
+    with np.errstate(divide='ignore'):
+        score = -np.expm1(nDatasets * np.log1p(-rho))
+    result = pd.DataFrame({
+        "score": score,
+        "rho": rho,
+        "best_k": bestK,
+        "mean_rank": np.nansum(values, axis=1) / np.maximum(nDatasets, 1),
+        "n_datasets": nDatasets,
+        "coverage": nDatasets / max(len(columns), 1),
+        "datasets": [",".join(columns[row]) for row in measured]}, index=ranks.index)
+    order = np.lexsort((-nDatasets, result['score'].to_numpy()))
+    return(result.iloc[order])
+
+def _logFactorials(n):
+    # log(i!) for i = 0..n
+    return(np.concatenate([[0], np.cumsum(np.log(np.arange(1, n + 1)))]))
@@ -0,0 +1,198 @@
+'''
+Dependency-graph executor for pipeline stages.
+
+Tasks are functions whose arguments may be the results of other tasks (Dep). A task is submitted as soon as all tasks
+it depends on have finished, so independent tasks (e.g., the stages of different datasets) overlap:
+- "cpu" tasks run in a ProcessPoolExecutor (functions and arguments must be picklable)
+- "io" tasks (file I/O, network lookups) run in a ThreadPoolExecutor of the main process
+
+Usage
+    graph = TaskGraph()
+    graph.add("read", readRaw, path)
+    graph.add("clean", cleanPercent, Dep("read"), kind="cpu")
+    results = graph.run(nProcesses=4)
+'''
+
+import threading
+from concurrent.futures import (Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait)
+
+class Dep:
+    '''
+    Placeholder for the result of a task in the arguments of another task.
+
+    Args
+    - name: str
+        task name
+    '''
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return("Dep({!r})".format(self.name))
+
+class TaskGraph:
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name, func, *args, kind = "io", after = (), **kwargs):
+        '''
+        Add a task.
+
+        Args
+        - name: str
+            unique task name
+        - func: function
+        - args, kwargs
+            arguments to func; Dep(name) arguments, including those in lists, tuples and dicts, are replaced by the
+            result of the task name
+        - kind: str
+            "cpu": run in a process pool; "io": run in a thread pool
+        - after: list of str
+            names of tasks that must finish before this task starts, in addition to those referenced by Dep arguments
+
+        Returns: Dep
+            placeholder for the result of this task
+        '''
+        if name in self.tasks:
+            raise ValueError("Duplicate task: " + name)
+        if kind not in ("cpu", "io"):
+            raise ValueError("kind must be 'cpu' or 'io'")
+        deps = _deps(args) | _deps(kwargs) | set(after)
+        self.tasks[name] = {"func": func, "args": args, "kwargs": kwargs, "kind": kind, "deps": deps}
+        return(Dep(name))
+
+    def run(self, nProcesses = None, nThreads = None):
+        '''
+        Run all tasks.
+
+        Args
+        - nProcesses: int
+            number of processes for "cpu" tasks (None: os.cpu_count()). 0: run "cpu" tasks in the thread pool
+        - nThreads: int
+            number of threads for "io" tasks. None: ThreadPoolExecutor default
+
+        Returns: dict: str -> object
+            task name -> result
+
+        Raises the exception of the first failed task, after waiting for running tasks to finish; tasks that depend on
+        it are not started.
+        '''
+        for name, task in self.tasks.items():
+            missing = task["deps"] - set(self.tasks)
+            if missing:
+                raise ValueError("Task {} depends on unknown tasks: {}".format(name, ", ".join(sorted(missing))))
+        self._checkAcyclic()
+
+        results = {}
+        remaining = {name: set(task["deps"]) for name, task in self.tasks.items()}
+        dependents = {name: [] for name in self.tasks}
+        for name, task in self.tasks.items():
+            for dep in task["deps"]:
+                dependents[dep].append(name)
+
+        threads = ThreadPoolExecutor(nThreads)
+        processes = ProcessPoolExecutor(nProcesses) if nProcesses != 0 else threads
+        running = {}
+        try:
+            def submit(name):
+                task = self.tasks[name]
+                args = _substitute(task["args"], results)
+                kwargs = _substitute(task["kwargs"], results)
+                executor = processes if task["kind"] == "cpu" else threads
+                running[executor.submit(task["func"], *args, **kwargs)] = name
+
+            for name in [name for name, deps in remaining.items() if not deps]:
+                submit(name)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    for dependent in dependents[name]:
+                        remaining[dependent].discard(name)
+                        if not remaining[dependent]:
+                            submit(dependent)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+        finally:
+            threads.shutdown(wait=True)
+            if processes is not threads:
+                processes.shutdown(wait=True)
+        return(results)
+
+    def _checkAcyclic(self):
+        state = {}
+        for root in self.tasks:
+            stack = [(root, iter(self.tasks[root]["deps"]))]
+            if state.get(root) == "done":
+                continue
+            state[root] = "visiting"
+            while stack:
+                name, deps = stack[-1]
+                dep = next(deps, None)
+                if dep is None:
+                    state[name] = "done"
+                    stack.pop()
+                elif state.get(dep) == "visiting":
+                    raise ValueError("Cyclic dependency involving task " + dep)
+                elif dep not in state:
+                    state[dep] = "visiting"
+                    stack.append((dep, iter(self.tasks[dep]["deps"])))
+
+def _deps(obj):
+    if isinstance(obj, Dep):
+        return({obj.name})
+    if isinstance(obj, (list, tuple)):
+        return(set().union(*(_deps(x) for x in obj)))
+    if isinstance(obj, dict):
+        return(set().union(*(_deps(x) for x in obj.values())))
+    return(set())
+
+def _substitute(obj, results):
+    if isinstance(obj, Dep):
+        return(results[obj.name])
+    if isinstance(obj, (list, tuple)):
+        return(type(obj)(_substitute(x, results) for x in obj))
+    if isinstance(obj, dict):
+        return({k: _substitute(v, results) for k, v in obj.items()})
+    return(obj)
+
+class SharedResolver:
+    '''
+    Thread-safe wrapper of a gene symbol resolver for concurrent resolve tasks: each distinct term is passed to the
+    wrapped resolver once, and tasks requesting a term that is being resolved by another task wait for its result.
+    Calls into the wrapped resolver are serialized: resolvers are not safe to call from several threads at once (e.g.,
+    an entrezClient.AsyncEntrezClient rate-limits the requests of one event loop at a time).
+
+    Args
+    - resolver: function
+        list of str -> list of str, e.g. from processing.makeResolver()
+    '''
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.lock = threading.Lock()
+        self.resolveLock = threading.Lock()
+        self.futures = {}
+
+    def __call__(self, terms):
+        with self.lock:
+            new = [term for term in dict.fromkeys(terms) if term not in self.futures]
+            for term in new:
+                self.futures[term] = Future()
+        if len(new) > 0:
+            try:
+                with self.resolveLock:
+                    symbols = self.resolver(new)
+            except BaseException as e:
+                for term in new:
+                    self.futures[term].set_exception(e)
+                raise
+            for term, symbol in zip(new, symbols):
+                self.futures[term].set_result(symbol)
+        with self.lock:
+            futures = [self.futures[term] for term in terms]
+        return([future.result() for future in futures])
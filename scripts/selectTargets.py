@@ -5,16 +5,23 @@
 
 
 # Import all packages
+# - Selection functions are defined in selection.py; this script runs them step by step and displays intermediate
+#   results. To run without Jupyter / IPython, use `python stf1081.py select` instead.
 import os
-import numpy as np
 import pandas as pd
-from IPython.display import display
+try:
+    from IPython.display import display
+except ImportError:
+    display = print
+from selection import (booleanFilter, intersectTargets, normalizedDiffRank, aggregateRanks, compareConcentrations,
+                       writeIntersect, writeRank)
 
 
 # In[2]:
 
 
 # Global parameters / values
+data_dir = "../data/"
 dataAux_dir = "../data_aux/"
 results_dir = "../results/"
 Klaeger_filename = "Klaeger.csv"
@@ -50,6 +57,41 @@ max_percent_thresh = 75
 # Compare 100nM STF1081 to 100nM STF1285 (Annes100_filename) or 500nM STF1285 (Annes500_filename)
 Annes_filename = Annes100_filename
 
+# Threshold sweep
+# - sweep: bool
+#     Also evaluate Boolean filtering for every combination of the threshold values below, writing the intersection
+#     for each combination to thresholdSweep.tsv in results_dir
+# - sweep_use_diff, sweep_diff_percent_thresh, sweep_diff_fold_thresh, sweep_min_percent_thresh,
+#   sweep_max_percent_thresh: list
+#     values of the corresponding threshold parameters above to sweep. None: default values (thresholdSweep.DEFAULT_GRID)
+# - sweep_nProcesses: int
+#     number of processes over which to split the sweep. None: os.cpu_count()
+sweep = False
+sweep_use_diff = [True, False]
+sweep_diff_percent_thresh = None
+sweep_diff_fold_thresh = None
+sweep_min_percent_thresh = None
+sweep_max_percent_thresh = None
+sweep_nProcesses = 1
+
+# Significance of summed ranks (Rank ordering)
+# - rank_nPermutations: int
+#     Number of permutations of each dataset's ranks from which to compute empirical p-values and false discovery rates
+#     of summed ranks, written to rankSignificance.tsv in results_dir. 0: do not compute
+# - rank_seed: int
+#     seed for the random number generator. None: unpredictable
+# - rank_nProcesses: int
+#     number of processes over which to split the permutations. None: os.cpu_count()
+rank_nPermutations = 0
+rank_seed = 0
+rank_nProcesses = 1
+
+# Rank aggregation of targets missing from some datasets (Rank ordering)
+# - rank_minDatasets: int
+#     Score every target ranked in at least this many datasets by robust rank aggregation (rankAggregation.py), written
+#     with each target's coverage to rankAggregation.tsv in results_dir. 0: do not compute
+rank_minDatasets = 2
+
 
 # In[3]:
 
@@ -67,41 +109,44 @@ df3 = pd.read_csv(os.path.join(dataAux_dir, Annes_filename))
 # In[4]:
 
 
-df1['bool'] = np.nan
-df2['bool'] = np.nan
-df3['bool'] = np.nan
+df1['bool'] = booleanFilter(df1, 'fold', 'CC401', 'STF1081', use_diff, diff_percent_thresh, diff_fold_thresh,
+                            min_percent_thresh, max_percent_thresh)
+df2['bool'] = booleanFilter(df2, 'percent', 'HTH01091', 'STF1081', use_diff, diff_percent_thresh, diff_fold_thresh,
+                            min_percent_thresh, max_percent_thresh)
+df3['bool'] = booleanFilter(df3, 'percent', 'STF1285', 'STF1081', use_diff, diff_percent_thresh, diff_fold_thresh,
+                            min_percent_thresh, max_percent_thresh)
 
 
 # In[5]:
 
 
-if use_diff:
-    df1['bool'] = df1['CC401'] / df1['STF1081'] >= diff_fold_thresh
-    df2['bool'] = df2['HTH01091'] - df2['STF1081'] >= diff_percent_thresh
-    df3['bool'] = df3['STF1285'] - df3['STF1081'] >= diff_percent_thresh
-else:
-    df1.loc[np.isinf(df1['CC401']) & (df1['STF1081'] < np.inf), 'bool'] = True
-    df2.loc[(df2['HTH01091'] >= max_percent_thresh) & (df2['STF1081'] <= min_percent_thresh), 'bool'] = True
-    df3.loc[(df3['STF1285'] >= max_percent_thresh) & (df3['STF1081'] <= min_percent_thresh), 'bool'] = True
+intersect = intersectTargets([df1, df2, df3], 'bool', geneSymbolColumn)
+display(intersect)
 
 
 # In[6]:
 
 
-intersect = pd.merge(df1, df2, how='inner', on=[geneSymbolColumn, 'bool'])
-intersect = pd.merge(intersect, df3, how='inner', on=[geneSymbolColumn, 'bool'])
-intersect = intersect.loc[intersect["bool"] == True, geneSymbolColumn]
-intersect.sort_values(inplace=True)
-intersect.reset_index(drop=True, inplace=True)
-display(intersect)
+writeIntersect(intersect, os.path.join(results_dir, "intersect.txt"))
 
 
+# ### Threshold sweep
+# 
+# Intersection across all datasets for every combination of threshold parameters (if `sweep` is set).
+
 # In[7]:
 
 
-with open(os.path.join(results_dir, "intersect.txt"), "w") as f:
-    f.write("\n".join(list(intersect)))
-    f.write("\n")
+if sweep:
+    from thresholdSweep import SweepDataset, makeGrid, sweepThresholds
+    sweepDatasets = [SweepDataset(df1, geneSymbolColumn, 'fold', 'CC401'),
+                     SweepDataset(df2, geneSymbolColumn, 'percent', 'HTH01091'),
+                     SweepDataset(df3, geneSymbolColumn, 'percent', 'STF1285')]
+    grid = makeGrid(sweep_diff_percent_thresh, sweep_diff_fold_thresh, sweep_min_percent_thresh,
+                    sweep_max_percent_thresh, sweep_use_diff)
+    sweepResult = sweepThresholds(sweepDatasets, grid, sweep_nProcesses)
+    display(sweepResult)
+    sweepResult.to_csv(os.path.join(results_dir, "thresholdSweep.tsv"), index=False, sep="\t")
 
 
 # ## Rank ordering
@@ -109,50 +154,56 @@ with open(os.path.join(results_dir, "intersect.txt"), "w") as f:
 # In[8]:
 
 
-df1['diff'] = df1['CC401'] - df1['STF1081']
-df1.sort_values(by=['diff','STF1081'], ascending=[False,True], inplace=True)
-df1.reset_index(drop=True, inplace=True)
-df1['rank'] = df1.index / len(df1)
-
-df2['diff'] = df2['HTH01091'] - df2['STF1081']
-df2.sort_values(by=['diff','STF1081'], ascending=[False,True], inplace=True)
-df2.reset_index(drop=True, inplace=True)
-df2['rank'] = df2.index / len(df2)
-
-df3['diff'] = df3['STF1285'] - df3['STF1081']
-df3.sort_values(by=['diff','STF1081'], ascending=[False,True], inplace=True)
-df3.reset_index(drop=True, inplace=True)
-df3['rank'] = df3.index / len(df3)
+df1['rank'] = normalizedDiffRank(df1, 'CC401')
+df2['rank'] = normalizedDiffRank(df2, 'HTH01091')
+df3['rank'] = normalizedDiffRank(df3, 'STF1285')
 
 
 # In[9]:
 
 
-targets = list(set(df1[geneSymbolColumn]) & set(df2[geneSymbolColumn]) & set(df3[geneSymbolColumn]))
+rank = aggregateRanks([df1, df2, df3], geneSymbolColumn)
+with pd.option_context('display.max_rows', None):
+    display(rank)
 
 
 # In[10]:
 
 
-rank = pd.Series({target: (df1.loc[df1[geneSymbolColumn] == target, 'rank'].values[0] +
-                           df2.loc[df2[geneSymbolColumn] == target, 'rank'].values[0] +
-                           df3.loc[df3[geneSymbolColumn] == target, 'rank'].values[0]) for target in targets})
-rank.sort_values(ascending=True, inplace=True)
-with pd.option_context('display.max_rows', None):
-    display(rank)
+writeRank(rank, os.path.join(results_dir, "rank.tsv"))
 
 
 # In[11]:
 
 
-rank.to_csv(os.path.join(results_dir, "rank.tsv"), index=True, sep="\t")
+# Empirical p-values and false discovery rates of summed ranks
+if rank_nPermutations > 0:
+    from significance import rankSignificance
+    rankSig = rankSignificance([df1, df2, df3], geneSymbolColumn, nPermutations=rank_nPermutations, seed=rank_seed,
+                               nProcesses=rank_nProcesses)
+    with pd.option_context('display.max_rows', None):
+        display(rankSig)
+    rankSig.to_csv(os.path.join(results_dir, "rankSignificance.tsv"), sep="\t")
+
+
+# In[12]:
+
+
+# Robust rank aggregation over targets in at least rank_minDatasets datasets, not only those in all datasets
+if rank_minDatasets > 0:
+    from rankAggregation import rankMatrix, robustRankAggregation
+    rra = robustRankAggregation(rankMatrix({"Klaeger": df1, "Huang": df2, "Annes100": df3}, geneSymbolColumn),
+                                rank_minDatasets)
+    with pd.option_context('display.max_rows', None):
+        display(rra)
+    rra.to_csv(os.path.join(results_dir, "rankAggregation.tsv"), sep="\t")
 
 
 # ## Boolean filtering based on increasing STF-1285 concentration
 # 
 # This is not meant to identify toxic targets of STF1081 but instead to get an idea of targets that may be responsible for toxicity of STF-1285 at higher concentrations.
 
-# In[12]:
+# In[13]:
 
 
 # Parameters
@@ -161,29 +212,46 @@ min_percent_thresh = 25
 max_percent_thresh = 75
 
 
-# In[13]:
+# In[14]:
 
 
 df4 = pd.read_csv(os.path.join(dataAux_dir, Annes100_filename))
 df5 = pd.read_csv(os.path.join(dataAux_dir, Annes500_filename))
 
 
-# In[14]:
+# In[15]:
 
 
 # merge 100 nM and 500 nM datasets
-stf1285 = pd.merge(df4, df5, how='inner', on=[geneSymbolColumn], suffixes=(" (100 nM)", " (500 nM)"))
-stf1285 = stf1285[[geneSymbolColumn, "STF1285 (100 nM)", "STF1285 (500 nM)"]]
-stf1285['diff'] = stf1285["STF1285 (100 nM)"] - stf1285["STF1285 (500 nM)"]
-stf1285.sort_values(by='diff', ascending=False, inplace=True)
-stf1285.reset_index(drop=True, inplace=True)
+stf1285 = compareConcentrations(df4, df5, "STF1285", "100 nM", "500 nM", diff_percent_thresh, geneSymbolColumn)
+print(stf1285.loc[stf1285['bool'] == True, geneSymbolColumn].sort_values().reset_index(drop=True))
 
 
-# In[15]:
+# In[16]:
 
 
-stf1285['bool'] = (stf1285['diff'] >= diff_percent_thresh) #& \
-                  #(stf1285['STF1285 (500 nM)'] <= min_percent_thresh) & \
-                  #(stf1285['STF1285 (100 nM)'] >= max_percent_thresh)
-print(stf1285.loc[stf1285['bool'] == True, geneSymbolColumn].sort_values().reset_index(drop=True))
+# dose-shift metrics of STF1285 over all available concentrations (see concentrationLadder.py): pairwise differences,
+# monotonicity and approximate half-inhibition dose (nM) of each target. STF1081 was only measured at 100 nM; its values
+# are repeated in the 500 nM dataset.
+from concentrationLadder import ConcentrationLadder
+ladder = ConcentrationLadder.fromFrames({100: df4, 500: df5}, "STF1285", geneSymbolColumn)
+display(ladder.summary(diff_percent_thresh).head(20))
+
+
+# ## Reference compound screen
+# 
+# Compare STF1081 against every other compound in the Klaeger et al. Kinobeads drug matrix to find less toxic reference compounds that differ most from STF1081 in the targets they inhibit. For each reference compound: the number of targets measured for both compounds, the number of targets with at least `diff_fold_thresh`-fold difference in Kd_app, the number of targets inhibited by STF1081 only, and the median log10 fold difference.
+
+# In[17]:
+
+
+from drugMatrix import differentialScores, readKinobeadsMatrix
+klaegerValues, klaegerLowConfidence = readKinobeadsMatrix(os.path.join(data_dir, Klaeger_filename))
+klaegerFold, klaegerRank, referenceCompounds = differentialScores(klaegerValues, 'STF1081', diff_fold_thresh)
+display(referenceCompounds)
+
+
+# In[18]:
+
 
+referenceCompounds.to_csv(os.path.join(results_dir, "referenceCompounds.tsv"), index=True, sep="\t")
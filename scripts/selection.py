@@ -0,0 +1,210 @@
+'''
+Selection of potential toxicity targets of STF1081 from processed datasets (data_aux/).
+
+- Boolean filtering: find the intersection across datasets of targets that are inhibited by STF1081 but not by a less
+  toxic compound (booleanFilter(), intersectTargets())
+- Rank ordering: rank targets within each dataset by the difference in inhibition between a less toxic compound and
+  STF1081, normalized by the number of targets, and sum ranks across datasets (normalizedDiffRank(), aggregateRanks())
+- Concentration comparison: targets inhibited more strongly at a higher concentration of a compound
+  (compareConcentrations())
+'''
+
+import os
+import numpy as np
+import pandas as pd
+from buildCache import BuildCache, CACHE_DIRNAME
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+
+def readDataset(name, dataAux_dir, useCache = True):
+    '''
+    Read a processed dataset.
+
+    Args
+    - name: str
+        dataset name, a key of DATASETS
+    - dataAux_dir: str
+        directory of processed data files
+    - useCache: bool
+        Read typed columns from the build cache (dataAux_dir/cache/; see buildCache.py) if the processed data file is
+        unchanged since the dataset was cached. Otherwise, or if the dataset is not cached, parse the processed data file.
+
+    Returns: pandas.DataFrame
+    '''
+    path = os.path.join(dataAux_dir, DATASETS[name]["filename"])
+    if useCache:
+        df = BuildCache(os.path.join(dataAux_dir, CACHE_DIRNAME)).load(name, csvPath=path, mmap=False, csvMissing=True)
+        if df is not None:
+            return(df)
+    return(pd.read_csv(path))
+
+def booleanFilter(df, metric, referenceCol, compoundCol = 'STF1081', use_diff = True, diff_percent_thresh = 20,
+                  diff_fold_thresh = 20, min_percent_thresh = 25, max_percent_thresh = 75):
+    '''
+    Label each target as both inhibited by a compound and not inhibited by a less toxic reference compound.
+
+    Args
+    - df: pandas.DataFrame
+    - metric: str
+        "fold" (Kd_app values) or "percent" (% control or % activity remaining values); see datasets.py
+    - referenceCol: str
+        column of values for the less toxic compound
+    - compoundCol: str
+        column of values for the compound
+    - use_diff: bool
+        Use difference between the compound and the reference compound as value to threshold
+          "percent": use the absolute difference and compare to threshold diff_percent_thresh
+          "fold": use fold difference and compare to threshold diff_fold_thresh
+        Otherwise,
+          "percent": compare values to min_percent_thresh (compound) and max_percent_thresh (reference compound)
+          "fold": the reference compound does not inhibit the target (np.inf) but the compound does
+    - diff_percent_thresh: int or float
+        Threshold absolute difference (% control (Annes) or % activity remaining (Huang)) between a less toxic compound
+        and STF1081 at which a target (kinase) is considered a potential target for the toxicity of STF1081
+    - diff_fold_thresh: int or float
+        Threshold fold difference (Kd_app) between a less toxic compound and STF1081 at which a target (kinase)
+        is considered a potential target for the toxicity of STF1081
+    - min_percent_thresh: int or float
+        Threshold % control (Annes) or % activity remaining (Huang) at which a target is considered to be inhibited by STF1081
+    - max_percent_thresh: int or float
+        Threshold % control (Annes) or % activity remaining (Huang) at which a target is considered to be not inhibited by
+        a less toxic compound
+
+    Returns: pandas.Series of bool
+        same index as df
+    '''
+    reference, compound = df[referenceCol], df[compoundCol]
+    if metric == "fold":
+        if use_diff:
+            return(reference / compound >= diff_fold_thresh)
+        return(np.isinf(reference) & (compound < np.inf))
+    if use_diff:
+        return(reference - compound >= diff_percent_thresh)
+    return((reference >= max_percent_thresh) & (compound <= min_percent_thresh))
+
+def intersectTargets(dfs, boolCol = 'bool', keyCol = GENE_SYMBOL_COLUMN):
+    '''
+    Find targets labeled True in every dataset.
+
+    Args
+    - dfs: list of pandas.DataFrame
+        datasets, each with columns keyCol and boolCol
+    - boolCol: str
+        column of labels, e.g. from booleanFilter()
+    - keyCol: str
+        column of target identifiers (e.g., official gene symbols) on which to align datasets
+
+    Returns: pandas.Series
+        sorted targets
+    '''
+    targets = None
+    for df in dfs:
+        selected = set(df.loc[df[boolCol] == True, keyCol].dropna())
+        targets = selected if targets is None else targets & selected
+    return(pd.Series(sorted(targets), name=keyCol, dtype=object))
+
+def normalizedDiffRank(df, referenceCol, compoundCol = 'STF1081'):
+    '''
+    Rank targets by the difference in inhibition between a less toxic reference compound and a compound, normalized by
+    the number of targets. Targets are ordered by decreasing difference (referenceCol - compoundCol), with ties broken
+    by increasing compoundCol; the i-th target (starting from 0) has rank i / len(df).
+
+    Args
+    - df: pandas.DataFrame
+    - referenceCol: str
+        column of values for the less toxic compound
+    - compoundCol: str
+        column of values for the compound
+
+    Returns: pandas.Series
+        normalized rank of each row of df (same index as df)
+    '''
+    rank = diffRankArray(df[referenceCol].to_numpy(dtype=float), df[compoundCol].to_numpy(dtype=float))
+    return(pd.Series(rank, index=df.index))
+
+def diffRankArray(reference, compound):
+    '''
+    Array version of normalizedDiffRank().
+
+    Args
+    - reference, compound: numpy.ndarray of float
+        values for the less toxic reference compound and the compound
+
+    Returns: numpy.ndarray of float
+        normalized rank of each element
+    '''
+    with np.errstate(invalid='ignore'):
+        # np.inf - np.inf (not inhibited by either compound) is NaN, as in pandas
+        diff = np.asarray(reference, dtype=float) - np.asarray(compound, dtype=float)
+    order = np.lexsort((np.asarray(compound, dtype=float), -diff))
+    rank = np.empty(len(diff))
+    rank[order] = np.arange(len(diff)) / len(diff)
+    return(rank)
+
+def aggregateRanks(dfs, keyCol = GENE_SYMBOL_COLUMN, rankCol = 'rank'):
+    '''
+    Sum ranks across datasets for targets present in all datasets.
+
+    Args
+    - dfs: list of pandas.DataFrame
+        datasets, each with columns keyCol and rankCol. Only the first row of each key in a dataset is used.
+    - keyCol: str
+        column of target identifiers (e.g., official gene symbols) on which to align datasets
+    - rankCol: str
+        column of ranks
+
+    Returns: pandas.Series
+        summed rank of each target present in all datasets, indexed by target and sorted by increasing summed rank
+    '''
+    ranks = pd.concat([df.dropna(subset=[keyCol]).drop_duplicates(subset=keyCol).set_index(keyCol)[rankCol]
+                       for df in dfs], axis=1, join='inner')
+    return(ranks.sum(axis=1).sort_values(ascending=True, kind='stable'))
+
+def compareConcentrations(dfLow, dfHigh, valueCol, lowLabel, highLabel, diff_percent_thresh = 50,
+                          keyCol = GENE_SYMBOL_COLUMN):
+    '''
+    Compare inhibition of targets at two concentrations of a compound.
+
+    Args
+    - dfLow, dfHigh: pandas.DataFrame
+        datasets at the lower and higher concentration
+    - valueCol: str
+        column of values (% control or % activity remaining) for the compound
+    - lowLabel, highLabel: str
+        labels of the concentrations, e.g. "100 nM" and "500 nM"
+    - diff_percent_thresh: int or float
+        threshold difference (lower concentration - higher concentration) at which a target is labeled True
+    - keyCol: str
+        column of target identifiers on which to align datasets
+
+    Returns: pandas.DataFrame
+        columns: keyCol, "<valueCol> (<lowLabel>)", "<valueCol> (<highLabel>)", "diff", "bool"; sorted by decreasing diff
+    '''
+    low, high = "{} ({})".format(valueCol, lowLabel), "{} ({})".format(valueCol, highLabel)
+    df = pd.merge(dfLow, dfHigh, how='inner', on=[keyCol], suffixes=(" (" + lowLabel + ")", " (" + highLabel + ")"))
+    df = df[[keyCol, low, high]].assign(diff=df[low] - df[high])
+    df = df.sort_values(by='diff', ascending=False).reset_index(drop=True)
+    df['bool'] = df['diff'] >= diff_percent_thresh
+    return(df)
+
+def writeIntersect(targets, path):
+    '''
+    Write targets, one per line.
+
+    Args
+    - targets: iterable of str
+    - path: str
+    '''
+    with open(path, "w") as f:
+        f.write("\n".join(list(targets)))
+        f.write("\n")
+
+def writeRank(rank, path):
+    '''
+    Write summed ranks as a tab-separated file without header (target, summed rank).
+
+    Args
+    - rank: pandas.Series
+        e.g. from aggregateRanks()
+    - path: str
+    '''
+    rank.to_csv(path, index=True, header=False, sep="\t")
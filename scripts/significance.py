@@ -0,0 +1,100 @@
+'''
+Permutation significance of summed ranks from the Rank ordering method of selectTargets.py.
+
+Null hypothesis: within each dataset, targets are ranked at random. For each permutation, the ranks of a dataset are
+shuffled among all of its targets, and the summed rank of every target present in all datasets is recomputed. Since
+targets are exchangeable under the null hypothesis, the null summed ranks of all targets are pooled: the empirical
+p-value of a target is the fraction of null summed ranks less than or equal to its observed summed rank.
+
+Permutations are generated in chunks, each as a single matrix operation (argsort of a matrix of random numbers), and
+chunks can be spread over a ProcessPoolExecutor.
+'''
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from datasets import GENE_SYMBOL_COLUMN
+from selection import aggregateRanks
+
+def rankSignificance(dfs, keyCol = GENE_SYMBOL_COLUMN, rankCol = 'rank', nPermutations = 10000, seed = None,
+                     nProcesses = 1, chunkSize = 10000):
+    '''
+    Empirical p-values and false discovery rates of summed ranks.
+
+    Args
+    - dfs: list of pandas.DataFrame
+        datasets, each with columns keyCol and rankCol (e.g., from selection.normalizedDiffRank())
+    - keyCol: str
+        column of target identifiers on which to align datasets
+    - rankCol: str
+        column of ranks
+    - nPermutations: int
+        number of permutations
+    - seed: int
+        seed for the random number generator. None: unpredictable
+    - nProcesses: int
+        1: run permutations in the main process
+        > 1 or None: run chunks of permutations in a ProcessPoolExecutor of nProcesses processes (None: os.cpu_count())
+    - chunkSize: int
+        number of permutations per matrix operation, bounding memory use to chunkSize * (number of rows of the largest
+        dataset) values
+
+    Returns: pandas.DataFrame
+        indexed by target (targets present in all datasets), sorted by increasing summed rank, with columns
+        - rank: summed rank (see selection.aggregateRanks())
+        - p_value: empirical p-value, (1 + number of null summed ranks <= rank) / (1 + number of null summed ranks)
+        - fdr: Benjamini-Hochberg false discovery rate
+    '''
+    observed = aggregateRanks(dfs, keyCol, rankCol)
+    ranks = [df[rankCol].to_numpy(dtype=float) for df in dfs]
+    nTargets = len(observed)
+    chunks = [min(chunkSize, nPermutations - start) for start in range(0, nPermutations, chunkSize)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = (ranks, nTargets, np.sort(observed.to_numpy()))
+    if nProcesses == 1:
+        counts = list(map(_countChunk, itertools.repeat(args), chunks, seeds))
+    else:
+        with ProcessPoolExecutor(nProcesses) as executor:
+            counts = list(executor.map(_countChunk, itertools.repeat(args), chunks, seeds))
+    count = np.sum(counts, axis=0) if len(counts) > 0 else np.zeros(nTargets, dtype=np.int64)
+
+    # counts are computed for sorted observed summed ranks; observed is already sorted by increasing summed rank
+    pValues = (1 + count) / (1 + nPermutations * nTargets)
+    result = observed.to_frame('rank')
+    result['p_value'] = pValues
+    result['fdr'] = benjaminiHochberg(pValues)
+    return(result)
+
+def benjaminiHochberg(pValues):
+    '''
+    Benjamini-Hochberg false discovery rates (adjusted p-values).
+
+    Args
+    - pValues: array-like of float
+
+    Returns: numpy.ndarray
+        same order as pValues
+    '''
+    pValues = np.asarray(pValues, dtype=float)
+    n = len(pValues)
+    order = np.argsort(pValues, kind='stable')
+    adjusted = pValues[order] * n / np.arange(1, n + 1)
+    adjusted = np.minimum.accumulate(adjusted[::-1])[::-1]
+    fdr = np.empty(n)
+    fdr[order] = np.minimum(adjusted, 1)
+    return(fdr)
+
+def _countChunk(args, nPermutations, seedSequence):
+    '''
+    Returns: numpy.ndarray of int, shape (len(observed),)
+        number of null summed ranks <= each observed summed rank over nPermutations permutations
+    '''
+    ranks, nTargets, observed = args
+    rng = np.random.default_rng(seedSequence)
+    null = np.zeros((nPermutations, nTargets))
+    for r in ranks:
+        # the first nTargets columns of a random permutation of a dataset's rows are the rows that the targets present
+        # in all datasets take under the null hypothesis
+        rows = np.argsort(rng.random((nPermutations, len(r))), axis=1)[:, :nTargets]
+        null += r[rows]
+    return(np.searchsorted(np.sort(null, axis=None), observed, side='right'))
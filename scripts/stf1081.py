@@ -0,0 +1,276 @@
+'''
+Command-line interface for processing data and selecting potential toxicity targets of STF1081.
+
+Usage
+    python scripts/stf1081.py process [--backend {entrez,local}] [--datasets NAME ...] ...
+    python scripts/stf1081.py select [--datasets NAME ...] [--no-diff] [--diff-percent-thresh X] ...
+    python scripts/stf1081.py run [--datasets NAME ...] [--select-datasets NAME ...] [--processes N] ...
+    python scripts/stf1081.py serve [--port N] [--datasets NAME ...]
+    python scripts/stf1081.py similar [--compound NAME] [--metric {cosine,spearman}] [--furthest] ...
+
+Run with --help for all options. Modules are imported only by the subcommand that needs them, so that, e.g., select
+does not import gene symbol lookup dependencies (Biopython).
+'''
+
+import argparse
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def process(args):
+    from buildCache import BuildCache, CACHE_DIRNAME
+    from instrumentation import RunReport
+    from processing import processAll
+    resolver = _makeResolver(args)
+    report = RunReport(args.profile)
+    report.addSource(resolver.counters)
+    with report:
+        if args.chunk_size is not None:
+            from streaming import streamDataset
+            symbols, dfs = {}, {}
+            for name in args.datasets:
+                with report.stage("stream", name) as record:
+                    record["rows_out"] = streamDataset(name, args.data_dir, args.data_aux_dir, resolver,
+                                                       highConfidenceOnly=not args.low_confidence,
+                                                       chunkSize=args.chunk_size, symbols=symbols)
+                print("{}: {:d} targets".format(name, record["rows_out"]))
+        else:
+            dfs = processAll(args.data_dir, args.data_aux_dir, resolver, args.datasets,
+                             highConfidenceOnly=not args.low_confidence,
+                             cache=None if args.rebuild else BuildCache(os.path.join(args.data_aux_dir, CACHE_DIRNAME)),
+                             resolverKey=_resolverKey(args), report=report)
+    if args.report is not None:
+        report.write(args.report)
+    for name, df in dfs.items():
+        _printProcessed(name, df)
+    _writeReview(args, resolver)
+
+def select(args):
+    from datasets import DATASETS, GENE_SYMBOL_COLUMN
+    from kinomeMatrix import KinomeMatrix
+    from selection import readDataset, writeIntersect, writeRank
+    thresholds = _thresholds(args)
+    dfs = [readDataset(name, args.data_aux_dir) for name in args.datasets]
+    matrix = KinomeMatrix.fromFrames(dict(zip(args.datasets, dfs)))
+    intersect = matrix.intersect(**thresholds)
+    writeIntersect(intersect, os.path.join(args.results_dir, "intersect.txt"))
+    rank = matrix.rankSums()
+    writeRank(rank, os.path.join(args.results_dir, "rank.tsv"))
+    _printSelected(intersect, rank)
+    if args.min_datasets > 0:
+        from rankAggregation import robustRankAggregation
+        rra = robustRankAggregation(matrix.rankMatrix(), args.min_datasets)
+        rra.to_csv(os.path.join(args.results_dir, "rankAggregation.tsv"), sep="\t")
+        print("Rank aggregation: {:d} targets in at least {:d} datasets".format(len(rra), args.min_datasets))
+    if args.permutations > 0 or args.sweep:
+        dfs = [df.assign(bool=matrix.filter(name, **thresholds), rank=matrix.ranks(name))
+               for name, df in zip(args.datasets, dfs)]
+
+    if args.permutations > 0:
+        from significance import rankSignificance
+        rankSig = rankSignificance(dfs, nPermutations=args.permutations, seed=args.seed, nProcesses=args.processes)
+        rankSig.to_csv(os.path.join(args.results_dir, "rankSignificance.tsv"), sep="\t")
+        print("Rank significance: {:d} targets with FDR <= 0.05".format(int((rankSig['fdr'] <= 0.05).sum())))
+
+    if args.sweep:
+        from thresholdSweep import SweepDataset, makeGrid, sweepThresholds
+        grid = makeGrid(args.sweep_diff_percent_thresh, args.sweep_diff_fold_thresh, args.sweep_min_percent_thresh,
+                        args.sweep_max_percent_thresh)
+        sweepDatasets = [SweepDataset(df, GENE_SYMBOL_COLUMN, DATASETS[name]["metric"], DATASETS[name]["referenceCol"],
+                                      DATASETS[name]["compoundCol"]) for name, df in zip(args.datasets, dfs)]
+        sweepThresholds(sweepDatasets, grid, args.processes).to_csv(
+            os.path.join(args.results_dir, "thresholdSweep.tsv"), index=False, sep="\t")
+
+def run(args):
+    from buildCache import BuildCache, CACHE_DIRNAME
+    from pipeline import runPipeline
+    resolver = _makeResolver(args)
+    results = runPipeline(args.data_dir, args.data_aux_dir, args.results_dir, resolver, args.datasets,
+                          args.select_datasets, _thresholds(args), highConfidenceOnly=not args.low_confidence,
+                          cache=None if args.rebuild else BuildCache(os.path.join(args.data_aux_dir, CACHE_DIRNAME)),
+                          resolverKey=_resolverKey(args), nProcesses=args.processes, nThreads=args.threads)
+    for name in args.datasets:
+        _printProcessed(name, results["finalize:" + name])
+    _printSelected(*results["select"])
+    _writeReview(args, resolver)
+
+def _makeResolver(args):
+    from processing import makeResolver
+    normalizer = None
+    if not args.no_normalize_names:
+        from nameNormalizer import KinaseNameNormalizer
+        normalizer = KinaseNameNormalizer.fromProcessed(args.data_aux_dir)
+    fuzzyMatcher = None
+    if args.fuzzy_match:
+        from aliasMatcher import FuzzyAliasMatcher
+        fuzzyMatcher = FuzzyAliasMatcher.fromProcessed(args.data_aux_dir, threshold=args.fuzzy_threshold)
+    return(makeResolver(
+        args.backend, email=args.email, apiKey=args.api_key, maxConcurrency=args.max_concurrency,
+        cachePath=None if args.no_cache else os.path.join(args.data_aux_dir, "geneSymbolCache.sqlite"),
+        geneIndexPath=os.path.join(args.data_aux_dir, "geneIndex.pickle"),
+        geneInfoPath=os.path.join(args.data_dir, args.gene_info), normalizer=normalizer, fuzzyMatcher=fuzzyMatcher))
+
+def _writeReview(args, resolver):
+    review = resolver.reviewQueue()
+    if len(review) > 0:
+        from aliasMatcher import REVIEW_FILENAME, writeReview
+        path = os.path.join(args.data_aux_dir, REVIEW_FILENAME)
+        writeReview(review, path)
+        print("{:d} names without a confident approximate match queued for review in {}".format(len(review), path))
+
+def serve(args):
+    from queryService import SelectionService, makeServer
+    service = SelectionService(args.data_aux_dir, args.datasets, args.cache_size)
+    server = makeServer(service, args.host, args.port)
+    print("Serving {} on http://{}:{:d}/".format(", ".join(service.names), *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def similar(args):
+    import pandas as pd
+    from profileIndex import ProfileIndex, datasetProfiles, kinobeadsProfiles
+    if args.kinobeads_matrix is not None:
+        from drugMatrix import readKinobeadsMatrix
+        values, _ = readKinobeadsMatrix(args.kinobeads_matrix)
+        profiles = kinobeadsProfiles(values, args.concentration)
+    else:
+        from selection import readDataset
+        profiles = datasetProfiles({name: readDataset(name, args.data_aux_dir) for name in args.datasets},
+                                   concentration=args.concentration)
+    index = ProfileIndex(profiles, approximate=args.approximate)
+    with pd.option_context('display.max_rows', None):
+        print(index.query(args.compound, args.k, args.metric, args.furthest).to_string(index=False))
+
+def _resolverKey(args):
+    key = args.backend
+    if not args.no_normalize_names:
+        from nameNormalizer import KINASE_ALIASES_VERSION
+        key += "+normalized-v{:d}".format(KINASE_ALIASES_VERSION)
+    if args.fuzzy_match:
+        from aliasMatcher import FUZZY_MATCHER_VERSION
+        key += "+fuzzy-v{:d}-{:g}".format(FUZZY_MATCHER_VERSION, args.fuzzy_threshold)
+    return(key)
+
+def _thresholds(args):
+    return({"use_diff": not args.no_diff, "diff_percent_thresh": args.diff_percent_thresh,
+            "diff_fold_thresh": args.diff_fold_thresh, "min_percent_thresh": args.min_percent_thresh,
+            "max_percent_thresh": args.max_percent_thresh})
+
+def _printProcessed(name, df):
+    unresolved = df.loc[df['GeneSymbol'].isna() | (df['GeneSymbol'] == ""), 'Name']
+    print("{}: {:d} targets, {:d} without official gene symbol{}".format(
+        name, len(df), len(unresolved), (": " + ", ".join(unresolved)) if len(unresolved) > 0 else ""))
+
+def _printSelected(intersect, rank):
+    print("Boolean filtering: {:d} targets ({})".format(len(intersect), ", ".join(intersect)))
+    print("Rank ordering: {:d} targets".format(len(rank)))
+
+def _addProcessArguments(parser):
+    parser.add_argument('--datasets', nargs='+', default=["Klaeger", "Huang", "Annes100", "Annes500"],
+                        help="datasets to process")
+    parser.add_argument('--backend', choices=["entrez", "local"], default="entrez", help="gene symbol lookup backend")
+    parser.add_argument('--email', default="example@gmail.com", help="email registered with NCBI")
+    parser.add_argument('--api-key', default=None, help="NCBI API key")
+    parser.add_argument('--max-concurrency', type=int, default=10, help="maximum number of Entrez requests in flight")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the gene symbol lookup cache")
+    parser.add_argument('--gene-info', default="Homo_sapiens.gene_info.gz",
+                        help="HGNC complete set or NCBI gene_info dump in data-dir (local backend)")
+    parser.add_argument('--low-confidence', action='store_true', help="keep low-confidence Klaeger values")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="process all datasets, even those unchanged since they were last processed")
+    parser.add_argument('--no-normalize-names', action='store_true',
+                        help="do not resolve names locally by rules, aliases and known symbols before looking up the "
+                             "remaining names with the backend")
+    parser.add_argument('--fuzzy-match', action='store_true',
+                        help="approximately match names the backend does not resolve to names and symbols of processed "
+                             "datasets and known aliases, applying high-confidence matches and queueing the rest for "
+                             "review in data_aux/aliasReview.tsv")
+    parser.add_argument('--fuzzy-threshold', type=float, default=0.8,
+                        help="trigram similarity (0-1) that an approximate match applied automatically must exceed")
+
+def _addSelectArguments(parser, datasetsOption = '--datasets'):
+    parser.add_argument('--results-dir', default=os.path.join(ROOT_DIR, "results"))
+    parser.add_argument(datasetsOption, nargs='+', default=["Klaeger", "Huang", "Annes100"],
+                        help="datasets from which to select targets")
+    parser.add_argument('--no-diff', action='store_true', help="threshold values instead of differences between compounds")
+    parser.add_argument('--diff-percent-thresh', type=float, default=20)
+    parser.add_argument('--diff-fold-thresh', type=float, default=20)
+    parser.add_argument('--min-percent-thresh', type=float, default=25)
+    parser.add_argument('--max-percent-thresh', type=float, default=75)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="STF-1081 drug toxicity target identification")
+    parser.add_argument('--data-dir', default=os.path.join(ROOT_DIR, "data"), help="directory of raw data files")
+    parser.add_argument('--data-aux-dir', default=os.path.join(ROOT_DIR, "data_aux"),
+                        help="directory of processed data files")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_process = subparsers.add_parser('process', help="process raw data files into data_aux/")
+    _addProcessArguments(parser_process)
+    parser_process.add_argument('--chunk-size', type=int, default=None,
+                                help="read raw data files in chunks of this many rows, for files too large to fit in "
+                                     "memory (does not use the build cache)")
+    parser_process.add_argument('--report', default=None,
+                                help="write a JSON report of the time, rows and lookups of each stage to this path")
+    parser_process.add_argument('--profile', default=None, help="write a cProfile profile of the run to this path")
+    parser_process.set_defaults(func=process)
+
+    parser_select = subparsers.add_parser('select', help="select targets from data_aux/ into results/")
+    _addSelectArguments(parser_select)
+    parser_select.add_argument('--sweep', action='store_true',
+                               help="also write Boolean filtering results over a grid of thresholds")
+    for option in ['diff-percent-thresh', 'diff-fold-thresh', 'min-percent-thresh', 'max-percent-thresh']:
+        parser_select.add_argument('--sweep-' + option, type=float, nargs='+', default=None,
+                                   help="values of --{} to sweep (default: thresholdSweep.DEFAULT_GRID)".format(option))
+    parser_select.add_argument('--min-datasets', type=int, default=2,
+                               help="also aggregate ranks of targets in at least this many datasets by robust rank "
+                                    "aggregation (0: do not compute)")
+    parser_select.add_argument('--permutations', type=int, default=0,
+                               help="number of permutations for p-values of summed ranks (0: do not compute)")
+    parser_select.add_argument('--seed', type=int, default=0, help="random seed for --permutations")
+    parser_select.add_argument('--processes', type=int, default=1,
+                               help="number of processes for --sweep and --permutations")
+    parser_select.set_defaults(func=select)
+
+    parser_run = subparsers.add_parser('run', help="process and select concurrently (see pipeline.py)")
+    _addProcessArguments(parser_run)
+    _addSelectArguments(parser_run, datasetsOption='--select-datasets')
+    parser_run.add_argument('--processes', type=int, default=None,
+                            help="number of processes for CPU-bound stages (default: number of CPUs; 0: use threads)")
+    parser_run.add_argument('--threads', type=int, default=None, help="number of threads for I/O-bound stages")
+    parser_run.set_defaults(func=run)
+
+    parser_serve = subparsers.add_parser('serve', help="answer selection queries over local HTTP (see queryService.py)")
+    parser_serve.add_argument('--datasets', nargs='+', default=["Klaeger", "Huang", "Annes100", "Annes500"],
+                              help="datasets to load")
+    parser_serve.add_argument('--host', default="127.0.0.1")
+    parser_serve.add_argument('--port', type=int, default=8050)
+    parser_serve.add_argument('--cache-size', type=int, default=256, help="number of memoized queries per query type")
+    parser_serve.set_defaults(func=serve)
+
+    parser_similar = subparsers.add_parser('similar', help="compounds with the most similar / different selectivity "
+                                                            "profiles (see profileIndex.py)")
+    parser_similar.add_argument('--compound', default="STF1081")
+    parser_similar.add_argument('-k', type=int, default=10, help="number of compounds")
+    parser_similar.add_argument('--metric', choices=["cosine", "spearman"], default="cosine")
+    parser_similar.add_argument('--furthest', action='store_true', help="most different compounds")
+    parser_similar.add_argument('--datasets', nargs='+', default=["Klaeger", "Huang", "Annes100", "Annes500"],
+                                help="processed datasets from which to build profiles")
+    parser_similar.add_argument('--kinobeads-matrix', default=None,
+                                help="raw Kinobeads drug matrix CSV file (one column per compound) from which to build "
+                                     "profiles instead of --datasets")
+    parser_similar.add_argument('--concentration', type=float, default=1000,
+                                help="reference concentration (nM) at which Kd_app values are converted to occupancy")
+    parser_similar.add_argument('--approximate', action='store_true', help="approximate search for large matrices")
+    parser_similar.set_defaults(func=similar)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+'''
+Streaming (chunked) processing of raw data files too large to read into memory at once.
+
+streamDataset() applies the same stages as processing.processDataset() to bounded chunks of a raw data file:
+1. read: read chunkSize rows at a time
+2. clean: remove targets with missing values; for Kinobeads data, remove (or keep) low-confidence values and convert
+   "n.i." (not inhibited) values to np.inf
+3. split / condense: split combined target names, or accumulate per-name sums / counts / extrema of variants to condense
+4. resolve: add official gene symbols; each distinct name is passed to the resolver once, when first seen
+5. write: sort each chunk by official gene symbol into a temporary run file, then merge the runs into the processed data
+   file
+
+Peak memory depends on chunkSize and the number of distinct names (for resolving and condensing), not on the number of
+rows. The processed data file is identical to the one written by processing.processAll() (condensed values may differ
+in the last digit, as sums are accumulated across chunks).
+'''
+
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from datasets import DATASETS, GENE_SYMBOL_COLUMN
+from processing import (GENE_SYMBOL_OVERRIDES, cleanKinobeads, cleanPercent, splitMultiTargetRows, resolveGeneSymbols,
+                        finalizeDataset)
+
+# Condense functions that can be computed from per-chunk partial results: name -> (partial aggregations, combine)
+_streamingReducers = {
+    "mean": (["sum", "count"], lambda partial: partial["sum"] / partial["count"]),
+    "sum": (["sum"], lambda partial: partial["sum"]),
+    "min": (["min"], lambda partial: partial["min"]),
+    "max": (["max"], lambda partial: partial["max"])}
+_reducerNames = {np.mean: "mean", np.sum: "sum", np.min: "min", np.max: "max"}
+
+# Maximum number of run files open at once when merging (see mergeRuns())
+MAX_MERGE_FAN_IN = 64
+
+def readRawChunks(path, columns = None, na_values = None, chunkSize = 100000, keyCol = 'Name', dtype = None):
+    '''
+    Read a raw data CSV file in chunks.
+
+    Args
+    - path: str
+    - columns: list of str
+        columns to keep. None: keep all columns
+    - na_values: list of str
+        values to be read in as np.nan
+    - chunkSize: int
+        number of rows per chunk
+    - keyCol: str
+        column of names, always read as strings
+    - dtype: dict: str -> str or type
+        data types of other columns, e.g. from numericDtypes(). Without them, data types are inferred per chunk.
+
+    Returns: iterator of pandas.DataFrame
+    '''
+    return(pd.read_csv(path, usecols=columns, na_values=na_values, dtype={**(dtype or {}), keyCol: str},
+                       chunksize=chunkSize))
+
+def numericDtypes(path, chunkSize = 100000, keyCol = 'Name'):
+    '''
+    Find the data types pandas would infer for the numeric columns of a whole CSV file, reading it in chunks: a column
+    is read as integers only if it is integer in every chunk.
+
+    Args
+    - path: str
+    - chunkSize: int
+        number of rows per chunk
+    - keyCol: str
+        column of names, skipped
+
+    Returns: dict: str -> numpy.dtype
+    '''
+    dtypes = {}
+    for chunk in pd.read_csv(path, dtype={keyCol: str}, chunksize=chunkSize):
+        for column in chunk.columns.drop(keyCol):
+            if pd.api.types.is_numeric_dtype(chunk[column]):
+                dtypes[column] = np.result_type(dtypes.get(column, chunk[column].dtype), chunk[column].dtype)
+    return(dtypes)
+
+class ChunkedCondenser:
+    '''
+    Condense duplicate rows (based on the keyCol column) across chunks; see processing.condenseDuplicatesByKey().
+    Memory is proportional to the number of distinct keys.
+
+    Args
+    - keyCol: str
+        column in which to look for duplicates
+    - valueCols: list of str
+        columns of values to condense
+    - func: function or str
+        np.mean, np.sum, np.min, np.max or the corresponding pandas aggregation names
+    '''
+
+    def __init__(self, keyCol, valueCols, func):
+        name = _reducerNames.get(func, func)
+        if name not in _streamingReducers:
+            raise ValueError("Condense function cannot be computed in chunks: " + str(func))
+        self.keyCol = keyCol
+        self.valueCols = list(valueCols)
+        self.aggregations, self.combine = _streamingReducers[name]
+        self.first = None
+        self.partial = None
+
+    def add(self, df):
+        '''
+        Add a chunk.
+
+        Args
+        - df: pandas.DataFrame
+        '''
+        first = df.drop_duplicates(subset=self.keyCol, keep='first').set_index(self.keyCol)
+        partial = df.groupby(self.keyCol, sort=False)[self.valueCols].agg(self.aggregations)
+        if self.first is None:
+            self.first, self.partial = first, partial
+            return
+        self.first = pd.concat([self.first, first.loc[~first.index.isin(self.first.index)]])
+        partial = pd.concat([self.partial, partial])
+        combined = {}
+        for aggregation in self.aggregations:
+            grouped = partial.xs(aggregation, axis=1, level=1).groupby(level=0, sort=False)
+            combined[aggregation] = grouped.agg("sum" if aggregation == "count" else aggregation)
+        self.partial = pd.concat(combined, axis=1).swaplevel(axis=1)
+
+    def result(self, columns):
+        '''
+        Args
+        - columns: list of str
+            column order of the condensed data frame
+
+        Returns: pandas.DataFrame
+            one row per key, ordered by first occurrence
+        '''
+        condensed = self.first.copy()
+        for valueCol in self.valueCols:
+            condensed[valueCol] = self.combine(self.partial[valueCol])
+        return(condensed.reset_index()[columns])
+
+def streamDataset(name, data_dir, dataAux_dir, resolver, highConfidenceOnly = True, condense_func = np.mean,
+                  chunkSize = 100000, symbols = None, tmpDir = None):
+    '''
+    Process a raw dataset in chunks and write it to dataAux_dir.
+
+    Args
+    - name: str
+        dataset name, a key of DATASETS
+    - data_dir: str
+        directory of raw data files
+    - dataAux_dir: str
+        directory to which to write the processed data file
+    - resolver: function
+        gene symbol resolver, e.g. from processing.makeResolver()
+    - highConfidenceOnly, condense_func
+        see processing.prepareDataset(). condense_func must be computable from per-chunk partial results (mean, sum,
+        min, max).
+    - chunkSize: int
+        number of rows of the raw data file per chunk
+    - symbols: dict: str -> str
+        names already resolved (name -> official gene symbol), updated with names resolved by this function. Pass the
+        same dict to several calls to resolve names shared by datasets once. None: new dict
+    - tmpDir: str
+        directory for temporary run files. None: system default
+
+    Returns: int
+        number of rows written
+    '''
+    dataset = DATASETS[name]
+    valueCols = [dataset["compoundCol"], dataset["referenceCol"]]
+    path = os.path.join(data_dir, dataset["filename"])
+    symbols = {} if symbols is None else symbols
+    overrides = GENE_SYMBOL_OVERRIDES.get(name)
+
+    def resolve(terms):
+        new = [term for term in terms if term not in symbols]
+        symbols.update(zip(new, resolver(new) if len(new) > 0 else []))
+        return([symbols[term] for term in terms])
+
+    if dataset["metric"] == "fold":
+        chunks = (splitMultiTargetRows(cleanKinobeads(chunk, valueCols, highConfidenceOnly), 'Name')
+                  for chunk in readRawChunks(path, ['Name'] + valueCols, ["n.d."], chunkSize))
+    else:
+        dtype = numericDtypes(path, chunkSize)
+        chunks = (cleanPercent(chunk) for chunk in readRawChunks(path, chunkSize=chunkSize, dtype=dtype))
+        if name.startswith("Annes"):
+            # condensed data are bounded by the number of distinct names and written as a single run
+            condenser, columns = None, None
+            for chunk in chunks:
+                if condenser is None:
+                    condenser, columns = ChunkedCondenser("Name", [dataset["compoundCol"]], condense_func), list(chunk.columns)
+                condenser.add(chunk)
+            chunks = [] if condenser is None else [condenser.result(columns)]
+
+    runDir = tempfile.mkdtemp(dir=tmpDir)
+    try:
+        runs, nRows = [], 0
+        for chunk in chunks:
+            chunk = finalizeDataset(resolveGeneSymbols(chunk, resolve, overrides), valueCols)
+            if len(chunk) == 0:
+                continue
+            runPath = os.path.join(runDir, "{:d}.csv".format(len(runs)))
+            chunk.to_csv(runPath, index=False)
+            runs.append(runPath)
+            nRows += len(chunk)
+        outPath = os.path.join(dataAux_dir, dataset["filename"])
+        if len(runs) == 0:
+            pd.DataFrame(columns=[GENE_SYMBOL_COLUMN, 'Name'] + valueCols).to_csv(outPath, index=False)
+            return(0)
+        mergeRuns(runs, outPath, tmpDir=runDir)
+        return(nRows)
+    finally:
+        shutil.rmtree(runDir, ignore_errors=True)
+
+def mergeRuns(runs, path, maxFanIn = MAX_MERGE_FAN_IN, tmpDir = None):
+    '''
+    Merge CSV files, each sorted by its first column, into one sorted CSV file. Ties keep the order of runs, so the
+    merge is stable. At most maxFanIn files are open at once: with more runs, consecutive groups of runs are first
+    merged into intermediate runs, in as many passes as needed.
+
+    Args
+    - runs: list of str
+        paths to CSV files with the same header
+    - path: str
+        output path
+    - maxFanIn: int
+        maximum number of runs merged at once (at least 2)
+    - tmpDir: str
+        directory for intermediate run files. None: system default
+    '''
+    if maxFanIn < 2:
+        raise ValueError("maxFanIn must be at least 2")
+    if len(runs) <= maxFanIn:
+        _mergeFiles(runs, path)
+        return
+    passDir = tempfile.mkdtemp(dir=tmpDir)
+    nIntermediate = 0
+    try:
+        while len(runs) > maxFanIn:
+            merged = []
+            for start in range(0, len(runs), maxFanIn):
+                group = runs[start:start + maxFanIn]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                runPath = os.path.join(passDir, "{:d}.csv".format(nIntermediate))
+                nIntermediate += 1
+                _mergeFiles(group, runPath)
+                merged.append(runPath)
+                # intermediate runs of previous passes are no longer needed
+                for run in group:
+                    if os.path.dirname(run) == passDir:
+                        os.remove(run)
+            runs = merged
+        _mergeFiles(runs, path)
+    finally:
+        shutil.rmtree(passDir, ignore_errors=True)
+
+def _mergeFiles(runs, path):
+    files = [open(run, newline='') for run in runs]
+    try:
+        header = None
+        for f in files:
+            header = f.readline()
+        def keyed(i, f):
+            for line in f:
+                yield (next(csv.reader([line]))[0], i, line)
+        with open(path, 'w', newline='') as out:
+            out.write(header)
+            for key, i, line in heapq.merge(*(keyed(i, f) for i, f in enumerate(files))):
+                out.write(line)
+    finally:
+        for f in files:
+            f.close()
@@ -0,0 +1,119 @@
+'''
+Synthetic kinase profiling data in the raw formats of data/, for benchmarking (see benchmark.py).
+
+- Kinobeads (Klaeger): Name, one column of Kd_app values per compound. Names are occasionally semicolon-joined; values
+  are numbers, "n.i." (not inhibited), "n.d." (not determined) or parenthesized (low-confidence) numbers.
+- Activity (Huang): Name, % activity remaining for each compound; occasionally missing.
+- Binding (Annes): DiscoveRx_Name, Name, % control for each compound; kinases occur as several variants (mutants,
+  phosphorylation states) with the same Name; occasionally missing.
+'''
+
+import numpy as np
+import pandas as pd
+
+def kinaseNames(n, rng = None):
+    '''
+    Args
+    - n: int
+        number of names
+    - rng: numpy.random.Generator
+        None: np.random.default_rng()
+
+    Returns: numpy.ndarray of str
+        distinct names in a random order
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    return(rng.permutation(np.array(["KIN{:d}".format(i) for i in range(n)], dtype=object)))
+
+def kinobeadsPanel(nTargets, compounds = ("STF1081", "CC401"), rng = None, joinedFraction = 0.05,
+                   notInhibitedFraction = 0.5, notDeterminedFraction = 0.1, lowConfidenceFraction = 0.1):
+    '''
+    Kinobeads (Klaeger) panel.
+
+    Args
+    - nTargets: int
+        number of rows
+    - compounds: list of str
+        compound columns
+    - rng: numpy.random.Generator
+        None: np.random.default_rng()
+    - joinedFraction: float
+        fraction of rows whose name joins 2-3 names by ';'
+    - notInhibitedFraction, notDeterminedFraction, lowConfidenceFraction: float
+        fractions of values that are "n.i.", "n.d." and parenthesized
+
+    Returns: pandas.DataFrame
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    names = kinaseNames(nTargets, rng)
+    joined = np.flatnonzero(rng.random(nTargets) < joinedFraction)
+    for i in joined:
+        names[i] = ";".join([names[i]] + [names[i] + "_" + str(j) for j in range(1, rng.integers(2, 4))])
+    df = pd.DataFrame({"Name": names})
+    for compound in compounds:
+        values = np.round(10 ** rng.uniform(0, 4.5, nTargets)).astype(int).astype(str).astype(object)
+        u = rng.random(nTargets)
+        lowConfidence = u < lowConfidenceFraction
+        values[lowConfidence] = "(" + values[lowConfidence] + ")"
+        values[(u >= lowConfidenceFraction) & (u < lowConfidenceFraction + notInhibitedFraction)] = "n.i."
+        values[u >= 1 - notDeterminedFraction] = "n.d."
+        df[compound] = values
+    return(df)
+
+def activityPanel(nTargets, compounds = ("STF1081", "HTH01091"), rng = None, missingFraction = 0.02):
+    '''
+    Activity (Huang) panel: % activity remaining.
+
+    Args
+    - nTargets: int
+        number of rows
+    - compounds: list of str
+        compound columns
+    - rng: numpy.random.Generator
+        None: np.random.default_rng()
+    - missingFraction: float
+        fraction of missing values
+
+    Returns: pandas.DataFrame
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    df = pd.DataFrame({"Name": kinaseNames(nTargets, rng)})
+    for compound in compounds:
+        values = np.round(rng.uniform(0, 130, nTargets))
+        values[rng.random(nTargets) < missingFraction] = np.nan
+        df[compound] = values
+    return(df)
+
+def bindingPanel(nTargets, compounds = ("STF1081", "STF1285"), rng = None, maxVariants = 4, variantFraction = 0.1,
+                 missingFraction = 0.01):
+    '''
+    Binding (Annes, DiscoveRx KINOMEscan) panel: % control.
+
+    Args
+    - nTargets: int
+        number of distinct kinases (Name)
+    - compounds: list of str
+        compound columns
+    - rng: numpy.random.Generator
+        None: np.random.default_rng()
+    - maxVariants: int
+        maximum number of variants of a kinase
+    - variantFraction: float
+        fraction of kinases with more than one variant
+    - missingFraction: float
+        fraction of missing values
+
+    Returns: pandas.DataFrame
+    '''
+    rng = np.random.default_rng() if rng is None else rng
+    names = kinaseNames(nTargets, rng)
+    nVariants = np.where(rng.random(nTargets) < variantFraction, rng.integers(2, maxVariants + 1, nTargets), 1)
+    names = np.repeat(names, nVariants)
+    variant = np.concatenate([np.arange(n) for n in nVariants])
+    discoverxNames = np.where(variant == 0, names, names + "(V" + variant.astype(str) + ")-phosphorylated")
+    df = pd.DataFrame({"DiscoveRx_Name": discoverxNames, "Name": names})
+    for compound in compounds:
+        values = np.round(rng.uniform(0, 100, len(names)), 1)
+        values[rng.random(len(names)) < missingFraction] = np.nan
+        df[compound] = values
+    return(df)
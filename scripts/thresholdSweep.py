@@ -0,0 +1,145 @@
+'''
+Threshold sweep for the Boolean filtering method of selectTargets.py.
+
+Evaluates a grid of threshold parameters (use_diff, diff_percent_thresh, diff_fold_thresh, min_percent_thresh,
+max_percent_thresh) at once by broadcasting each dataset's values against arrays of thresholds, instead of re-running
+selectTargets.py once per parameter combination.
+'''
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+PARAMETERS = ['use_diff', 'diff_percent_thresh', 'diff_fold_thresh', 'min_percent_thresh', 'max_percent_thresh']
+
+# Threshold values swept by default (see makeGrid())
+DEFAULT_GRID = {
+    'diff_percent_thresh': list(range(0, 105, 5)),
+    'diff_fold_thresh': [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+    'min_percent_thresh': list(range(0, 105, 5)),
+    'max_percent_thresh': list(range(0, 105, 5))}
+
+class SweepDataset:
+    '''
+    Dataset to include in a threshold sweep.
+
+    Args:
+    - df: pandas.DataFrame
+    - keyCol: str
+        column of target identifiers (e.g., official gene symbols)
+    - metric: str
+        "fold": values are dissociation constants (e.g., Kd_app (Klaeger)); a target is selected if
+          use_diff: referenceCol / compoundCol >= diff_fold_thresh
+          otherwise: referenceCol is inf (not inhibited) and compoundCol is finite
+        "percent": values are % control (Annes) or % activity remaining (Huang); a target is selected if
+          use_diff: referenceCol - compoundCol >= diff_percent_thresh
+          otherwise: referenceCol >= max_percent_thresh and compoundCol <= min_percent_thresh
+    - referenceCol: str
+        column of values for the less toxic compound
+    - compoundCol: str
+        column of values for the compound
+    '''
+
+    def __init__(self, df, keyCol, metric, referenceCol, compoundCol = 'STF1081'):
+        if metric not in ('fold', 'percent'):
+            raise ValueError("metric must be 'fold' or 'percent'")
+        df = df.dropna(subset=[keyCol])
+        self.keys = df[keyCol].to_numpy(dtype=object)
+        self.metric = metric
+        self.reference = df[referenceCol].to_numpy(dtype=float)
+        self.compound = df[compoundCol].to_numpy(dtype=float)
+
+def makeGrid(diff_percent_thresh = None, diff_fold_thresh = None, min_percent_thresh = None, max_percent_thresh = None,
+             use_diff = (True, False)):
+    '''
+    Build a grid of threshold parameter combinations. Parameters that do not apply to a value of use_diff are NaN.
+
+    Args
+    - diff_percent_thresh, diff_fold_thresh, min_percent_thresh, max_percent_thresh: list of int or float
+        threshold values to sweep (see selectTargets.py). None: values in DEFAULT_GRID
+    - use_diff: list of bool
+        values of use_diff to sweep
+
+    Returns: pandas.DataFrame
+        one row per parameter combination, with columns PARAMETERS
+    '''
+    if diff_percent_thresh is None:
+        diff_percent_thresh = DEFAULT_GRID['diff_percent_thresh']
+    if diff_fold_thresh is None:
+        diff_fold_thresh = DEFAULT_GRID['diff_fold_thresh']
+    if min_percent_thresh is None:
+        min_percent_thresh = DEFAULT_GRID['min_percent_thresh']
+    if max_percent_thresh is None:
+        max_percent_thresh = DEFAULT_GRID['max_percent_thresh']
+    rows = []
+    if True in use_diff:
+        rows += [(True, p, f, np.nan, np.nan) for p, f in itertools.product(diff_percent_thresh, diff_fold_thresh)]
+    if False in use_diff:
+        rows += [(False, np.nan, np.nan, lo, hi) for lo, hi in itertools.product(min_percent_thresh, max_percent_thresh)]
+    return(pd.DataFrame(rows, columns=PARAMETERS))
+
+def sweepThresholds(datasets, grid, nProcesses = 1, chunkSize = 1024):
+    '''
+    Find the intersection of selected targets across datasets for every combination of threshold parameters in grid.
+    A target is in the intersection if, in every dataset, at least one row for the target is selected.
+
+    Args
+    - datasets: list of SweepDataset
+    - grid: pandas.DataFrame
+        threshold parameter combinations, as returned by makeGrid()
+    - nProcesses: int
+        1: evaluate in the main process
+        > 1 or None: evaluate chunks of the grid in a ProcessPoolExecutor of nProcesses processes (None: os.cpu_count())
+    - chunkSize: int
+        number of parameter combinations evaluated per broadcasted pass, bounding memory use to
+        chunkSize * (number of rows) booleans
+
+    Returns: pandas.DataFrame
+        grid with additional columns
+        - n_targets: number of targets in the intersection
+        - targets: semicolon-separated, sorted targets in the intersection
+    '''
+    targets, codes = np.unique(np.concatenate([d.keys for d in datasets]).astype(str), return_inverse=True)
+    arrays = []
+    start = 0
+    for d in datasets:
+        arrays.append((d.metric, codes[start:start + len(d.keys)], d.reference, d.compound))
+        start += len(d.keys)
+    params = grid[PARAMETERS].to_numpy(dtype=float)
+    chunks = [params[i:i+chunkSize] for i in range(0, len(params), chunkSize)]
+    if nProcesses == 1:
+        masks = [_evaluateChunk(arrays, len(targets), chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(nProcesses) as executor:
+            masks = list(executor.map(_evaluateChunk, itertools.repeat(arrays), itertools.repeat(len(targets)), chunks))
+    mask = np.concatenate(masks, axis=0) if len(masks) > 0 else np.zeros((0, len(targets)), dtype=bool)
+    result = grid.reset_index(drop=True).copy()
+    result['n_targets'] = mask.sum(axis=1)
+    result['targets'] = [';'.join(targets[row]) for row in mask]
+    return(result)
+
+def _evaluateChunk(arrays, nTargets, params):
+    '''
+    Returns: numpy.ndarray of bool, shape (len(params), nTargets)
+        whether each target is selected in all datasets for each parameter combination
+    '''
+    useDiff = params[:, [0]] == 1
+    diffPercent, diffFold, minPercent, maxPercent = (params[:, [i]] for i in range(1, 5))
+    selected = np.ones((len(params), nTargets), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for metric, codes, reference, compound in arrays:
+            if metric == 'fold':
+                rows = np.where(useDiff, (reference / compound)[None, :] >= diffFold,
+                                (np.isinf(reference) & (compound < np.inf))[None, :])
+            else:
+                rows = np.where(useDiff, (reference - compound)[None, :] >= diffPercent,
+                                (reference[None, :] >= maxPercent) & (compound[None, :] <= minPercent))
+            # any selected row per target
+            order = np.argsort(codes, kind='stable')
+            uniqueCodes, starts = np.unique(codes[order], return_index=True)
+            inDataset = np.zeros((len(params), nTargets), dtype=bool)
+            if len(order) > 0:
+                inDataset[:, uniqueCodes] = np.logical_or.reduceat(rows[:, order], starts, axis=1)
+            selected &= inDataset
+    return(selected)
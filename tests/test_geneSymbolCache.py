@@ -0,0 +1,58 @@
+import geneSymbolCache
+from geneSymbolCache import GeneSymbolCache
+
+RESULT = {"names": ["MAPK14"], "ids": ["1432"]}
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    def time(self):
+        return(self.now)
+
+def test_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(geneSymbolCache.time, "time", clock.time)
+    cache = GeneSymbolCache(":memory:", ttl=10, maxEntries=None)
+    cache.set("p38 alpha", RESULT, useSingleIndirectMatch=True)
+    clock.now += 10
+    assert cache.get("p38 alpha", useSingleIndirectMatch=True) == RESULT
+    # options are part of the key
+    assert cache.get("p38 alpha", useSingleIndirectMatch=False) is None
+    clock.now += 1
+    assert cache.get("p38 alpha", useSingleIndirectMatch=True) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_purgeExpired(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(geneSymbolCache.time, "time", clock.time)
+    cache = GeneSymbolCache(":memory:", ttl=10)
+    cache.set("a", RESULT)
+    clock.now += 5
+    cache.set("b", RESULT)
+    clock.now += 6
+    assert cache.purgeExpired() == 1
+    assert cache.get("a") is None and cache.get("b") == RESULT
+
+def test_lru_eviction(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(geneSymbolCache.time, "time", clock.time)
+    cache = GeneSymbolCache(":memory:", ttl=None, maxEntries=2)
+    cache.set("a", RESULT)
+    clock.now += 1
+    cache.set("b", RESULT)
+    clock.now += 1
+    # reading "a" makes "b" the least recently used
+    assert cache.get("a") == RESULT
+    clock.now += 1
+    cache.set("c", RESULT)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULT and cache.get("c") == RESULT
+
+def test_persistent(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = GeneSymbolCache(path)
+    cache.set("a", RESULT)
+    cache.close()
+    assert GeneSymbolCache(path).get("a") == RESULT
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datasets import DATASETS
+from kinomeMatrix import KinomeMatrix
+from selection import booleanFilter, intersectTargets
+
+def _datasets():
+    rng = np.random.default_rng(0)
+    symbols = np.array(["G{:d}".format(i) for i in range(60)], dtype=object)
+    dfs = {}
+    for name in ["Klaeger", "Huang", "Annes100"]:
+        spec = DATASETS[name]
+        n = 80
+        keys = rng.choice(symbols, n).astype(object)
+        keys[rng.random(n) < 0.05] = np.nan
+        if spec["metric"] == "fold":
+            reference = np.where(rng.random(n) < 0.5, np.inf, rng.uniform(1, 5000, n))
+            compound = np.where(rng.random(n) < 0.3, np.inf, rng.uniform(1, 5000, n))
+        else:
+            reference, compound = rng.uniform(0, 100, n), rng.uniform(0, 100, n)
+        dfs[name] = pd.DataFrame({"GeneSymbol": keys, "Name": keys, spec["referenceCol"]: reference,
+                                  spec["compoundCol"]: compound})
+    return(dfs)
+
+@pytest.mark.parametrize("thresholds", [
+    {},
+    {"diff_percent_thresh": 10, "diff_fold_thresh": 5},
+    {"use_diff": False, "min_percent_thresh": 50, "max_percent_thresh": 50}])
+def test_intersect_matches_intersectTargets(thresholds):
+    dfs = _datasets()
+    matrix = KinomeMatrix.fromFrames(dfs)
+    expected = intersectTargets([
+        df.assign(bool=booleanFilter(df, DATASETS[name]["metric"], DATASETS[name]["referenceCol"],
+                                     DATASETS[name]["compoundCol"], **thresholds))
+        for name, df in dfs.items()])
+    result = matrix.intersect(**thresholds)
+    assert len(expected) > 0 or thresholds
+    assert result.tolist() == expected.tolist()
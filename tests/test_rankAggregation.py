@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from rankAggregation import betaScores, robustRankAggregation
+
+# Worked by hand: P(Beta(k, n - k + 1) <= x) = P(Binomial(n, x) >= k)
+# - [0.1, 0.5]: k = 1: 1 - 0.9^2 = 0.19; k = 2: 0.5^2 = 0.25 -> rho 0.19 at k = 1
+# - [0.5, 0.5, 0.5]: k = 1: 0.875; k = 2: 0.5; k = 3: 0.125 -> rho 0.125 at k = 3
+# - [0.2]: rho 0.2 at k = 1
+RANKS = pd.DataFrame({"A": [0.1, 0.5, 0.2, np.nan],
+                      "B": [0.5, 0.5, np.nan, np.nan],
+                      "C": [np.nan, 0.5, np.nan, np.nan]},
+                     index=pd.Index(["T1", "T2", "T3", "T4"], name="GeneSymbol"))
+
+def test_betaScores():
+    rho, bestK = betaScores(RANKS.to_numpy())
+    np.testing.assert_allclose(rho[:3], [0.19, 0.125, 0.2])
+    assert np.isnan(rho[3])
+    assert bestK.tolist() == [1, 3, 1, 0]
+
+def test_betaScores_chunked():
+    rng = np.random.default_rng(0)
+    ranks = rng.random((100, 4))
+    ranks[rng.random(ranks.shape) < 0.3] = np.nan
+    rho, bestK = betaScores(ranks)
+    rhoChunked, bestKChunked = betaScores(ranks, chunkSize=16)
+    np.testing.assert_allclose(rhoChunked, rho)
+    assert (bestKChunked == bestK).all()
+
+def test_robustRankAggregation():
+    result = robustRankAggregation(RANKS, minDatasets=2)
+    assert result.index.tolist() == ["T2", "T1"]
+    # 1 - (1 - rho)^n
+    np.testing.assert_allclose(result['score'], [1 - 0.875 ** 3, 1 - 0.81 ** 2])
+    np.testing.assert_allclose(result['mean_rank'], [0.5, 0.3])
+    assert result['n_datasets'].tolist() == [3, 2]
+    assert result['datasets'].tolist() == ["A,B,C", "A,B"]
+
+def test_robustRankAggregation_minDatasets():
+    result = robustRankAggregation(RANKS, minDatasets=1)
+    assert result.index.tolist() == ["T3", "T2", "T1"]
+    np.testing.assert_allclose(result.loc["T3", 'score'], 0.2)
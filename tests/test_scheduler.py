@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+from entrezClient import AsyncEntrezClient
+from eutilsStandIn import Faults, StandInServer
+from geneLookup import lookupGeneSymbols
+from processing import Resolver
+from scheduler import SharedResolver
+
+EMAIL = "example@gmail.com"
+
+def test_shared_resolver_concurrent_entrez_lookups():
+    # Resolve tasks of several datasets share one resolver and one AsyncEntrezClient, as in pipeline.runPipeline()
+    terms = ["KIN{:d}".format(i) for i in range(60)]
+    fixtures = {"esearch": {term: [str(i)] for i, term in enumerate(terms)},
+                "esummary": {str(i): {"name": "GENE{:d}".format(i), "aliases": [term]} for i, term in enumerate(terms)}}
+    batches = [terms[i:i + 30] for i in range(0, 60, 10)]
+    with StandInServer(fixtures, Faults(latency=0.01, jitter=0.01)) as server:
+        client = AsyncEntrezClient(EMAIL, rate=200, maxConcurrency=8, baseUrl=server.baseUrl)
+        resolver = Resolver(lambda terms: lookupGeneSymbols(terms, EMAIL, client=client), client)
+        shared = SharedResolver(resolver)
+        with ThreadPoolExecutor(len(batches)) as executor:
+            results = list(executor.map(shared, batches))
+        counts = dict(server.counts)
+    for batch, symbols in zip(batches, results):
+        assert symbols == ["GENE" + term[len("KIN"):] for term in batch]
+    counters = resolver.counters()
+    # each distinct term is looked up once
+    assert counters["resolver_terms"] == len(terms)
+    assert counts["esearch"] == len(terms)
+    assert counters["entrez_throttled"] == 0 and counters["entrez_retries"] == 0
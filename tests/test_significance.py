@@ -0,0 +1,12 @@
+import numpy as np
+from significance import benjaminiHochberg
+
+def test_benjaminiHochberg():
+    # R: p.adjust(c(0.01, 0.04, 0.03, 0.005), "BH")
+    np.testing.assert_allclose(benjaminiHochberg([0.01, 0.04, 0.03, 0.005]), [0.02, 0.04, 0.04, 0.02])
+    # R: p.adjust(c(0.01, 0.02, 0.03, 0.04, 0.05), "BH")
+    np.testing.assert_allclose(benjaminiHochberg([0.01, 0.02, 0.03, 0.04, 0.05]), [0.05] * 5)
+
+def test_benjaminiHochberg_capped():
+    np.testing.assert_allclose(benjaminiHochberg([0.9, 0.8]), [0.9, 0.9])
+    np.testing.assert_allclose(benjaminiHochberg([1, 1]), [1, 1])
@@ -0,0 +1,57 @@
+import builtins
+import os
+import streaming
+from streaming import MAX_MERGE_FAN_IN, mergeRuns
+
+def test_mergeRuns_bounded_fan_in(tmp_path, monkeypatch):
+    nRuns = 3 * MAX_MERGE_FAN_IN + 5
+    runs, rows = [], []
+    for i in range(nRuns):
+        keys = sorted("G{:d}".format((i * 7 + j * 13) % 50) for j in range(4))
+        path = tmp_path / "{:d}.csv".format(i)
+        path.write_text("GeneSymbol,Name\n" + "".join("{},{:d}\n".format(key, i) for key in keys))
+        runs.append(str(path))
+        rows += [(key, str(i)) for key in keys]
+
+    open_ = builtins.open
+    state = {"open": 0, "peak": 0}
+    class Counted:
+        def __init__(self, f):
+            self.f = f
+            state["open"] += 1
+            state["peak"] = max(state["peak"], state["open"])
+        def __getattr__(self, name):
+            return(getattr(self.f, name))
+        def __iter__(self):
+            return(iter(self.f))
+        def __enter__(self):
+            return(self)
+        def __exit__(self, *exc):
+            self.close()
+        def close(self):
+            if not self.f.closed:
+                state["open"] -= 1
+            self.f.close()
+    monkeypatch.setattr(streaming, "open", lambda *args, **kwargs: Counted(open_(*args, **kwargs)), raising=False)
+
+    out = tmp_path / "merged.csv"
+    mergeRuns(runs, str(out), tmpDir=str(tmp_path))
+    lines = out.read_text().splitlines()
+    assert lines[0] == "GeneSymbol,Name"
+    # stable: rows of equal keys keep the order of runs
+    assert [tuple(line.split(",")) for line in lines[1:]] == sorted(rows, key=lambda row: row[0])
+    # runs being merged plus the output file
+    assert state["peak"] <= MAX_MERGE_FAN_IN + 1
+    assert state["open"] == 0
+    # intermediate runs are removed
+    assert sorted(os.listdir(tmp_path)) == sorted(["merged.csv"] + [os.path.basename(run) for run in runs])
+
+def test_mergeRuns_small_fan_in(tmp_path):
+    runs = []
+    for i, keys in enumerate([["A", "C"], ["B"], ["A", "B"], ["C"], ["B"]]):
+        path = tmp_path / "{:d}.csv".format(i)
+        path.write_text("k,run\n" + "".join("{},{:d}\n".format(key, i) for key in keys))
+        runs.append(str(path))
+    out = tmp_path / "merged.csv"
+    mergeRuns(runs, str(out), maxFanIn=2, tmpDir=str(tmp_path))
+    assert out.read_text().splitlines()[1:] == ["A,0", "A,2", "B,1", "B,2", "B,4", "C,0", "C,3"]